@@ -0,0 +1,43 @@
+"""Moved Photos To Photo Store
+
+Revision ID: 3f1c9a7be2d4
+Revises: 8ce9af0afb90
+Create Date: 2020-09-12 10:21:44.517203
+
+"""
+from base64 import b64decode, b64encode
+
+from alembic import op
+import sqlalchemy as sa
+
+from ratings.photo_store import get_photo_store
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7be2d4'
+down_revision = '8ce9af0afb90'
+branch_labels = None
+depends_on = None
+
+
+# The photos used to be stored as base64 encoded strings in google_maps.photos. We write them into the content
+# addressed photo store and only keep the hashes in the database.
+
+def upgrade():
+    photo_store = get_photo_store()
+    connection = op.get_bind()
+    rows = connection.execute(sa.text("SELECT link, array(SELECT encode(photo::bytea, 'escape') FROM unnest(photos) AS photo) "
+                                      "FROM google_maps WHERE photos IS NOT NULL")).fetchall()
+    for link, photos in rows:
+        hashes = [photo_store.put(b64decode(photo)) for photo in photos]
+        connection.execute(sa.text("UPDATE google_maps SET photos = :photos WHERE link = :link"), photos=hashes, link=link)
+
+
+def downgrade():
+    photo_store = get_photo_store()
+    connection = op.get_bind()
+    rows = connection.execute(sa.text("SELECT link, photos FROM google_maps WHERE photos IS NOT NULL")).fetchall()
+    for link, hashes in rows:
+        # Restore the old format, which is the bytea representation of the base64 string
+        photos = ["\\x" + b64encode(photo_store.get(photo_hash)).hex() for photo_hash in hashes]
+        connection.execute(sa.text("UPDATE google_maps SET photos = :photos WHERE link = :link"), photos=photos, link=link)
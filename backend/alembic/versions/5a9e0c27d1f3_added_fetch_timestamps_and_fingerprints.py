@@ -0,0 +1,30 @@
+"""Added Fetch Timestamps And Fingerprints
+
+Revision ID: 5a9e0c27d1f3
+Revises: d41a6f83c950
+Create Date: 2020-09-18 11:05:53.640211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9e0c27d1f3'
+down_revision = 'd41a6f83c950'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ['google_maps', 'trip_advisor', 'restaurants']:
+        op.add_column(table, sa.Column('last_fetched_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('fingerprint', sa.String(), nullable=True))
+        op.create_index(op.f(f'ix_{table}_fingerprint'), table, ['fingerprint'], unique=False)
+
+
+def downgrade():
+    for table in ['google_maps', 'trip_advisor', 'restaurants']:
+        op.drop_index(op.f(f'ix_{table}_fingerprint'), table_name=table)
+        op.drop_column(table, 'fingerprint')
+        op.drop_column(table, 'last_fetched_at')
@@ -0,0 +1,33 @@
+"""Added Photo Variants
+
+Revision ID: 9c4d2e71b8a5
+Revises: 5a9e0c27d1f3
+Create Date: 2020-09-20 16:32:08.915347
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4d2e71b8a5'
+down_revision = '5a9e0c27d1f3'
+branch_labels = None
+depends_on = None
+
+
+# The variants of the existing photos can be created with scripts/create_photo_variants.py
+
+def upgrade():
+    op.create_table('photo_variants',
+                    sa.Column('photo_hash', sa.String(), nullable=False),
+                    sa.Column('variant', sa.String(), nullable=False),
+                    sa.Column('variant_hash', sa.String(), nullable=True),
+                    sa.Column('media_type', sa.String(), nullable=True),
+                    sa.Column('width', sa.Integer(), nullable=True),
+                    sa.Column('height', sa.Integer(), nullable=True),
+                    sa.PrimaryKeyConstraint('photo_hash', 'variant'))
+
+
+def downgrade():
+    op.drop_table('photo_variants')
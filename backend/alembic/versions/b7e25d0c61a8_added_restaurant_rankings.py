@@ -0,0 +1,34 @@
+"""Added Restaurant Rankings
+
+Revision ID: b7e25d0c61a8
+Revises: 3f1c9a7be2d4
+Create Date: 2020-09-13 16:02:37.114920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e25d0c61a8'
+down_revision = '3f1c9a7be2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('restaurant_rankings',
+                    sa.Column('town', sa.String(), nullable=False),
+                    sa.Column('rank', sa.Integer(), nullable=False),
+                    sa.Column('google_maps_link', sa.String(), nullable=True),
+                    sa.Column('trip_advisor_link', sa.String(), nullable=True),
+                    sa.Column('score', sa.Float(), nullable=True),
+                    sa.PrimaryKeyConstraint('town', 'rank'))
+    op.create_index(op.f('ix_restaurants_town'), 'restaurants', ['town'], unique=False)
+    op.create_index(op.f('ix_restaurants_google_maps_link'), 'restaurants', ['google_maps_link'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_restaurants_google_maps_link'), table_name='restaurants')
+    op.drop_index(op.f('ix_restaurants_town'), table_name='restaurants')
+    op.drop_table('restaurant_rankings')
@@ -0,0 +1,31 @@
+"""Added Crawl Checkpoints
+
+Revision ID: d41a6f83c950
+Revises: b7e25d0c61a8
+Create Date: 2020-09-15 19:47:12.381064
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a6f83c950'
+down_revision = 'b7e25d0c61a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('crawl_checkpoints',
+                    sa.Column('town', sa.String(), nullable=False),
+                    sa.Column('country', sa.String(), nullable=False),
+                    sa.Column('status', sa.String(), nullable=True),
+                    sa.Column('started_at', sa.DateTime(), nullable=True),
+                    sa.Column('finished_at', sa.DateTime(), nullable=True),
+                    sa.Column('error', sa.String(), nullable=True),
+                    sa.PrimaryKeyConstraint('town', 'country'))
+
+
+def downgrade():
+    op.drop_table('crawl_checkpoints')
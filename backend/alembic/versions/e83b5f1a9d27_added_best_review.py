@@ -0,0 +1,28 @@
+"""Added Best Review
+
+Revision ID: e83b5f1a9d27
+Revises: 9c4d2e71b8a5
+Create Date: 2020-09-24 10:12:41.285716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e83b5f1a9d27'
+down_revision = '9c4d2e71b8a5'
+branch_labels = None
+depends_on = None
+
+
+# The best reviews of the existing restaurants can be chosen with scripts/choose_best_reviews.py
+
+def upgrade():
+    op.add_column('google_maps', sa.Column('best_review', sa.String(), nullable=True))
+    op.add_column('google_maps', sa.Column('best_review_score', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('google_maps', 'best_review_score')
+    op.drop_column('google_maps', 'best_review')
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Any
+
+from benchmarks import data, imports
+from ratings import utils
+from ratings.database import DbResult, PostgresDatabase
+from ratings.matching import RestaurantMatcher
+from ratings.rating_sites import TripAdvisor, GoogleMaps, RatingSite
+from ratings.snapshot import RestaurantSnapshot
+from ratings.restaurant import GoogleMapsResult, TripAdvisorResult, RestaurantResult, get_popularity_and_quality_weighted, \
+    get_scores, get_table_metadata
+from ratings.reviews import choose_best_reviews
+from ratings.trip_advisor_parser import parse_restaurants_page
+from scripts.get_data import sort_by_scores, removed_duplicates, get_combined_scores, combine_restaurant_infos
+
+
+# A benchmark prepares its data for a given size (outside of the measurement) and returns the function to measure.
+# Returning None skips the benchmark, e.g. when no database is configured.
+
+FIXTURES_PATH: Path = Path(__file__).parent / "fixtures"
+MATCHER_QUERIES: int = 200
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[int, int], Optional[Callable[[], Any]]]
+    sizes: List[int]
+
+
+# Ranking
+
+def setup_scoring(size: int, seed: int) -> Callable[[], Any]:
+    restaurants: List[GoogleMapsResult] = data.generate_google_maps_results(size, seed)
+    return lambda: [get_popularity_and_quality_weighted(restaurant, restaurants) for restaurant in restaurants]
+
+def setup_batch_scoring(size: int, seed: int) -> Callable[[], Any]:
+    restaurants: List[GoogleMapsResult] = data.generate_google_maps_results(size, seed)
+    return lambda: get_scores(restaurants)
+
+def setup_sorting(size: int, seed: int) -> Callable[[], Any]:
+    # Both sorts of load_town_results: the results of one site and the combined restaurants
+    restaurants: List[GoogleMapsResult] = data.generate_google_maps_results(size, seed)
+    combined: List[List[RestaurantResult]] = data.generate_combined_restaurants(size, seed)
+
+    def sort():
+        sort_by_scores(restaurants, get_scores(restaurants))
+        sort_by_scores(combined, get_combined_scores(combined))
+    return sort
+
+def setup_combination(size: int, seed: int) -> Callable[[], Any]:
+    # The restaurants of both sites, where none of the Trip Advisor restaurants is among the Google results, so every
+    # one needs a lookup that takes 10 ms
+    google_maps_restaurants: List[GoogleMapsResult] = data.generate_google_maps_results(size, seed)
+    trip_advisor_restaurants: List[TripAdvisorResult] = data.generate_trip_advisor_results(size, seed + 1)
+    sites: List[RatingSite] = [GoogleMaps("", None), TripAdvisor("")]
+    matchers: List[RestaurantMatcher] = [RestaurantMatcher(google_maps_restaurants), RestaurantMatcher(trip_advisor_restaurants)]
+    client: data.DelayedClient = data.DelayedClient(delay_seconds=0.01)
+    # noinspection PyTypeChecker
+    return lambda: asyncio.run(combine_restaurant_infos(google_maps_restaurants + trip_advisor_restaurants, matchers, sites, "Town", client))
+
+def setup_removed_duplicates(size: int, seed: int) -> Callable[[], Any]:
+    combined: List[List[RestaurantResult]] = data.generate_combined_restaurants(size, seed)
+    return lambda: removed_duplicates(combined)
+
+
+# Matching
+
+def _get_queries(restaurants: List[GoogleMapsResult], seed: int) -> List[TripAdvisorResult]:
+    generator: random.Random = data.get_random(seed)
+    return [data.generate_similar_restaurant(generator.choice(restaurants), generator) for _ in range(MATCHER_QUERIES)]
+
+def setup_get_same_restaurant(size: int, seed: int) -> Callable[[], Any]:
+    # The old entry point, which indexes the results for every query
+    restaurants: List[GoogleMapsResult] = data.generate_google_maps_results(size, seed)
+    queries: List[TripAdvisorResult] = _get_queries(restaurants, seed)
+    return lambda: [utils.get_same_restaurant(query, restaurants) for query in queries]
+
+def setup_matcher(size: int, seed: int) -> Callable[[], Any]:
+    # As in load_town_results: index once, then match many restaurants
+    restaurants: List[GoogleMapsResult] = data.generate_google_maps_results(size, seed)
+    queries: List[TripAdvisorResult] = _get_queries(restaurants, seed)
+
+    def match():
+        matcher: RestaurantMatcher = RestaurantMatcher(restaurants)
+        return [matcher.get_same_restaurant(query) for query in queries]
+    return match
+
+
+# Parsing
+
+def setup_trip_advisor_parsing(size: int, seed: int) -> Callable[[], Any]:
+    trip_advisor: TripAdvisor = TripAdvisor("")
+    page: str = data.generate_trip_advisor_page(size, seed)
+    return lambda: [trip_advisor._from_dict(restaurant) for restaurant in parse_restaurants_page(page)]
+
+def setup_trip_advisor_fixtures(size: int, seed: int) -> Optional[Callable[[], Any]]:
+    # Real pages saved into the fixtures directory, if there are any. The size is ignored.
+    pages: List[str] = [path.read_text(encoding="utf-8") for path in sorted(FIXTURES_PATH.glob("*.html"))]
+    if len(pages) == 0:
+        return None
+    trip_advisor: TripAdvisor = TripAdvisor("")
+    return lambda: [[trip_advisor._from_dict(restaurant) for restaurant in parse_restaurants_page(page)] for page in pages]
+
+
+# Reviews
+
+def setup_review_selection(size: int, seed: int) -> Callable[[], Any]:
+    # What one worker of the process pool does, for the reviews of size restaurants
+    restaurants: List[GoogleMapsResult] = data.generate_google_maps_results(size, seed)
+    return lambda: choose_best_reviews([restaurant.reviews for restaurant in restaurants])
+
+
+# Startup
+
+def setup_api_imports(size: int, seed: int) -> Callable[[], Any]:
+    # A fresh interpreter importing what the API imports, including the start of the interpreter. The size is ignored.
+    imports.check_api_imports()
+    return imports.measure_api_imports
+
+
+# Database
+
+def setup_convert_rows_to(size: int, seed: int) -> Callable[[], Any]:
+    rows, column_names = data.generate_rows(size, seed)
+    return lambda: DbResult(rows, column_names).convert_to_two_types(GoogleMapsResult, TripAdvisorResult)
+
+def setup_snapshot(size: int, seed: int) -> Callable[[], Any]:
+    # Loading the snapshot of the API, the query itself is not measured
+    rows, column_names = data.generate_ranked_rows(size, seed)
+    return lambda: RestaurantSnapshot(DbResult(rows, column_names))
+
+def setup_snapshot_pages(size: int, seed: int) -> Callable[[], Any]:
+    # The first page of every town, as the API serves them
+    snapshot: RestaurantSnapshot = RestaurantSnapshot(DbResult(*data.generate_ranked_rows(size, seed)))
+    return lambda: [snapshot.get_page(town, 0, 10) for town in snapshot.towns]
+
+def setup_upsert(size: int, seed: int) -> Optional[Callable[[], Any]]:
+    # Needs a Postgres database that may be written to. The first run inserts the rows, every further run updates them.
+    database_url: Optional[str] = os.environ.get("BENCHMARK_DATABASE_URL")
+    if database_url is None:
+        return None
+    postgres_db: PostgresDatabase = PostgresDatabase(database_url)
+    postgres_db.initialize_tables(database_url, get_table_metadata())
+    restaurants: List[GoogleMapsResult] = data.generate_google_maps_results(size, seed)
+    return lambda: postgres_db.convert_to_db_entry(restaurants, "google_maps").upsert()
+
+
+BENCHMARKS: List[Benchmark] = [
+    Benchmark("scoring", setup_scoring, [100, 1000, 3000]),
+    Benchmark("batch_scoring", setup_batch_scoring, [100, 1000, 10000]),
+    Benchmark("sorting", setup_sorting, [100, 1000, 10000]),
+    Benchmark("combination", setup_combination, [30, 60, 120]),
+    Benchmark("removed_duplicates", setup_removed_duplicates, [100, 1000, 3000]),
+    Benchmark("get_same_restaurant", setup_get_same_restaurant, [100, 500, 1000]),
+    Benchmark("matcher", setup_matcher, [100, 500, 2000]),
+    Benchmark("trip_advisor_parsing", setup_trip_advisor_parsing, [30, 300, 3000]),
+    Benchmark("trip_advisor_fixtures", setup_trip_advisor_fixtures, [1]),
+    Benchmark("review_selection", setup_review_selection, [10, 100, 1000]),
+    Benchmark("api_imports", setup_api_imports, [1]),
+    Benchmark("convert_rows_to", setup_convert_rows_to, [100, 1000, 10000]),
+    Benchmark("snapshot", setup_snapshot, [1000, 10000, 50000]),
+    Benchmark("snapshot_pages", setup_snapshot_pages, [1000, 10000, 50000]),
+    Benchmark("upsert", setup_upsert, [100, 1000, 10000]),
+]
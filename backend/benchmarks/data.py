@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import json
+import random
+from typing import List, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from ratings.database import get_column_names, DbResult
+from ratings.restaurant import GoogleMapsResult, TripAdvisorResult, RestaurantResult, RestaurantRanking
+
+
+# Synthetic restaurants for the benchmarks. The same seed always gives the same data, so that runs can be compared.
+
+DEFAULT_SEED: int = 42
+
+NAME_PREFIXES: List[str] = ["Restaurant", "Trattoria", "Ristorante", "Gasthaus", "Café", "Bistro", "Brauhaus", "Pizzeria",
+                            "Osteria", "Wirtshaus", "Taverna", "Steakhaus", "Sushi Bar", "Curry House", ""]
+NAME_WORDS: List[str] = ["Zur", "Alte", "Post", "Krone", "Mühle", "Roma", "Bella", "Napoli", "Goldener", "Hirsch", "Adler",
+                         "Linde", "Sonne", "Stern", "Olive", "Sakura", "Athen", "Akropolis", "Taj", "Mahal", "am", "Markt",
+                         "Rathaus", "Schloss", "Brücke", "Hafen", "Fischer", "Lamm", "Rose", "Eiche", "Bären", "Löwen"]
+STREETS: List[str] = ["Hauptstraße", "Bahnhofstraße", "Marktplatz", "Kirchgasse", "Schillerstraße", "Goethestraße"]
+
+
+def get_random(seed: int = DEFAULT_SEED) -> random.Random:
+    return random.Random(seed)
+
+def generate_names(number_of_names: int, seed: int = DEFAULT_SEED) -> List[str]:
+    generator: random.Random = get_random(seed)
+    names: List[str] = []
+    for i in range(number_of_names):
+        words: List[str] = generator.sample(NAME_WORDS, generator.randint(1, 3))
+        name: str = " ".join([generator.choice(NAME_PREFIXES)] + words).strip()
+        # Some restaurants of a town share a name, e.g. chains
+        if generator.random() < 0.9:
+            name += f" {i}"
+        names.append(name)
+    return names
+
+def generate_google_maps_results(number_of_restaurants: int, seed: int = DEFAULT_SEED) -> List[GoogleMapsResult]:
+    generator: random.Random = get_random(seed)
+    results: List[GoogleMapsResult] = []
+    for i, name in enumerate(generate_names(number_of_restaurants, seed)):
+        place_id: str = f"benchmark-{seed}-{i}"
+        results.append(GoogleMapsResult(name=name, link=f"https://www.google.com/maps/place/?q=place_id:{place_id}",
+                                        number_of_reviews=int(generator.paretovariate(1.2) * 10),
+                                        rating=round(generator.uniform(5, 10), 1),
+                                        formatted_address=f"{generator.choice(STREETS)} {generator.randint(1, 120)}",
+                                        location_lat=generator.uniform(47.3, 55.0), location_lang=generator.uniform(5.9, 15.0),
+                                        photos=[f"{generator.getrandbits(256):064x}" for _ in range(3)],
+                                        reviews=[" ".join(generator.choices(NAME_WORDS, k=generator.randint(5, 60))) for _ in range(5)],
+                                        best_review=" ".join(generator.choices(NAME_WORDS, k=generator.randint(5, 60))),
+                                        best_review_score=generator.random(), last_fetched_at=None, fingerprint=None))
+    return results
+
+def generate_trip_advisor_results(number_of_restaurants: int, seed: int = DEFAULT_SEED) -> List[TripAdvisorResult]:
+    generator: random.Random = get_random(seed + 1)
+    return [TripAdvisorResult(name=name, link=f"https://www.tripadvisor.com/Restaurant_Review-g{seed}-d{i}-Reviews.html",
+                              number_of_reviews=int(generator.paretovariate(1.2) * 10), rating=generator.randint(2, 10),
+                              last_fetched_at=None, fingerprint=None)
+            for i, name in enumerate(generate_names(number_of_restaurants, seed))]
+
+def generate_similar_restaurant(restaurant: RestaurantResult, generator: random.Random) -> TripAdvisorResult:
+    # The same restaurant as listed on another site: a similar, but not always equal name
+    name: str = restaurant.name
+    if generator.random() < 0.5:
+        position: int = generator.randrange(len(name))
+        name = name[:position] + name[position + 1:]
+    return TripAdvisorResult(name=name, link=restaurant.link, number_of_reviews=restaurant.number_of_reviews,
+                             rating=restaurant.rating, last_fetched_at=None, fingerprint=None)
+
+def generate_combined_restaurants(number_of_restaurants: int, seed: int = DEFAULT_SEED) -> List[List[RestaurantResult]]:
+    # Restaurants with an entry on both sites, like they are built in load_town_results. About a tenth are duplicates.
+    generator: random.Random = get_random(seed)
+    google_maps_results: List[GoogleMapsResult] = generate_google_maps_results(number_of_restaurants, seed)
+    trip_advisor_results: List[TripAdvisorResult] = generate_trip_advisor_results(number_of_restaurants, seed)
+    combined: List[List[RestaurantResult]] = []
+    for google_maps_result, trip_advisor_result in zip(google_maps_results, trip_advisor_results):
+        if len(combined) > 0 and generator.random() < 0.1:
+            combined.append(generator.choice(combined))
+        else:
+            combined.append([google_maps_result, trip_advisor_result])
+    return combined[:number_of_restaurants]
+
+def generate_rows(number_of_rows: int, seed: int = DEFAULT_SEED) -> Tuple[List[Tuple], List[str]]:
+    # Rows of the joined google_maps and trip_advisor tables, with the aliased column names of sql._get_aliased_select
+    google_maps_columns: List[str] = get_column_names(GoogleMapsResult)
+    trip_advisor_columns: List[str] = get_column_names(TripAdvisorResult)
+    column_names: List[str] = [DbResult.get_column_alias("google_maps", column) for column in google_maps_columns] + \
+                              [DbResult.get_column_alias("trip_advisor", column) for column in trip_advisor_columns]
+    rows: List[Tuple] = [tuple(getattr(google_maps_result, column) for column in google_maps_columns) +
+                         tuple(getattr(trip_advisor_result, column) for column in trip_advisor_columns)
+                         for google_maps_result, trip_advisor_result in zip(generate_google_maps_results(number_of_rows, seed),
+                                                                            generate_trip_advisor_results(number_of_rows, seed))]
+    return rows, column_names
+
+def generate_ranked_rows(number_of_rows: int, seed: int = DEFAULT_SEED, restaurants_per_town: int = 50) -> Tuple[List[Tuple], List[str]]:
+    # Rows like sql.get_all_ranked_restaurants returns them: the ranking, the listing columns of google_maps and trip_advisor
+    rows, column_names = generate_rows(number_of_rows, seed)
+    listing_positions: List[int] = [i for i, column in enumerate(column_names)
+                                    if column not in [DbResult.get_column_alias("google_maps", "photos"),
+                                                      DbResult.get_column_alias("google_maps", "reviews")]]
+    ranking_columns: List[str] = [DbResult.get_column_alias("restaurant_rankings", column) for column in get_column_names(RestaurantRanking)]
+    ranked_rows: List[Tuple] = []
+    for i, row in enumerate(rows):
+        town, rank = f"Town {i // restaurants_per_town:05d}", i % restaurants_per_town
+        ranking: RestaurantRanking = RestaurantRanking(town=town, rank=rank, google_maps_link=row[column_names.index("google_maps_link")],
+                                                       trip_advisor_link=row[column_names.index("trip_advisor_link")],
+                                                       score=float(number_of_rows - i))
+        ranked_rows.append(tuple(getattr(ranking, column) for column in get_column_names(RestaurantRanking)) +
+                           tuple(row[position] for position in listing_positions))
+    return ranked_rows, ranking_columns + [column_names[position] for position in listing_positions]
+
+def generate_trip_advisor_page(number_of_restaurants: int, seed: int = DEFAULT_SEED) -> str:
+    # A restaurant list page of Trip Advisor. Like the real page, the restaurants are embedded as json in one of many
+    # scripts.
+    restaurants: List[dict] = [{"name": restaurant.name, "detailPageUrl": restaurant.link.replace("https://www.tripadvisor.com", ""),
+                                "averageRating": restaurant.rating / 2, "userReviewCount": restaurant.number_of_reviews,
+                                "cuisines": [{"tagId": 10, "name": "Deutsch"}], "priceTag": "€€-€€€"}
+                               for restaurant in generate_trip_advisor_results(number_of_restaurants, seed)]
+    page_data: str = json.dumps({"data": {"restaurants": restaurants}, "error": None}, ensure_ascii=False, separators=(",", ":"))
+    filler_scripts: str = "\n".join(f'<script>window.__tracking_{i} = {{"page": "Restaurants", "slot": {i}}};</script>'
+                                    for i in range(40))
+    filler_markup: str = "\n".join(f'<div class="listing"><a href="/Restaurant_Review-{i}">{i}</a><span>{i} reviews</span></div>'
+                                   for i in range(number_of_restaurants))
+    return f"<!DOCTYPE html><html><head><title>THE 10 BEST Restaurants</title>{filler_scripts}</head>" \
+           f"<body>{filler_markup}<script>window.__WEB_CONTEXT__={{pageManifest:{{urqlCache:{{\"1\":{page_data}}}}}}};</script>" \
+           f"</body></html>"
+
+
+class DelayedClient:
+
+    # Stands in for the AsyncHttpClient: answers findplacefromtext with a place named like the search, after a fixed
+    # delay. Shows how far the lookups of a town overlap, without sending requests.
+
+    def __init__(self, delay_seconds: float):
+        self._delay_seconds: float = delay_seconds
+
+    async def get_json(self, url: str) -> dict:
+        await asyncio.sleep(self._delay_seconds)
+        search_string: str = parse_qs(urlsplit(url).query)["input"][0]
+        return {"candidates": [{"name": search_string, "place_id": hashlib.sha1(search_string.encode()).hexdigest(), "rating": 4.5,
+                                "user_ratings_total": 100, "formatted_address": "", "geometry": {"location": {"lat": 50.0, "lng": 8.0}}}]}
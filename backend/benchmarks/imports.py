@@ -0,0 +1,55 @@
+import ast
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Set
+
+
+# The API workers are started and stopped often, so importing the API must stay cheap. The imports are measured in a
+# fresh interpreter, since the modules of the current process are already loaded. Run it as a check:
+#   python -m benchmarks.imports
+# Run it from the backend directory.
+
+API_SCRIPT: Path = Path(__file__).parent.parent / "scripts" / "start_api.py"
+# Only the crawler and the dataset scripts need these, serving must not import them
+CRAWLER_ONLY_MODULES: List[str] = ["aiohttp", "dataclasses_json", "lxml", "nltk", "pandas", "PIL", "pyarrow", "textblob"]
+
+
+class HeavyImportError(Exception):
+    pass
+
+
+def get_api_imports() -> List[str]:
+    # The modules that start_api.py imports. The script itself is not imported, it connects to the database.
+    tree: ast.Module = ast.parse(API_SCRIPT.read_text(encoding="utf-8"))
+    modules: List[str] = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return modules
+
+def get_loaded_modules(modules: List[str]) -> Set[str]:
+    # All modules that are loaded after importing the given ones
+    code: str = "; ".join([f"import {module}" for module in modules] + ["import sys, json", "print(json.dumps(list(sys.modules)))"])
+    output: bytes = subprocess.check_output([sys.executable, "-c", code], cwd=API_SCRIPT.parent.parent)
+    return set(json.loads(output.decode("utf-8").splitlines()[-1]))
+
+def check_api_imports():
+    loaded: Set[str] = get_loaded_modules(get_api_imports())
+    heavy: List[str] = [module for module in CRAWLER_ONLY_MODULES if module in loaded]
+    if len(heavy) > 0:
+        raise HeavyImportError(f"The API imports {', '.join(heavy)}, import them where they are used instead")
+
+def measure_api_imports() -> float:
+    start: float = time.perf_counter()
+    get_loaded_modules(get_api_imports())
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    check_api_imports()
+    print(f"the API imports none of {', '.join(CRAWLER_ONLY_MODULES)}, importing it takes {measure_api_imports() * 1e3:.0f} ms")
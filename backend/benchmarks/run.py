@@ -0,0 +1,89 @@
+import json
+import platform
+import statistics
+import time
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Optional, Callable, Any, Tuple
+
+from benchmarks.benches import BENCHMARKS, Benchmark
+from benchmarks.data import DEFAULT_SEED
+
+
+# Runs the benchmarks and saves the results as json, so that they can be compared with an earlier run:
+#   python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+# Run it from the backend directory.
+
+RESULTS_PATH: Path = Path(__file__).parent / "results"
+
+
+def run_benchmarks(benchmarks: List[Benchmark], repeat: int, seed: int, sizes: Optional[List[int]] = None) -> List[Dict]:
+    results: List[Dict] = []
+    for benchmark in benchmarks:
+        for size in sizes if sizes is not None else benchmark.sizes:
+            function: Optional[Callable[[], Any]] = benchmark.setup(size, seed)
+            if function is None:
+                print(f"{benchmark.name:<24} {size:>7}  skipped")
+                continue
+            timings: List[float] = measure(function, repeat)
+            result: Dict = {"benchmark": benchmark.name, "size": size, "repeat": repeat, "min_seconds": min(timings),
+                            "median_seconds": statistics.median(timings)}
+            print(f"{benchmark.name:<24} {size:>7}  min {_format_seconds(result['min_seconds'])}  "
+                  f"median {_format_seconds(result['median_seconds'])}")
+            results.append(result)
+    return results
+
+def measure(function: Callable[[], Any], repeat: int) -> List[float]:
+    # One run to warm up caches (e.g. the row mappers), which the crawl and the API warm up as well
+    function()
+    timings: List[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def save_results(results: List[Dict], seed: int, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content: Dict = {"created_at": datetime.utcnow().isoformat(), "python": platform.python_version(),
+                     "machine": platform.machine(), "seed": seed, "results": results}
+    path.write_text(json.dumps(content, indent=2))
+    print(f"saved results to {path}")
+
+def compare_results(results: List[Dict], earlier_results: List[Dict]):
+    # Compares the median timings. A ratio below 1 means the benchmark got faster.
+    earlier: Dict[Tuple[str, int], Dict] = {(result["benchmark"], result["size"]): result for result in earlier_results}
+    print(f"\n{'benchmark':<24} {'size':>7}  {'before':>10}  {'after':>10}  {'ratio':>6}")
+    for result in results:
+        earlier_result: Optional[Dict] = earlier.get((result["benchmark"], result["size"]))
+        if earlier_result is None:
+            continue
+        ratio: float = result["median_seconds"] / earlier_result["median_seconds"]
+        print(f"{result['benchmark']:<24} {result['size']:>7}  {_format_seconds(earlier_result['median_seconds'])}  "
+              f"{_format_seconds(result['median_seconds'])}  {ratio:>6.2f}")
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:>7.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:>7.1f} ms"
+    return f"{seconds:>7.2f} s "
+
+
+if __name__ == "__main__":
+    parser: ArgumentParser = ArgumentParser(description="Runs the benchmarks of the crawl and API hot paths")
+    parser.add_argument("--only", nargs="+", default=None, help="Names of the benchmarks to run")
+    parser.add_argument("--sizes", nargs="+", type=int, default=None, help="Overrides the data sizes of all benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", type=Path, default=None, help="Defaults to a new file in benchmarks/results")
+    parser.add_argument("--compare", type=Path, default=None, help="Results of an earlier run to compare with")
+    arguments: Namespace = parser.parse_args()
+    benchmarks_to_run: List[Benchmark] = [benchmark for benchmark in BENCHMARKS if arguments.only is None or benchmark.name in arguments.only]
+    benchmark_results: List[Dict] = run_benchmarks(benchmarks_to_run, arguments.repeat, arguments.seed, arguments.sizes)
+    output: Path = arguments.output if arguments.output is not None else \
+        RESULTS_PATH / f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json"
+    save_results(benchmark_results, arguments.seed, output)
+    if arguments.compare is not None:
+        compare_results(benchmark_results, json.loads(arguments.compare.read_text())["results"])
@@ -0,0 +1,15 @@
+import importlib
+from types import ModuleType
+
+
+# The package imports none of its modules. The API only imports what serving needs (database, snapshot, indexes), the
+# crawler modules pull in aiohttp, Pillow and nltk and are only loaded by the scripts that crawl. A module that is used
+# as an attribute of the package, e.g. ratings.rating_sites, is imported on first use.
+
+def __getattr__(name: str) -> ModuleType:
+    try:
+        return importlib.import_module(f"{__name__}.{name}")
+    except ModuleNotFoundError as error:
+        if error.name != f"{__name__}.{name}":
+            raise
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple, Set, Hashable
+
+
+DEFAULT_MAX_ENTRIES: int = 1024
+DEFAULT_TIME_TO_LIVE_SECONDS: float = 3600
+
+# Key of the responses that do not belong to a single town, e.g. the list of all towns
+ALL_TOWNS: Optional[str] = None
+
+
+class ApiCache:
+
+    # Keeps the serialized responses of the API in memory. Every response belongs to a town, so that the responses of a
+    # town can be dropped as soon as the crawler wrote new data for it (see TownUpdateListener). Responses that do not
+    # belong to a single town are stored under ALL_TOWNS and are dropped on every update. The time to live only bounds
+    # how long a response may be stale when a notification got lost. The least recently used responses are evicted
+    # when the cache is full. A response that was computed while the cache got invalidated may be stale already, so it
+    # is only stored if the generation did not change in the meantime.
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, time_to_live_seconds: float = DEFAULT_TIME_TO_LIVE_SECONDS):
+        self._max_entries: int = max_entries
+        self._time_to_live_seconds: float = time_to_live_seconds
+        # key -> (expires at, response). The first entry is the least recently used one.
+        self._entries: OrderedDict = OrderedDict()
+        self._keys_of_town: Dict[Optional[str], Set[Tuple]] = {}
+        self._generation: int = 0
+        # Sync endpoints run in a thread pool, and the listener invalidates from a thread of its own
+        self._lock: Lock = Lock()
+
+    # Public Methods
+
+    def get(self, town: Optional[str], *key: Hashable) -> Optional[bytes]:
+        full_key: Tuple = (town, *key)
+        with self._lock:
+            entry: Optional[Tuple[float, bytes]] = self._entries.get(full_key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(full_key)
+                return None
+            self._entries.move_to_end(full_key)
+            return entry[1]
+
+    def get_generation(self) -> int:
+        return self._generation
+
+    def put(self, town: Optional[str], *key: Hashable, response: bytes, generation: int):
+        full_key: Tuple = (town, *key)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[full_key] = (time.monotonic() + self._time_to_live_seconds, response)
+            self._entries.move_to_end(full_key)
+            self._keys_of_town.setdefault(town, set()).add(full_key)
+            while len(self._entries) > self._max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_town(self, town: str):
+        with self._lock:
+            self._generation += 1
+            for key in self._keys_of_town.pop(town, set()) | self._keys_of_town.pop(ALL_TOWNS, set()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_of_town.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Private Methods
+
+    def _remove(self, key: Tuple):
+        self._entries.pop(key, None)
+        keys: Optional[Set[Tuple]] = self._keys_of_town.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if len(keys) == 0:
+                del self._keys_of_town[key[0]]
@@ -1,15 +1,27 @@
+from __future__ import annotations
+
+import asyncio
 import inspect
+import io
 import logging
-from typing import List, Dict, Any, Tuple, TypeVar, Type
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from operator import itemgetter
+from threading import BoundedSemaphore
+from typing import List, Dict, Any, Tuple, TypeVar, Type, Iterator, Optional, Callable
 
 import psycopg2
 from psycopg2.extensions import cursor as Cursor
 from psycopg2.extensions import connection as Connection
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import ThreadedConnectionPool
 
 from psycopg2.sql import SQL, Identifier, Composable, Literal
 from psycopg2.extras import execute_values
 from sqlalchemy import MetaData, create_engine
 from sqlalchemy.ext.declarative import DeclarativeMeta
+from sqlalchemy.orm.instrumentation import ClassManager, manager_of_class
 
 
 # Helper
@@ -30,38 +42,24 @@ class DbEntry:
     def upsert(self):
         self.postgres_db.upsert(self.table_name, self.data)
 
+    def replace(self, condition: Composable):
+        self.postgres_db.replace(self.table_name, self.data, condition)
+
 class DbResult:
 
-    def __init__(self, data: List[Dict]):
-        self.data = data
+    def __init__(self, rows: List[Tuple], column_names: List[str]):
+        self.rows: List[Tuple] = rows
+        self.column_names: Tuple[str, ...] = tuple(column_names)
+
+    @property
+    def data(self) -> List[Dict]:
+        return [dict(zip(self.column_names, row)) for row in self.rows]
 
     def convert_rows_to(self, type: Type[T], accept_error=False) -> List[T]:
-        # Get Info On Type
-        empty_instance: T = _instanciate_new_instance(type)
-        instance_variables: List[str] = _get_variables_of_type(empty_instance)
-        # Recreate Type
-        result: List[T] = []
-        for entry in self.data:
-            new_instance: T = _instanciate_new_instance(type)
-            for variable in instance_variables:
-                if variable in entry.keys():
-                    value = entry[variable]
-                # When the columns have duplicates (in joins), they need to be aliased in order for the mapping to work.
-                # We check if that is case. The alias has a specified scheme: "table_column". Aka a column
-                # "name" in table "movies" would be aliased as "movies_name".
-                elif self.get_column_alias(type.__tablename__, variable) in entry.keys():
-                    value = entry[self.get_column_alias(type.__tablename__, variable)]
-                # We can not find a fitting column
-                else:
-                    if not accept_error:
-                        raise Exception(f"Could not find a value for {variable}. Please check if your result contains duplicate"
-                                        f"column names. If yes, you need to alias the columns with 'table_column', for instance"
-                                        f"'movies_name'")
-                    logging.error(f"could not find value for column {variable}. We fill it with None")
-                    value = None
-                setattr(new_instance, variable, value)
-            result.append(new_instance)
-        return result
+        if len(self.rows) == 0:
+            return []
+        row_mapper: RowMapper = RowMapper.get(type, self.column_names, accept_error)
+        return row_mapper.convert(self.rows)
 
     def convert_to_two_types(self, first_type: Type[T], second_type: Type[S], accept_error=False) -> List[Tuple[T, S]]:
         result_wrong_shape = [self.convert_rows_to(type, accept_error) for type in [first_type, second_type]]
@@ -69,23 +67,93 @@ class DbResult:
         return list(zip(*result_wrong_shape))
 
     def convert_to_primitive_type(self, primitive_type: Type[T]) -> List[T]:
-        assert all([len(row) == 1 for row in self.data])
-        assert all([isinstance(list(row.values())[0], primitive_type) for row in self.data])
-        return [list(row.values())[0] for row in self.data]
+        assert len(self.column_names) == 1 or len(self.rows) == 0
+        assert all([isinstance(row[0], primitive_type) for row in self.rows])
+        return [row[0] for row in self.rows]
 
     @staticmethod
     def get_column_alias(table_name: str, column: str) -> str:
         return f"{table_name}_{column}"
 
 
+class RowMapper:
+
+    # Maps the rows of a query result to objects of a type. Which column belongs to which attribute is only resolved
+    # once per type and column names, after that the values are copied straight from the result tuples. SQLAlchemy
+    # objects are created without running their constructor, the same way SQLAlchemy itself loads rows.
+
+    _cache: Dict[Tuple[type, Tuple[str, ...], bool], RowMapper] = {}
+
+    def __init__(self, type: Type[T], column_names: Tuple[str, ...], accept_error: bool):
+        # Like in a dict of the row, a column that appears twice refers to its last occurrence
+        position_of_column: Dict[str, int] = {column_name: i for i, column_name in enumerate(column_names)}
+        table_name: Optional[str] = getattr(type, "__tablename__", None)
+        self._variables: List[str] = []
+        self._positions: List[int] = []
+        self._missing_variables: Dict[str, None] = {}
+        for variable in get_column_names(type):
+            if variable in position_of_column:
+                self._variables.append(variable)
+                self._positions.append(position_of_column[variable])
+            # When the columns have duplicates (in joins), they need to be aliased in order for the mapping to work.
+            # We check if that is case. The alias has a specified scheme: "table_column". Aka a column
+            # "name" in table "movies" would be aliased as "movies_name".
+            elif table_name is not None and DbResult.get_column_alias(table_name, variable) in position_of_column:
+                self._variables.append(variable)
+                self._positions.append(position_of_column[DbResult.get_column_alias(table_name, variable)])
+            # We can not find a fitting column
+            else:
+                if not accept_error:
+                    raise Exception(f"Could not find a value for {variable}. Please check if your result contains duplicate"
+                                    f"column names. If yes, you need to alias the columns with 'table_column', for instance"
+                                    f"'movies_name'")
+                logging.error(f"could not find value for column {variable}. We fill it with None")
+                self._missing_variables[variable] = None
+        self._create_instance: Callable[[], T] = _get_instance_factory(type)
+
+    @classmethod
+    def get(cls, type: Type[T], column_names: Tuple[str, ...], accept_error: bool) -> RowMapper:
+        key: Tuple[type, Tuple[str, ...], bool] = (type, column_names, accept_error)
+        if key not in cls._cache:
+            cls._cache[key] = RowMapper(type, column_names, accept_error)
+        return cls._cache[key]
+
+    def convert(self, rows: List[Tuple]) -> List[T]:
+        get_values: Callable[[Tuple], Tuple] = itemgetter(*self._positions) if len(self._positions) > 1 \
+            else lambda row: tuple(row[position] for position in self._positions)
+        variables: List[str] = self._variables
+        missing_variables: Dict[str, None] = self._missing_variables
+        result: List[T] = []
+        for row in rows:
+            new_instance: T = self._create_instance()
+            attributes: Dict[str, Any] = new_instance.__dict__
+            attributes.update(zip(variables, get_values(row)))
+            if missing_variables:
+                attributes.update(missing_variables)
+            result.append(new_instance)
+        return result
+
+
 # Database
 
 
+class TableMetadata:
+
+    # The tables only change with migrations, so we look up their columns and primary keys once. Connections from the
+    # same pool share the metadata.
+
+    def __init__(self):
+        self.column_names: Dict[str, List[str]] = {}
+        self.primary_keys: Dict[str, List[str]] = {}
+
+
 class PostgresDatabase:
 
-    def __init__(self, database_url: str):
-        self.connection: Connection = psycopg2.connect(database_url)
+    def __init__(self, database_url: str = None, connection: Connection = None, table_metadata: TableMetadata = None):
+        assert (database_url is None) != (connection is None), "Either pass a database url or an existing connection"
+        self.connection: Connection = connection if connection is not None else psycopg2.connect(database_url)
         self.cursor: Cursor = self.connection.cursor()
+        self._table_metadata: TableMetadata = table_metadata if table_metadata is not None else TableMetadata()
 
     def initialize_tables(self, database_url: str, base:DeclarativeMeta):
         engine = create_engine(database_url)
@@ -98,47 +166,61 @@ class PostgresDatabase:
         return tables
 
     def get_column_names(self, table_name: str) -> List[str]:
-        self.cursor.execute(SQL("SELECT * FROM {}").format(Identifier(table_name)))
-        columnnames: List[str] = [desc[0] for desc in self.cursor.description]
-        return columnnames
+        column_names: Dict[str, List[str]] = self._table_metadata.column_names
+        if table_name not in column_names:
+            self.cursor.execute(SQL("SELECT * FROM {} LIMIT 0").format(Identifier(table_name)))
+            column_names[table_name] = [desc[0] for desc in self.cursor.description]
+        return column_names[table_name]
 
     def insert(self, table_name: str, data: List[Dict[str, Any]]):
-        keys: List[str] = list(data[0].keys())
-        as_identifiers: List[Identifier] = [Identifier(key) for key in keys]
-        values = [list(entry.values()) for entry in data]
-        execute_values(self.cursor, SQL("INSERT INTO {table_name} ({fields}) VALUES %s") \
-                       .format(table_name=Identifier(table_name), fields=SQL(",").join(as_identifiers)),
-                       values)
+        self._insert_without_commit(table_name, data)
         self.connection.commit()
 
-    def upsert(self, table_name: str, data: List[Dict]):
+    def replace(self, table_name: str, data: List[Dict[str, Any]], condition: Composable):
+        # Deletes the rows matching the condition and inserts the new ones in a single transaction
+        self.cursor.execute(SQL("DELETE FROM {table_name} WHERE {condition}").format(table_name=Identifier(table_name),
+                                                                                      condition=condition))
+        if len(data) > 0:
+            self._insert_without_commit(table_name, data)
+        self.connection.commit()
+
+    def upsert(self, table_name: str, data: List[Dict], page_size: int = 1000):
+        if len(data) == 0:
+            return
         primary_keys: List[str] = self._get_primary_keys(table_name)
-        column_names: List[Identifier] = [Identifier(key) for key in data[0].keys()]
-        all_values: List[List[Any]] = [list(entry.values()) for entry in data]
-        for values in all_values:
-            remaining_columns: List[Identifier] = [column_name for column_name in column_names if
-                                                   not column_name.string in primary_keys]
-            as_literals: List[Literal] = [Literal(value) for value in values]
-            primary_keys_as_identifier = [Identifier(key) for key in primary_keys]
-            a = "(" if len(remaining_columns) > 1 else ""
-            b = ")" if len(remaining_columns) > 1 else ""
-            sql: Composable = SQL("INSERT INTO {table_name} ({fields}) VALUES ({as_literals}) "
-                                  "ON CONFLICT ({primary_keys}) "
-                                  "DO UPDATE SET" + a + "{remaining_columns}" + b + " = " + a + "{remaining_values}" + b) \
-                .format(table_name=Identifier(table_name), fields=SQL(",").join(column_names), as_literals=SQL(",").join(as_literals), primary_keys=SQL(",").join(primary_keys_as_identifier),
-                        remaining_columns=SQL(",").join(remaining_columns), remaining_values=SQL("EXCLUDED.") + SQL(", EXCLUDED.").join(remaining_columns))
-            self.cursor.execute(sql)
+        keys: List[str] = list(data[0].keys())
+        # A single statement can not update the same row twice, so only the last entry for every primary key is kept
+        unique_rows: Dict[Tuple, List[Any]] = {tuple(entry[key] for key in primary_keys): [entry[key] for key in keys] for entry in data}
+        remaining_columns: List[Identifier] = [Identifier(key) for key in keys if key not in primary_keys]
+        on_conflict: Composable = SQL("DO UPDATE SET ") + SQL(", ").join([SQL("{column} = EXCLUDED.{column}").format(column=column)
+                                                                        for column in remaining_columns]) \
+            if len(remaining_columns) > 0 else SQL("DO NOTHING")
+        sql: Composable = SQL("INSERT INTO {table_name} ({fields}) VALUES %s ON CONFLICT ({primary_keys}) {on_conflict}") \
+            .format(table_name=Identifier(table_name), fields=SQL(",").join([Identifier(key) for key in keys]),
+                    primary_keys=SQL(",").join([Identifier(key) for key in primary_keys]), on_conflict=on_conflict)
+        execute_values(self.cursor, sql, list(unique_rows.values()), page_size=page_size)
+        self.connection.commit()
+
+    def copy_upsert(self, table_name: str, columns: List[str], rows: List[Tuple]):
+        # Like upsert, but for many rows: they are streamed into a temporary table with COPY and merged from there
+        self._copy_upsert_without_commit(table_name, columns, rows)
+        self.connection.commit()
+
+    def copy_upsert_tables(self, tables: List[Tuple[str, List[str], List[Tuple]]]):
+        # Like copy_upsert for the table name, columns and rows of several tables, in a single transaction
+        for table_name, columns, rows in tables:
+            self._copy_upsert_without_commit(table_name, columns, rows)
+        self.connection.commit()
+
+    def execute(self, sql: Composable):
+        self.cursor.execute(sql)
         self.connection.commit()
 
     def get(self, sql: Composable) -> DbResult:
         self.cursor.execute(sql)
         results_raw: List[Tuple] = self.cursor.fetchall()
         columnnames: List[str] = [desc[0] for desc in self.cursor.description]
-        results: List[Dict] = []
-        for result in results_raw:
-            entry: Dict = dict(zip(columnnames, result))
-            results.append(entry)
-        return DbResult(results)
+        return DbResult(results_raw, columnnames)
 
     def convert_to_db_entry(self, data: List[T], table_name: str) -> DbEntry:
         column_names: List[str] = self.get_column_names(table_name)
@@ -153,7 +235,46 @@ class PostgresDatabase:
             db_entry.append(db_row)
         return DbEntry(self, table_name, db_entry)
 
+    def _insert_without_commit(self, table_name: str, data: List[Dict[str, Any]]):
+        keys: List[str] = list(data[0].keys())
+        as_identifiers: List[Identifier] = [Identifier(key) for key in keys]
+        values = [list(entry.values()) for entry in data]
+        execute_values(self.cursor, SQL("INSERT INTO {table_name} ({fields}) VALUES %s") \
+                       .format(table_name=Identifier(table_name), fields=SQL(",").join(as_identifiers)),
+                       values)
+
+    def _copy_upsert_without_commit(self, table_name: str, columns: List[str], rows: List[Tuple]):
+        if len(rows) == 0:
+            return
+        primary_keys: List[str] = self._get_primary_keys(table_name)
+        remaining_columns: List[Identifier] = [Identifier(column) for column in columns if column not in primary_keys]
+        on_conflict: Composable = SQL("DO UPDATE SET ") + SQL(", ").join([SQL("{column} = EXCLUDED.{column}").format(column=column)
+                                                                        for column in remaining_columns]) \
+            if len(remaining_columns) > 0 else SQL("DO NOTHING")
+        fields: Composable = SQL(",").join([Identifier(column) for column in columns])
+        staging_table: Identifier = Identifier(f"{table_name}_staging")
+        # COPY fills in the row number, since it is not among the copied columns, so it keeps the order of the rows
+        self.cursor.execute(SQL("CREATE TEMPORARY TABLE {staging_table} (LIKE {table_name}, staging_row_number BIGSERIAL) ON COMMIT DROP")
+                            .format(staging_table=staging_table, table_name=Identifier(table_name)))
+        copy_sql: Composable = SQL("COPY {staging_table} ({fields}) FROM STDIN WITH (FORMAT csv)").format(staging_table=staging_table, fields=fields)
+        self.cursor.copy_expert(copy_sql.as_string(self.connection), io.StringIO("".join(_to_csv_line(row) for row in rows)))
+        # A single statement can not update the same row twice, so only one row per primary key is merged. Like in
+        # upsert, the last one wins.
+        primary_key_fields: Composable = SQL(",").join([Identifier(key) for key in primary_keys])
+        self.cursor.execute(SQL("INSERT INTO {table_name} ({fields}) SELECT DISTINCT ON ({primary_keys}) {fields} FROM {staging_table} "
+                                "ORDER BY {primary_keys}, staging_row_number DESC ON CONFLICT ({primary_keys}) {on_conflict}")
+                            .format(table_name=Identifier(table_name), fields=fields, staging_table=staging_table,
+                                    primary_keys=primary_key_fields, on_conflict=on_conflict))
+        # So that the same table can be merged again in this transaction
+        self.cursor.execute(SQL("DROP TABLE {staging_table}").format(staging_table=staging_table))
+
     def _get_primary_keys(self, table_name: str) -> List[str]:
+        primary_keys: Dict[str, List[str]] = self._table_metadata.primary_keys
+        if table_name not in primary_keys:
+            primary_keys[table_name] = self._query_primary_keys(table_name)
+        return primary_keys[table_name]
+
+    def _query_primary_keys(self, table_name: str) -> List[str]:
         sql: Composable = SQL("SELECT a.attname, format_type(a.atttypid, a.atttypmod) AS data_type "
                               "FROM pg_index i JOIN  pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
                               "WHERE  i.indrelid = {table_name}::regclass AND i.indisprimary") \
@@ -162,10 +283,126 @@ class PostgresDatabase:
         return [result["attname"] for result in results]
 
 
-def get_column_names(table: DeclarativeMeta):
-    # noinspection PyTypeChecker
-    instance = _instanciate_new_instance(table)
-    return _get_variables_of_type(instance)
+class PostgresConnectionPool:
+
+    # Hands out one connection per request, so that concurrent requests of the API do not share a cursor. Connections
+    # that were idle for a while are checked with a "SELECT 1" before they are handed out.
+
+    def __init__(self, database_url: str, min_connections: int = 1, max_connections: int = 10, health_check_after_seconds: float = 30):
+        self._pool: ThreadedConnectionPool = ThreadedConnectionPool(min_connections, max_connections, database_url)
+        # The pool raises instead of waiting when all connections are in use, so we wait on the semaphore first
+        self._available: BoundedSemaphore = BoundedSemaphore(max_connections)
+        self._max_connections: int = max_connections
+        self._health_check_after_seconds: float = health_check_after_seconds
+        self._last_used: Dict[int, float] = {}
+        self._table_metadata: TableMetadata = TableMetadata()
+
+    # Public Methods
+
+    @contextmanager
+    def connection(self) -> Iterator[PostgresDatabase]:
+        self._available.acquire()
+        try:
+            connection: Connection = self._checkout()
+            postgres_db: PostgresDatabase = PostgresDatabase(connection=connection, table_metadata=self._table_metadata)
+            try:
+                yield postgres_db
+            finally:
+                postgres_db.cursor.close()
+                self._return(connection)
+        finally:
+            self._available.release()
+
+    def execute(self, sql: Composable):
+        with self.connection() as postgres_db:
+            postgres_db.execute(sql)
+
+    def get(self, sql: Composable) -> DbResult:
+        with self.connection() as postgres_db:
+            return postgres_db.get(sql)
+
+    async def get_async(self, sql: Composable) -> DbResult:
+        # For async endpoints: the blocking query runs in the default executor, so the event loop keeps serving
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, sql)
+
+    def close(self):
+        self._pool.closeall()
+
+    # Private Methods
+
+    def _checkout(self) -> Connection:
+        for attempt in range(self._max_connections + 1):
+            connection: Connection = self._pool.getconn()
+            if self._is_healthy(connection):
+                return connection
+            logging.warning("Discarding broken database connection")
+            self._last_used.pop(id(connection), None)
+            self._pool.putconn(connection, close=True)
+        raise psycopg2.OperationalError("Could not get a working connection from the pool")
+
+    def _is_healthy(self, connection: Connection) -> bool:
+        if connection.closed:
+            return False
+        idle_seconds: float = time.monotonic() - self._last_used.get(id(connection), 0)
+        if idle_seconds < self._health_check_after_seconds:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _return(self, connection: Connection):
+        if not connection.closed and connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        self._last_used[id(connection)] = time.monotonic()
+        self._pool.putconn(connection, close=bool(connection.closed))
+
+
+# COPY In CSV Format. Unquoted empty fields are NULL, so every value is quoted.
+
+def _to_csv_line(row: Tuple) -> str:
+    return ",".join(_to_csv_value(value) for value in row) + "\n"
+
+def _to_csv_value(value: Any) -> str:
+    if value is None:
+        return ""
+    return '"' + _to_postgres_text(value).replace('"', '""') + '"'
+
+def _to_postgres_text(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        elements: List[str] = ["NULL" if element is None else
+                               '"' + _to_postgres_text(element).replace("\\", "\\\\").replace('"', '\\"') + '"'
+                               for element in value]
+        return "{" + ",".join(elements) + "}"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+_variables_of_type: Dict[type, List[str]] = {}
+
+def get_column_names(table: DeclarativeMeta) -> List[str]:
+    if table not in _variables_of_type:
+        # noinspection PyTypeChecker
+        instance = _instanciate_new_instance(table)
+        _variables_of_type[table] = _get_variables_of_type(instance)
+    return _variables_of_type[table]
+
+def _get_instance_factory(type: Type[T]) -> Callable[[], T]:
+    manager: Optional[ClassManager] = manager_of_class(type)
+    if manager is not None:
+        return manager.new_instance
+    # Plain classes are still created through their constructor, but we only inspect it once
+    constructor_arguments: List = list(inspect.signature(type.__init__).parameters.keys())
+    arguments: Dict = {key: None for key in constructor_arguments if not key == "self"}
+    try:
+        type(**arguments)
+        return lambda: type(**arguments)
+    except TypeError:
+        return type
 
 def _instanciate_new_instance(type: Type[T]) -> T:
     constructor_arguments: List = list(inspect.signature(type.__init__).parameters.keys())
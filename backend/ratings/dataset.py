@@ -0,0 +1,166 @@
+import json
+import logging
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set, Tuple
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Integer, Float, DateTime, String, ARRAY
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from ratings import sql
+from ratings.database import PostgresDatabase, DbResult, get_column_names
+from ratings.photo_store import PhotoStore
+from ratings.ranking import refresh_town_ranking
+from ratings.restaurant import GoogleMapsResult, TripAdvisorResult, CombinedRestaurant, PhotoVariant
+
+
+# Increased when the layout of the files changes, the schema of the tables is versioned by the alembic revision
+DATASET_FORMAT_VERSION: int = 1
+MANIFEST_FILE: str = "manifest.json"
+PHOTOS_DIRECTORY: str = "photos"
+COMPRESSION: str = "zstd"
+# In the order they are imported
+TABLES: List[DeclarativeMeta] = [GoogleMapsResult, TripAdvisorResult, CombinedRestaurant, PhotoVariant]
+
+
+class IncompatibleDatasetError(Exception):
+    pass
+
+
+# Export
+
+def export_dataset(postgres_db: PostgresDatabase, directory: Path, photo_store: PhotoStore, towns: Set[str] = None) -> Dict:
+    # Writes the restaurants of every town to <directory>/country=<country>/town=<town>/<table>.parquet. The photos are
+    # no table columns but files, they are copied to <directory>/photos, which is laid out like the photo store.
+    # Returns the manifest, which is also written to the directory.
+    directory.mkdir(parents=True, exist_ok=False)
+    dataset_photos: PhotoStore = PhotoStore(directory / PHOTOS_DIRECTORY)
+    manifest: Dict[str, Any] = {"format_version": DATASET_FORMAT_VERSION, "exported_at": datetime.utcnow().isoformat(),
+                                "schema_revision": get_schema_revision(postgres_db), "partitions": [], "missing_photos": 0}
+    all_towns: List[Tuple[str, str]] = postgres_db.get(sql.get_all_towns_with_country()).rows
+    for country, town in all_towns:
+        if towns is not None and town not in towns:
+            continue
+        partition: Path = get_partition_path(directory, country, town)
+        partition.mkdir(parents=True)
+        row_counts: Dict[str, int] = {}
+        tables: Dict[DeclarativeMeta, pa.Table] = {}
+        for table in TABLES:
+            tables[table] = _read_table(postgres_db, table, town)
+            # noinspection PyUnresolvedReferences
+            table_name: str = table.__tablename__
+            pq.write_table(tables[table], str(partition / f"{table_name}.parquet"), compression=COMPRESSION)
+            row_counts[table_name] = tables[table].num_rows
+        for photo_hash in get_photo_hashes(tables[GoogleMapsResult], tables[PhotoVariant]):
+            if not photo_store.contains(photo_hash):
+                manifest["missing_photos"] += 1
+                continue
+            _copy_photo(photo_store, dataset_photos, photo_hash)
+        manifest["partitions"].append({"country": country, "town": town, "path": str(partition.relative_to(directory)),
+                                       "rows": row_counts})
+        logging.info(f"exported {town}: {row_counts}")
+    (directory / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+def _read_table(postgres_db: PostgresDatabase, table: DeclarativeMeta, town: str) -> pa.Table:
+    query = sql.get_photo_variants_of_town(town) if table is PhotoVariant else sql.get_restaurants_of_town(table, town)
+    result: DbResult = postgres_db.get(query)
+    schema: pa.Schema = get_arrow_schema(table)
+    columns: List[List[Any]] = [list(column) for column in zip(*result.rows)] if len(result.rows) > 0 \
+        else [[] for _ in schema.names]
+    return pa.Table.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+def _copy_photo(source: PhotoStore, target: PhotoStore, photo_hash: str):
+    path: Path = target.get_path(photo_hash)
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(source.get_path(photo_hash), path)
+
+
+# Import
+
+def import_dataset(postgres_db: PostgresDatabase, directory: Path, photo_store: PhotoStore, towns: Set[str] = None) -> List[str]:
+    # Loads the partitions into the database with COPY. Rows that already exist are overwritten, so a dataset can be
+    # imported on top of a crawled database. Returns the imported towns, whose rankings are recomputed afterwards.
+    manifest: Dict[str, Any] = read_manifest(directory)
+    database_revision: str = get_schema_revision(postgres_db)
+    if manifest["schema_revision"] != database_revision:
+        raise IncompatibleDatasetError(f"The dataset was exported at revision {manifest['schema_revision']}, but the "
+                                       f"database is at {database_revision}. Migrate the database with alembic first.")
+    dataset_photos: PhotoStore = PhotoStore(directory / PHOTOS_DIRECTORY)
+    imported_towns: List[str] = []
+    for partition in manifest["partitions"]:
+        if towns is not None and partition["town"] not in towns:
+            continue
+        tables: Dict[DeclarativeMeta, pa.Table] = {}
+        for table in TABLES:
+            # noinspection PyUnresolvedReferences
+            tables[table] = pq.read_table(str(directory / partition["path"] / f"{table.__tablename__}.parquet"))
+        # The photos first, so that the database never refers to a photo that is not there
+        for photo_hash in get_photo_hashes(tables[GoogleMapsResult], tables[PhotoVariant]):
+            if not photo_store.contains(photo_hash) and dataset_photos.contains(photo_hash):
+                _import_photo(dataset_photos, photo_store, photo_hash)
+        # All tables of a town in one transaction, so that a failure never leaves a town half imported
+        # noinspection PyUnresolvedReferences
+        postgres_db.copy_upsert_tables([(table.__tablename__, *_to_rows(tables[table])) for table in TABLES])
+        imported_towns.append(partition["town"])
+        logging.info(f"imported {partition['town']}: {partition['rows']}")
+    for town in imported_towns:
+        refresh_town_ranking(postgres_db, town)
+    return imported_towns
+
+def _import_photo(source: PhotoStore, target: PhotoStore, photo_hash: str):
+    # The photo store hashes the content again, which catches files that were damaged on the way
+    stored_hash: str = target.put(source.get(photo_hash))
+    if stored_hash != photo_hash:
+        raise IncompatibleDatasetError(f"The photo {photo_hash} of the dataset is damaged")
+
+def _to_rows(arrow_table: pa.Table) -> Tuple[List[str], List[Tuple]]:
+    columns: Dict[str, List[Any]] = arrow_table.to_pydict()
+    return list(columns.keys()), list(zip(*columns.values()))
+
+
+# Helpers
+
+def get_arrow_schema(table: DeclarativeMeta) -> pa.Schema:
+    # noinspection PyUnresolvedReferences
+    columns = table.__table__.columns
+    return pa.schema([pa.field(column, _get_arrow_type(columns[column].type)) for column in get_column_names(table)])
+
+def _get_arrow_type(column_type: Any) -> pa.DataType:
+    if isinstance(column_type, ARRAY):
+        return pa.list_(_get_arrow_type(column_type.item_type))
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, String):
+        return pa.string()
+    raise ValueError(f"Can not export columns of type {column_type}")
+
+def get_photo_hashes(google_maps: pa.Table, photo_variants: pa.Table) -> Set[str]:
+    # The photos of the restaurants and their variants
+    photo_hashes: Set[str] = {photo_hash for photos in google_maps.column("photos").to_pylist() if photos is not None
+                              for photo_hash in photos if photo_hash is not None}
+    photo_hashes.update(variant_hash for variant_hash in photo_variants.column("variant_hash").to_pylist() if variant_hash is not None)
+    return photo_hashes
+
+def get_partition_path(directory: Path, country: Optional[str], town: str) -> Path:
+    # Town names may contain characters that are not allowed in paths
+    return directory / f"country={quote(country or '', safe=' ')}" / f"town={quote(town, safe=' ')}"
+
+def read_manifest(directory: Path) -> Dict[str, Any]:
+    manifest: Dict[str, Any] = json.loads((directory / MANIFEST_FILE).read_text())
+    if manifest["format_version"] != DATASET_FORMAT_VERSION:
+        raise IncompatibleDatasetError(f"Can not read datasets of version {manifest['format_version']}")
+    return manifest
+
+def get_schema_revision(postgres_db: PostgresDatabase) -> str:
+    return postgres_db.get(sql.get_schema_revision()).convert_to_primitive_type(str)[0]
@@ -0,0 +1,101 @@
+import math
+from typing import List, Tuple, Dict, Generic, TypeVar, Optional
+
+import numpy as np
+
+
+T = TypeVar('T')
+
+EARTH_RADIUS_METERS: float = 6371000
+METERS_PER_DEGREE_OF_LATITUDE: float = 2 * math.pi * EARTH_RADIUS_METERS / 360
+DEFAULT_CELL_SIZE_METERS: float = 2000
+
+
+class GeoIndex(Generic[T]):
+
+    # Finds the items within a radius of a point. The items are put into a grid of cells of about the same size in
+    # meters, so a query only looks at the cells that overlap the radius instead of at all items. The distances within
+    # those cells are computed in one vectorized pass.
+
+    def __init__(self, locations: List[Tuple[float, float]], items: List[T], cell_size_meters: float = DEFAULT_CELL_SIZE_METERS):
+        assert len(locations) == len(items)
+        self._cell_size_degrees: float = cell_size_meters / METERS_PER_DEGREE_OF_LATITUDE
+        lats: np.ndarray = np.array([lat for lat, _ in locations], dtype=np.float64)
+        lngs: np.ndarray = np.array([lng for _, lng in locations], dtype=np.float64)
+        rows, columns = self._get_cells(lats, lngs)
+        # Sort by cell, so that every cell is a slice of the arrays
+        order: np.ndarray = np.lexsort((columns, rows))
+        self._items: List[T] = [items[i] for i in order.tolist()]
+        self._lats: np.ndarray = lats[order]
+        self._lngs: np.ndarray = lngs[order]
+        rows, columns = rows[order], columns[order]
+        is_first_of_cell: np.ndarray = np.ones(len(order), dtype=bool)
+        is_first_of_cell[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+        starts: np.ndarray = np.flatnonzero(is_first_of_cell)
+        ends: np.ndarray = np.append(starts[1:], len(order))
+        self._slice_of_cell: Dict[Tuple[int, int], Tuple[int, int]] = {
+            (row, column): (start, end) for row, column, start, end
+            in zip(rows[starts].tolist(), columns[starts].tolist(), starts.tolist(), ends.tolist())}
+
+    # Public Methods
+
+    def get_within(self, lat: float, lng: float, radius_meters: float) -> List[Tuple[T, float]]:
+        # All items within the radius with their distance, the closest first
+        positions: np.ndarray = self._get_candidate_positions(lat, lng, radius_meters)
+        if len(positions) == 0:
+            return []
+        distances: np.ndarray = get_distances_in_meters(lat, lng, self._lats[positions], self._lngs[positions])
+        within: np.ndarray = np.flatnonzero(distances <= radius_meters)
+        within = within[np.argsort(distances[within], kind="stable")]
+        return [(self._items[positions[i]], float(distances[i])) for i in within]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # Private Methods
+
+    def _get_cells(self, lats: np.ndarray, lngs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # The cells of a row are as wide in meters as they are high, so they get wider in degrees towards the poles
+        rows: np.ndarray = np.floor(lats / self._cell_size_degrees).astype(np.int64)
+        edges: np.ndarray = np.minimum(np.abs(rows), np.abs(rows + 1)) * self._cell_size_degrees
+        scales: np.ndarray = np.maximum(np.cos(np.radians(np.minimum(edges, 89.0))), 1e-6)
+        return rows, np.floor(lngs * scales / self._cell_size_degrees).astype(np.int64)
+
+    def _get_longitude_scale(self, row: int) -> float:
+        # Using the latitude of the edge of the row that is closer to the equator, so that the cells are never too small
+        edge: float = min(abs(row), abs(row + 1)) * self._cell_size_degrees
+        return max(math.cos(math.radians(min(edge, 89.0))), 1e-6)
+
+    def _get_candidate_positions(self, lat: float, lng: float, radius_meters: float) -> np.ndarray:
+        # A little more than the radius, the exact distances are checked afterwards anyway
+        radius_degrees: float = radius_meters / METERS_PER_DEGREE_OF_LATITUDE * 1.01
+        first_row: int = math.floor((lat - radius_degrees) / self._cell_size_degrees)
+        last_row: int = math.floor((lat + radius_degrees) / self._cell_size_degrees)
+        slices: List[np.ndarray] = []
+        for row in range(first_row, last_row + 1):
+            scale: float = self._get_longitude_scale(row)
+            # The radius in degrees of longitude grows towards the poles, we take the widest point of the row
+            widest_latitude: float = min(max(abs(row), abs(row + 1)) * self._cell_size_degrees, 89.0)
+            lng_radius_degrees: float = radius_degrees / max(math.cos(math.radians(widest_latitude)), 1e-6)
+            first_column: int = math.floor((lng - lng_radius_degrees) * scale / self._cell_size_degrees)
+            last_column: int = math.floor((lng + lng_radius_degrees) * scale / self._cell_size_degrees)
+            for column in range(first_column, last_column + 1):
+                cell_slice: Optional[Tuple[int, int]] = self._slice_of_cell.get((row, column))
+                if cell_slice is not None:
+                    slices.append(np.arange(*cell_slice))
+        return np.concatenate(slices) if len(slices) > 0 else np.zeros(0, dtype=np.int64)
+
+
+def get_distance_in_meters(first: Tuple[float, float], second: Tuple[float, float]) -> float:
+    # Haversine Formula
+    lat_1, lng_1 = math.radians(first[0]), math.radians(first[1])
+    lat_2, lng_2 = math.radians(second[0]), math.radians(second[1])
+    a: float = math.sin((lat_2 - lat_1) / 2) ** 2 + math.cos(lat_1) * math.cos(lat_2) * math.sin((lng_2 - lng_1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+def get_distances_in_meters(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    # Same as get_distance_in_meters, from one point to many
+    lat_1, lng_1 = math.radians(lat), math.radians(lng)
+    lats_2, lngs_2 = np.radians(lats), np.radians(lngs)
+    a: np.ndarray = np.sin((lats_2 - lat_1) / 2) ** 2 + math.cos(lat_1) * np.cos(lats_2) * np.sin((lngs_2 - lng_1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1)))
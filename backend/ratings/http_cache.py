@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, List, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode, urlunsplit
+
+
+DEFAULT_HTTP_CACHE_PATH: str = "data/http_cache"
+DEFAULT_MAX_SIZE_BYTES: int = 500 * 1024 * 1024
+
+# Endpoints without a time to live (e.g. photos, which end up in the photo store anyway) are not cached
+DEFAULT_TIME_TO_LIVE: Dict[str, timedelta] = {
+    "textsearch": timedelta(days=1),
+    "findplacefromtext": timedelta(days=7),
+    "details": timedelta(days=1),
+    "customsearch": timedelta(days=30),
+    "tripadvisor": timedelta(days=1),
+}
+
+
+class CacheMissError(Exception):
+    pass
+
+
+class ResponseCache:
+
+    # Stores the responses of the crawlers on disk, keyed by the normalized url. Re-running the crawler (e.g. after a
+    # crash) then does not need to query the providers again. The least recently used responses are evicted when the
+    # cache grows above its maximum size. In offline mode, every request must be answered from the cache, which allows
+    # replaying recorded crawls without network access. All methods touch the disk, so the async client calls them in
+    # an executor. The size is shared by those threads and guarded by a lock.
+
+    def __init__(self, directory: Path, time_to_live: Dict[str, timedelta] = None, max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES,
+                 offline: bool = False):
+        self._directory: Path = directory
+        self._time_to_live: Dict[str, timedelta] = time_to_live if time_to_live is not None else DEFAULT_TIME_TO_LIVE
+        self._max_size_bytes: int = max_size_bytes
+        self.offline: bool = offline
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._size_lock: Lock = Lock()
+        self._size_bytes: int = sum(size for _, _, size in self._get_entries())
+
+    # Public Methods
+
+    def get(self, url: str) -> Optional[bytes]:
+        path: Path = self._get_path(url)
+        try:
+            with path.open("rb") as file:
+                header: dict = json.loads(file.readline())
+                body: bytes = file.read()
+        except FileNotFoundError:
+            return self._handle_miss(url)
+        if not self.offline and time.time() - header["fetched_at"] > self._get_time_to_live(url).total_seconds():
+            return self._handle_miss(url)
+        # Mark as recently used for the eviction. The file may have been evicted since we read it, which is fine.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return body
+
+    def contains(self, url: str) -> bool:
+        if not self.is_cacheable(url):
+            return False
+        try:
+            with self._get_path(url).open("rb") as file:
+                header: dict = json.loads(file.readline())
+        except FileNotFoundError:
+            return False
+        return self.offline or time.time() - header["fetched_at"] <= self._get_time_to_live(url).total_seconds()
+
+    def put(self, url: str, body: bytes):
+        if not self.is_cacheable(url) or self.offline:
+            return
+        path: Path = self._get_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header: bytes = json.dumps({"url": normalize_url(url), "fetched_at": time.time()}).encode() + b"\n"
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(header)
+            file.write(body)
+        with self._size_lock:
+            # A response that is fetched again after it expired replaces the old one
+            try:
+                replaced_size: int = path.stat().st_size
+            except FileNotFoundError:
+                replaced_size = 0
+            os.replace(temporary_path, path)
+            self._size_bytes += len(header) + len(body) - replaced_size
+            if self._size_bytes > self._max_size_bytes:
+                self._evict()
+
+    def is_cacheable(self, url: str) -> bool:
+        return get_endpoint(url) in self._time_to_live
+
+    # Private Methods
+
+    def _handle_miss(self, url: str) -> None:
+        if self.offline:
+            raise CacheMissError(f"{normalize_url(url)} is not in the cache and we are offline")
+        return None
+
+    def _get_time_to_live(self, url: str) -> timedelta:
+        return self._time_to_live.get(get_endpoint(url), timedelta(0))
+
+    def _get_path(self, url: str) -> Path:
+        key: str = hashlib.sha256(normalize_url(url).encode()).hexdigest()
+        return self._directory / key[:2] / key
+
+    def _get_entries(self) -> List[Tuple[Path, float, int]]:
+        entries: List[Tuple[Path, float, int]] = []
+        for shard in self._directory.iterdir():
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard):
+                stat = entry.stat()
+                entries.append((Path(entry.path), stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # Evict the least recently used responses until we have some room again. Called with the size lock held.
+        target_size: int = int(self._max_size_bytes * 0.9)
+        entries: List[Tuple[Path, float, int]] = sorted(self._get_entries(), key=lambda entry: entry[1])
+        self._size_bytes = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self._size_bytes <= target_size:
+                break
+            try:
+                path.unlink()
+                self._size_bytes -= size
+            except FileNotFoundError:
+                logging.warning(f"{path} was already evicted")
+
+
+def normalize_url(url: str) -> str:
+    # The api key is not part of the key, so that the cache survives key changes and recorded responses do not
+    # contain it. The query parameters are sorted, so that their order does not matter.
+    parts = urlsplit(url)
+    query: List[Tuple[str, str]] = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != "key")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+def get_endpoint(url: str) -> str:
+    parts = urlsplit(url)
+    host: str = parts.netloc.lower()
+    if host == "maps.googleapis.com":
+        # e.g. /maps/api/place/textsearch/json or /maps/api/place/photo
+        path_parts: List[str] = [part for part in parts.path.split("/") if part and part != "json"]
+        return path_parts[-1]
+    if host == "www.googleapis.com" and parts.path.startswith("/customsearch"):
+        return "customsearch"
+    if "tripadvisor" in host:
+        return "tripadvisor"
+    return host
+
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(Path(os.environ.get("HTTP_CACHE_PATH", DEFAULT_HTTP_CACHE_PATH)),
+                         offline=os.environ.get("CRAWLER_OFFLINE", "0") == "1")
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Optional, Dict, Callable, Awaitable, TypeVar, Tuple
+from urllib.parse import urlsplit
+
+from aiohttp import ClientSession, TCPConnector, ClientTimeout
+
+from ratings.http_cache import ResponseCache, get_response_cache
+from ratings.metrics import CrawlMetrics, get_current_metrics
+from ratings.rate_limiter import RateLimiter, get_rate_limiter, FIRST_BACKOFF_SECONDS
+
+
+T = TypeVar('T')
+
+# Requests that the provider rejected because of the rate are sent again after a pause, so that the work already done
+# for a town is not lost
+MAX_RATE_LIMIT_RETRIES: int = 5
+
+
+# Client
+
+
+class AsyncHttpClient:
+    # Shared HTTP client for the crawlers. Connections are kept alive and the number of parallel requests is bounded
+    # per host, so that we can fire off all requests of a town at once without overrunning a single provider. Responses
+    # are answered from the cache when possible. The rate limiter spaces out the requests to the rate and budget of each
+    # endpoint, which it shares with the other crawler processes on the host.
+
+    def __init__(self, connections_per_host: int = 8, total_connections: int = 64, timeout_seconds: float = 60,
+                 host_limits: Dict[str, int] = None, cache: ResponseCache = None, rate_limiter: RateLimiter = None):
+        self._connections_per_host: int = connections_per_host
+        self._total_connections: int = total_connections
+        self._timeout_seconds: float = timeout_seconds
+        self._host_limits: Dict[str, int] = host_limits if host_limits is not None else {}
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._session: Optional[ClientSession] = None
+        self._cache: Optional[ResponseCache] = cache
+        self._rate_limiter: Optional[RateLimiter] = rate_limiter
+
+    async def __aenter__(self) -> AsyncHttpClient:
+        connections_per_host: int = max([self._connections_per_host] + list(self._host_limits.values()))
+        connector: TCPConnector = TCPConnector(limit=self._total_connections, limit_per_host=connections_per_host,
+                                               keepalive_timeout=30)
+        self._session = ClientSession(connector=connector, timeout=ClientTimeout(total=self._timeout_seconds))
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._session.close()
+        self._session = None
+
+    # Public Methods
+
+    async def get_json(self, url: str) -> dict:
+        cached: Optional[bytes] = await self._get_cached(url)
+        if cached is not None:
+            return json.loads(cached)
+        retries: int = 0
+        while True:
+            status, body = await self._fetch(url)
+            data: dict = json.loads(body)
+            # Google answers errors like OVER_QUERY_LIMIT with status 200, those must not end up in the cache
+            if status == 200 and data.get("status", "OK") in ["OK", "ZERO_RESULTS"]:
+                await self._put_cached(url, body)
+                return data
+            if status == 200:
+                self._record_error(url, data["status"])
+            if not (status == 429 or data.get("status") == "OVER_QUERY_LIMIT") or retries == MAX_RATE_LIMIT_RETRIES:
+                return data
+            retries += 1
+            await self._back_off(url, retries)
+
+    async def get_text(self, url: str) -> str:
+        return (await self.get_bytes(url)).decode("utf-8", errors="replace")
+
+    async def get_bytes(self, url: str) -> bytes:
+        cached: Optional[bytes] = await self._get_cached(url)
+        if cached is not None:
+            return cached
+        retries: int = 0
+        while True:
+            status, body = await self._fetch(url)
+            if status == 200:
+                await self._put_cached(url, body)
+            if status != 429 or retries == MAX_RATE_LIMIT_RETRIES:
+                return body
+            retries += 1
+            await self._back_off(url, retries)
+
+    async def is_cached(self, url: str) -> bool:
+        if self._cache is None:
+            return False
+        return await asyncio.get_running_loop().run_in_executor(None, self._cache.contains, url)
+
+    def get_remaining_budgets(self) -> Dict[str, Optional[int]]:
+        return self._rate_limiter.get_remaining_budgets() if self._rate_limiter is not None else {}
+
+    # Private Methods
+
+    async def _fetch(self, url: str) -> Tuple[int, bytes]:
+        waiting_since: float = time.perf_counter()
+        if self._rate_limiter is not None:
+            # The limiter waits for a file lock that other crawler processes may hold, which must not block the loop
+            wait_seconds: float = await asyncio.get_running_loop().run_in_executor(None, self._rate_limiter.reserve, url)
+            await asyncio.sleep(wait_seconds)
+        async with self._get_host_semaphore(url):
+            started_at: float = time.perf_counter()
+            try:
+                async with self._session.get(url) as response:
+                    status, body = response.status, await response.read()
+            except Exception as error:
+                self._record_error(url, type(error).__name__)
+                raise
+        metrics: Optional[CrawlMetrics] = get_current_metrics()
+        if metrics is not None:
+            metrics.record_request(url, time.perf_counter() - started_at, wait_seconds=started_at - waiting_since)
+        if status != 200:
+            self._record_error(url, f"HTTP {status}")
+        return status, body
+
+    async def _back_off(self, url: str, retries: int):
+        # With a rate limiter, the pause applies to all requests to the endpoint, also those of the other processes
+        if self._rate_limiter is not None:
+            await asyncio.sleep(await asyncio.get_running_loop().run_in_executor(None, self._rate_limiter.back_off, url))
+        else:
+            await asyncio.sleep(FIRST_BACKOFF_SECONDS * 2 ** (retries - 1))
+
+    async def _get_cached(self, url: str) -> Optional[bytes]:
+        # The cache reads and writes files, which must not block the loop
+        if self._cache is None or not self._cache.is_cacheable(url):
+            return None
+        body: Optional[bytes] = await asyncio.get_running_loop().run_in_executor(None, self._cache.get, url)
+        metrics: Optional[CrawlMetrics] = get_current_metrics()
+        if body is not None and metrics is not None:
+            metrics.record_cache_hit(url)
+        return body
+
+    def _record_error(self, url: str, error: str):
+        metrics: Optional[CrawlMetrics] = get_current_metrics()
+        if metrics is not None:
+            metrics.record_error(url, error)
+
+    async def _put_cached(self, url: str, body: bytes):
+        if self._cache is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._cache.put, url, body)
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        # The connector already bounds the connections per host. Hosts with an explicit limit get an additional
+        # semaphore, e.g. to stay below the rate a provider tolerates.
+        host: str = urlsplit(url).hostname
+        if host not in self._host_semaphores:
+            limit: int = self._host_limits.get(host, self._connections_per_host)
+            self._host_semaphores[host] = asyncio.Semaphore(limit)
+        return self._host_semaphores[host]
+
+
+# Running Async Code From Sync Code
+
+
+def run_with_client(function: Callable[[AsyncHttpClient], Awaitable[T]], **client_options) -> T:
+    if "cache" not in client_options:
+        client_options["cache"] = get_response_cache()
+    if "rate_limiter" not in client_options:
+        client_options["rate_limiter"] = get_rate_limiter()
+
+    async def run() -> T:
+        async with AsyncHttpClient(**client_options) as client:
+            return await function(client)
+    return asyncio.run(run())
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import math
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import List, Optional, Dict, Tuple, Set
+
+import numpy as np
+
+from ratings.restaurant import RestaurantResult
+
+
+MATCH_CUTOFF: float = 0.75
+
+
+class RestaurantMatcher:
+
+    # Finds the same restaurant in the results of another site. It gives the same result as
+    # difflib.get_close_matches(name, names, n=1, cutoff=0.75) on the formatted names, but the names are only formatted
+    # and indexed once, and the expensive SequenceMatcher.ratio() only runs for candidates that can still beat the best
+    # match:
+    # - Names whose length differs too much can never reach the cutoff, they are skipped with a binary search.
+    # - For the remaining names, the upper bound of the ratio is computed from the shared characters (like
+    #   difflib.quick_ratio) in one vectorized pass over the character counts.
+    # - The candidates are tried from the highest bound down, ties ordered by shared trigrams, and we stop as soon as
+    #   no remaining candidate can beat the best match.
+
+    def __init__(self, restaurants: List[RestaurantResult]):
+        self.restaurants: List[RestaurantResult] = restaurants
+        # Index Names. As in the linear search, a name stands for the first restaurant with that name.
+        first_restaurant_with_name: Dict[str, RestaurantResult] = {}
+        for restaurant in restaurants:
+            first_restaurant_with_name.setdefault(get_formatted_name(restaurant.name), restaurant)
+        self._names: List[str] = sorted(first_restaurant_with_name.keys(), key=len)
+        self._name_lengths: np.ndarray = np.array([len(name) for name in self._names], dtype=np.int64)
+        self._restaurant_of_name: List[RestaurantResult] = [first_restaurant_with_name[name] for name in self._names]
+        # Index Characters And Trigrams
+        self._alphabet: Dict[str, int] = {character: i for i, character in enumerate(sorted(set("".join(self._names))))}
+        self._character_counts: np.ndarray = np.zeros((len(self._names), len(self._alphabet)), dtype=np.int64)
+        for i, name in enumerate(self._names):
+            for character, count in Counter(name).items():
+                self._character_counts[i, self._alphabet[character]] = count
+        self._trigrams: List[Set[str]] = [set(_get_trigrams(name)) for name in self._names]
+
+    # Public Methods
+
+    def get_same_restaurant(self, restaurant: RestaurantResult) -> Optional[RestaurantResult]:
+        name: str = get_formatted_name(restaurant.name)
+        matcher: SequenceMatcher = SequenceMatcher()
+        matcher.set_seq2(name)
+        best_match: Optional[Tuple[float, str]] = None
+        best_index: Optional[int] = None
+        for i, upper_bound in self._get_candidates(name):
+            if best_match is not None and upper_bound < best_match[0]:
+                break
+            candidate: str = self._names[i]
+            matcher.set_seq1(candidate)
+            ratio: float = matcher.ratio()
+            # Ties are broken like in get_close_matches, which takes the largest (ratio, name) tuple
+            if ratio >= MATCH_CUTOFF and (best_match is None or (ratio, candidate) > best_match):
+                best_match = (ratio, candidate)
+                best_index = i
+        if best_index is None:
+            return None
+        return self._restaurant_of_name[best_index]
+
+    # Private Methods
+
+    def _get_candidates(self, name: str) -> List[Tuple[int, float]]:
+        # Only names with a similar length can reach the cutoff: 2 * min(a, b) / (a + b) >= cutoff. The exact check is
+        # done below, the range here is a bit wider to be safe from rounding.
+        minimum_length: int = math.floor(len(name) * MATCH_CUTOFF / (2 - MATCH_CUTOFF)) - 1
+        maximum_length: int = math.ceil(len(name) * (2 - MATCH_CUTOFF) / MATCH_CUTOFF) + 1
+        first: int = int(np.searchsorted(self._name_lengths, minimum_length, side="left"))
+        last: int = int(np.searchsorted(self._name_lengths, maximum_length, side="right"))
+        # Upper Bounds Of The Ratio, computed like difflib's real_quick_ratio and quick_ratio
+        query_counts: np.ndarray = np.zeros(len(self._alphabet), dtype=np.int64)
+        for character in name:
+            if character in self._alphabet:
+                query_counts[self._alphabet[character]] += 1
+        lengths: np.ndarray = self._name_lengths[first:last] + len(name)
+        shared_characters: np.ndarray = np.minimum(self._character_counts[first:last], query_counts).sum(axis=1)
+        length_bounds: np.ndarray = _calculate_ratios(np.minimum(self._name_lengths[first:last], len(name)), lengths)
+        character_bounds: np.ndarray = _calculate_ratios(shared_characters, lengths)
+        possible: np.ndarray = np.flatnonzero((length_bounds >= MATCH_CUTOFF) & (character_bounds >= MATCH_CUTOFF))
+        # Best Candidates First
+        trigrams: Set[str] = set(_get_trigrams(name))
+        candidates: List[Tuple[int, float]] = [(first + int(i), float(character_bounds[i])) for i in possible]
+        return sorted(candidates, key=lambda candidate: (candidate[1], len(trigrams & self._trigrams[candidate[0]])), reverse=True)
+
+
+def get_formatted_name(restaurant_name: str) -> str:
+    to_lower: str = restaurant_name.lower()
+    without_restaurant: str = to_lower.replace("restaurant", "")
+    return without_restaurant
+
+def _get_trigrams(name: str) -> List[str]:
+    padded: str = f"  {name} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+def _calculate_ratios(matches: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    # Same as difflib, so that the comparisons with the cutoff give the same result
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(lengths > 0, 2.0 * matches / lengths, 1.0)
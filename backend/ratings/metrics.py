@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Iterator, Any
+
+from ratings.http_cache import get_endpoint
+
+
+DEFAULT_METRICS_PATH: str = "data/metrics"
+# Upper bounds of the latency buckets, the last bucket takes everything above
+LATENCY_BUCKETS_SECONDS: List[float] = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+@dataclass
+class Histogram:
+    bucket_counts: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_SECONDS) + 1))
+    count: int = 0
+    total_seconds: float = 0
+
+    def add(self, seconds: float):
+        bucket: int = next((i for i, upper_bound in enumerate(LATENCY_BUCKETS_SECONDS) if seconds <= upper_bound),
+                           len(LATENCY_BUCKETS_SECONDS))
+        self.bucket_counts[bucket] += 1
+        self.count += 1
+        self.total_seconds += seconds
+
+    def merge(self, other: Histogram):
+        self.bucket_counts = [count + other_count for count, other_count in zip(self.bucket_counts, other.bucket_counts)]
+        self.count += other.count
+        self.total_seconds += other.total_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        bounds: List[str] = [str(upper_bound) for upper_bound in LATENCY_BUCKETS_SECONDS] + ["inf"]
+        return {"count": self.count, "total_seconds": self.total_seconds, "buckets": dict(zip(bounds, self.bucket_counts))}
+
+
+@dataclass
+class StageMetrics:
+    count: int = 0
+    total_seconds: float = 0
+    max_seconds: float = 0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def merge(self, other: StageMetrics):
+        self.count += other.count
+        self.total_seconds += other.total_seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+
+
+@dataclass
+class EndpointMetrics:
+    requests: int = 0
+    cache_hits: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    # Time spent waiting for a free slot of the host, and the time of the request itself
+    wait_seconds: float = 0
+    latency: Histogram = field(default_factory=Histogram)
+
+    def merge(self, other: EndpointMetrics):
+        self.requests += other.requests
+        self.cache_hits += other.cache_hits
+        for error, count in other.errors.items():
+            self.errors[error] = self.errors.get(error, 0) + count
+        self.wait_seconds += other.wait_seconds
+        self.latency.merge(other.latency)
+
+
+class CrawlMetrics:
+
+    # Collects where the time and the API quota of a crawl go: how long every stage took, and how many requests went
+    # to every provider endpoint, how long they took and how many failed. Stages of one town run concurrently (e.g. the
+    # photos of all restaurants), so their total time can be larger than the time of the whole crawl.
+
+    def __init__(self, town: Optional[str] = None, country: Optional[str] = None):
+        self.town: Optional[str] = town
+        self.country: Optional[str] = country
+        self.started_at: datetime = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.status: Optional[str] = None
+        self.stages: Dict[str, StageMetrics] = {}
+        self.endpoints: Dict[str, EndpointMetrics] = {}
+        # Requests that are left of the daily budget of each endpoint, None for endpoints without one
+        self.remaining_budgets: Dict[str, Optional[int]] = {}
+
+    # Recording
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.setdefault(name, StageMetrics()).add(time.perf_counter() - start)
+
+    def record_request(self, url: str, latency_seconds: float, wait_seconds: float = 0):
+        endpoint: EndpointMetrics = self._get_endpoint_metrics(url)
+        endpoint.requests += 1
+        endpoint.wait_seconds += wait_seconds
+        endpoint.latency.add(latency_seconds)
+
+    def record_cache_hit(self, url: str):
+        self._get_endpoint_metrics(url).cache_hits += 1
+
+    def record_error(self, url: str, error: str):
+        errors: Dict[str, int] = self._get_endpoint_metrics(url).errors
+        errors[error] = errors.get(error, 0) + 1
+
+    def finish(self, status: str):
+        self.finished_at = datetime.utcnow()
+        self.status = status
+
+    def merge(self, other: CrawlMetrics):
+        for name, stage in other.stages.items():
+            self.stages.setdefault(name, StageMetrics()).merge(stage)
+        for name, endpoint in other.endpoints.items():
+            self.endpoints.setdefault(name, EndpointMetrics()).merge(endpoint)
+
+    # Reporting
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished_at: datetime = self.finished_at if self.finished_at is not None else datetime.utcnow()
+        return {
+            "town": self.town,
+            "country": self.country,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at is not None else None,
+            "total_seconds": (finished_at - self.started_at).total_seconds(),
+            "stages": {name: vars(stage) for name, stage in sorted(self.stages.items())},
+            "endpoints": {name: {"requests": endpoint.requests, "cache_hits": endpoint.cache_hits, "errors": endpoint.errors,
+                                 "wait_seconds": endpoint.wait_seconds, "latency": endpoint.latency.to_dict()}
+                          for name, endpoint in sorted(self.endpoints.items())},
+            "remaining_budgets": self.remaining_budgets,
+        }
+
+    def write(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Replace atomically, so that readers of the file never see a half written report
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(file_descriptor, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+        os.replace(temporary_path, path)
+
+    # Private Methods
+
+    def _get_endpoint_metrics(self, url: str) -> EndpointMetrics:
+        return self.endpoints.setdefault(get_endpoint(url), EndpointMetrics())
+
+
+# The metrics of the town that is crawled in the current task. Tasks started from it (e.g. with asyncio.gather) inherit
+# them, so the http client and the rating sites do not need to pass them around.
+
+_current_metrics: ContextVar[Optional[CrawlMetrics]] = ContextVar("current_metrics", default=None)
+
+
+def get_current_metrics() -> Optional[CrawlMetrics]:
+    return _current_metrics.get()
+
+@contextmanager
+def use_metrics(metrics: CrawlMetrics) -> Iterator[CrawlMetrics]:
+    token: Token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+@contextmanager
+def measure_stage(name: str) -> Iterator[None]:
+    metrics: Optional[CrawlMetrics] = get_current_metrics()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(name):
+        yield
+
+def get_metrics_path() -> Path:
+    return Path(os.environ.get("METRICS_PATH", DEFAULT_METRICS_PATH))
+
+def get_town_report_path(town: str, country: str) -> Path:
+    file_name: str = "".join(character if character.isalnum() else "_" for character in f"{country}_{town}")
+    return get_metrics_path() / "towns" / f"{file_name}.json"
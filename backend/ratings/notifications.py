@@ -0,0 +1,79 @@
+import logging
+import select
+from threading import Thread, Event
+from typing import Callable, Optional
+
+import psycopg2
+from psycopg2.extensions import connection as Connection, ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.sql import SQL, Identifier
+
+
+# The crawler sends a notification on this channel after it committed new data for a town, the payload is the town
+TOWN_UPDATED_CHANNEL: str = "town_updated"
+
+
+class TownUpdateListener:
+
+    # Listens for the notifications of the crawler in a background thread. Notifications that are sent while the
+    # connection is down are lost, so on_reconnect is called after every reconnect, e.g. to drop all cached data.
+
+    def __init__(self, database_url: str, on_town_updated: Callable[[str], None], on_reconnect: Callable[[], None],
+                 poll_timeout_seconds: float = 5, reconnect_after_seconds: float = 5):
+        self._database_url: str = database_url
+        self._on_town_updated: Callable[[str], None] = on_town_updated
+        self._on_reconnect: Callable[[], None] = on_reconnect
+        self._poll_timeout_seconds: float = poll_timeout_seconds
+        self._reconnect_after_seconds: float = reconnect_after_seconds
+        self._stopped: Event = Event()
+        self._thread: Optional[Thread] = None
+
+    # Public Methods
+
+    def start(self):
+        self._thread = Thread(target=self._run, name="town-update-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    # Private Methods
+
+    def _run(self):
+        is_first_connection: bool = True
+        while not self._stopped.is_set():
+            try:
+                connection: Connection = self._connect()
+            except psycopg2.Error:
+                logging.exception("Could not connect to listen for town updates, retrying")
+                self._stopped.wait(self._reconnect_after_seconds)
+                continue
+            if not is_first_connection:
+                self._on_reconnect()
+            is_first_connection = False
+            try:
+                self._listen(connection)
+            except (psycopg2.Error, OSError):
+                logging.exception("Lost the connection that listens for town updates, reconnecting")
+                self._stopped.wait(self._reconnect_after_seconds)
+            finally:
+                connection.close()
+
+    def _connect(self) -> Connection:
+        connection: Connection = psycopg2.connect(self._database_url)
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(SQL("LISTEN {channel}").format(channel=Identifier(TOWN_UPDATED_CHANNEL)))
+        return connection
+
+    def _listen(self, connection: Connection):
+        while not self._stopped.is_set():
+            # Wait until the connection has data, with a timeout so that we notice when we are stopped
+            readable, _, _ = select.select([connection], [], [], self._poll_timeout_seconds)
+            if not readable:
+                continue
+            connection.poll()
+            while connection.notifies:
+                notification = connection.notifies.pop(0)
+                self._on_town_updated(notification.payload)
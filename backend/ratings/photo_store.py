@@ -0,0 +1,49 @@
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+
+DEFAULT_PHOTO_STORE_PATH: str = "data/photos"
+
+
+class PhotoStore:
+
+    # Photos are stored under the sha256 of their content, so every photo is written exactly once and the database only
+    # needs to keep the hashes. The files are sharded by the first two characters to keep the directories small.
+
+    def __init__(self, root: Path):
+        self._root: Path = root
+
+    # Public Methods
+
+    def put(self, content: bytes) -> str:
+        photo_hash: str = hashlib.sha256(content).hexdigest()
+        path: Path = self.get_path(photo_hash)
+        if path.exists():
+            return photo_hash
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that a crashing crawler never leaves half written photos behind
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+        return photo_hash
+
+    def get(self, photo_hash: str) -> bytes:
+        return self.get_path(photo_hash).read_bytes()
+
+    def contains(self, photo_hash: str) -> bool:
+        return is_valid_hash(photo_hash) and self.get_path(photo_hash).exists()
+
+    def get_path(self, photo_hash: str) -> Path:
+        assert is_valid_hash(photo_hash), f"{photo_hash} is not a valid photo hash"
+        return self._root / photo_hash[:2] / photo_hash
+
+
+def is_valid_hash(photo_hash: str) -> bool:
+    return re.fullmatch("[0-9a-f]{64}", photo_hash) is not None
+
+def get_photo_store() -> PhotoStore:
+    return PhotoStore(Path(os.environ.get("PHOTO_STORE_PATH", DEFAULT_PHOTO_STORE_PATH)))
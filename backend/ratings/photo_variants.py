@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageOps
+
+from ratings.photo_store import PhotoStore
+from ratings.restaurant import PhotoVariant, PhotoVariantType
+
+
+# The largest width and height of every variant. The full variant has the size we download from Google, the card
+# variant fits the cards of the frontend on high resolution screens.
+VARIANT_SIZES: Dict[PhotoVariantType, Tuple[int, int]] = {
+    PhotoVariantType.FULL: (2000, 1500),
+    PhotoVariantType.CARD: (960, 700),
+    PhotoVariantType.THUMBNAIL: (320, 240),
+}
+VARIANT_QUALITY: Dict[PhotoVariantType, int] = {
+    PhotoVariantType.FULL: 85,
+    PhotoVariantType.CARD: 80,
+    PhotoVariantType.THUMBNAIL: 70,
+}
+VARIANT_FORMAT: str = "WEBP"
+VARIANT_MEDIA_TYPE: str = "image/webp"
+
+
+@dataclass
+class EncodedVariant:
+    variant: PhotoVariantType
+    variant_hash: str
+    width: int
+    height: int
+
+
+class PhotoProcessor:
+
+    # Creates the variants of the downloaded photos. Decoding, resizing and encoding is CPU heavy, so it runs in a
+    # process pool and the crawl can continue in the meantime. The workers read the originals from and write the variants
+    # to the photo store themselves, so that only the hashes need to be sent between the processes.
+
+    def __init__(self, photo_store: PhotoStore, executor: Executor):
+        self._photo_store: PhotoStore = photo_store
+        self._executor: Executor = executor
+
+    # Public Methods
+
+    async def create_variants_async(self, photo_hashes: List[str]) -> List[PhotoVariant]:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        unique_photo_hashes: List[str] = list(dict.fromkeys(photo_hashes))
+        encodings = [loop.run_in_executor(self._executor, create_variants, self._photo_store, photo_hash)
+                     for photo_hash in unique_photo_hashes]
+        encoded_variants: List[List[EncodedVariant]] = list(await asyncio.gather(*encodings))
+        return [PhotoVariant(photo_hash=photo_hash, variant=variant.variant.value, variant_hash=variant.variant_hash,
+                             media_type=VARIANT_MEDIA_TYPE, width=variant.width, height=variant.height)
+                for photo_hash, variants in zip(unique_photo_hashes, encoded_variants) for variant in variants]
+
+
+def create_variants(photo_store: PhotoStore, photo_hash: str) -> List[EncodedVariant]:
+    # Runs in the worker processes. A photo that can not be decoded gets no variants, the API then serves the original.
+    try:
+        with Image.open(photo_store.get_path(photo_hash)) as original:
+            # Apply the orientation before the metadata is dropped. The variants are saved without exif and icc data.
+            image: Image.Image = ImageOps.exif_transpose(original)
+            image = image.convert("RGBA" if image.mode in ["RGBA", "LA", "P"] else "RGB")
+        encoded_variants: List[EncodedVariant] = []
+        # Each variant is resized from the next larger one, which is a lot cheaper than starting from the original
+        for variant, size in VARIANT_SIZES.items():
+            image.thumbnail(size, Image.LANCZOS)
+            buffer: BytesIO = BytesIO()
+            image.save(buffer, format=VARIANT_FORMAT, quality=VARIANT_QUALITY[variant], method=4)
+            variant_hash: str = photo_store.put(buffer.getvalue())
+            encoded_variants.append(EncodedVariant(variant, variant_hash, image.width, image.height))
+        return encoded_variants
+    except Exception:
+        logging.exception(f"Could not create the variants of photo {photo_hash}")
+        return []
@@ -0,0 +1,31 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from ratings import sql
+from ratings.database import PostgresDatabase
+from ratings.restaurant import GoogleMapsResult, TripAdvisorResult, RestaurantRanking, get_scores
+
+
+# The API serves the ranking page by page, so we keep more than the first page
+RANKING_SIZE: int = 50
+
+
+def rank_restaurants(town: str, results: List[Tuple[GoogleMapsResult, TripAdvisorResult]]) -> List[RestaurantRanking]:
+    google_maps_results: List[GoogleMapsResult] = [result[0] for result in results]
+    trip_advisor_results: List[TripAdvisorResult] = [result[1] for result in results]
+    scores: np.ndarray = get_scores(google_maps_results) + get_scores(trip_advisor_results)
+    sorted_by_score: List[Tuple[float, Tuple[GoogleMapsResult, TripAdvisorResult]]] = sorted(zip(scores.tolist(), results),
+                                                                                         key=lambda entry: entry[0], reverse=True)
+    return [RestaurantRanking(town=town, rank=rank, google_maps_link=google_maps_result.link, trip_advisor_link=trip_advisor_result.link,
+                              score=score)
+            for rank, (score, (google_maps_result, trip_advisor_result)) in enumerate(sorted_by_score[:RANKING_SIZE])]
+
+def refresh_town_ranking(postgres_db: PostgresDatabase, town: str):
+    results: List[Tuple[GoogleMapsResult, TripAdvisorResult]] = postgres_db\
+        .get(sql.get_restaurants_without_photos(town))\
+        .convert_to_two_types(GoogleMapsResult, TripAdvisorResult, accept_error=True)
+    ranking: List[RestaurantRanking] = rank_restaurants(town, results)
+    postgres_db.convert_to_db_entry(ranking, "restaurant_rankings").replace(sql.get_town_condition(town))
+    # The API caches the responses of the town until it hears about the new ranking
+    postgres_db.execute(sql.get_town_updated_notification(town))
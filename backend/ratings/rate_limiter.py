@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+from ratings.http_cache import get_endpoint
+
+
+DEFAULT_RATE_LIMIT_PATH: str = "data/rate_limits"
+# Google resets the daily quotas at midnight Pacific Time. We use standard time all year, so during daylight saving
+# time our day starts an hour after Google's, which only errs on the safe side.
+QUOTA_DAY_OFFSET: timedelta = timedelta(hours=-8)
+# After OVER_QUERY_LIMIT, all processes stop sending requests to the endpoint for a while. The pause doubles with every
+# further rejection and starts over once the endpoint accepted requests for a while.
+FIRST_BACKOFF_SECONDS: float = 2
+MAX_BACKOFF_SECONDS: float = 120
+
+
+@dataclass
+class EndpointLimit:
+    requests_per_second: float
+    # Requests that may be sent at once after a pause
+    burst: int
+    daily_budget: Optional[int] = None
+
+
+# Keyed like the metrics (see get_endpoint). Endpoints without a limit are not limited.
+DEFAULT_LIMITS: Dict[str, EndpointLimit] = {
+    "textsearch": EndpointLimit(requests_per_second=10, burst=10),
+    "findplacefromtext": EndpointLimit(requests_per_second=20, burst=20),
+    "details": EndpointLimit(requests_per_second=20, burst=20),
+    "photo": EndpointLimit(requests_per_second=20, burst=20),
+    # The Custom Search API allows 100 requests per minute and at most 10000 requests per day
+    "customsearch": EndpointLimit(requests_per_second=1.5, burst=5, daily_budget=10000),
+}
+
+
+class BudgetExhaustedError(Exception):
+    pass
+
+
+class RateLimiter:
+
+    # A token bucket and a daily budget per endpoint, shared by all threads and processes on the host. The state of an
+    # endpoint lives in a small file, which is locked while it is read and written. Waiting for the lock blocks, so the
+    # async client calls the limiter in an executor. A request that finds the bucket empty takes its token in advance
+    # and is told how long to wait for it, so the waiting itself needs no lock and the requests are spread evenly at
+    # the configured rate.
+
+    def __init__(self, directory: Path, limits: Dict[str, EndpointLimit] = None):
+        self._directory: Path = directory
+        self._limits: Dict[str, EndpointLimit] = limits if limits is not None else DEFAULT_LIMITS
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    # Public Methods
+
+    def reserve(self, url: str) -> float:
+        # Takes a token for the request and returns the seconds to wait before sending it
+        endpoint: str = get_endpoint(url)
+        limit: Optional[EndpointLimit] = self._limits.get(endpoint)
+        if limit is None:
+            return 0
+        with self._state(endpoint) as state:
+            now: float = time.time()
+            self._start_day(state, limit)
+            if limit.daily_budget is not None and state["used_today"] >= limit.daily_budget:
+                raise BudgetExhaustedError(f"The daily budget of {limit.daily_budget} requests for {endpoint} is used up")
+            tokens: float = min(limit.burst, state["tokens"] + (now - state["updated_at"]) * limit.requests_per_second)
+            state["tokens"] = tokens - 1
+            state["updated_at"] = now
+            state["used_today"] += 1
+            wait_seconds: float = max(0.0, -state["tokens"] / limit.requests_per_second)
+            return max(wait_seconds, state["blocked_until"] - now)
+
+    def back_off(self, url: str) -> float:
+        # Called when the provider rejected a request because of the rate. Returns the seconds until the next attempt.
+        endpoint: str = get_endpoint(url)
+        with self._state(endpoint) as state:
+            now: float = time.time()
+            blocked_until: float = state.get("blocked_until", 0.0)
+            # Requests that were sent before the pause started are rejected as well, they do not make it longer
+            if now < blocked_until:
+                return blocked_until - now
+            backoff_seconds: float = FIRST_BACKOFF_SECONDS
+            if now - blocked_until < MAX_BACKOFF_SECONDS:
+                backoff_seconds = min(MAX_BACKOFF_SECONDS, max(FIRST_BACKOFF_SECONDS, state.get("backoff_seconds", 0.0) * 2))
+            state["backoff_seconds"] = backoff_seconds
+            state["blocked_until"] = now + backoff_seconds
+            # The bucket fills up again from the end of the pause
+            state["tokens"] = min(state.get("tokens", 0.0), 0.0)
+            state["updated_at"] = state["blocked_until"]
+            return backoff_seconds
+
+    def get_remaining_budgets(self) -> Dict[str, Optional[int]]:
+        # None for the endpoints without a daily budget
+        remaining: Dict[str, Optional[int]] = {}
+        for endpoint, limit in sorted(self._limits.items()):
+            if limit.daily_budget is None:
+                remaining[endpoint] = None
+                continue
+            with self._state(endpoint) as state:
+                self._start_day(state, limit)
+                remaining[endpoint] = max(0, limit.daily_budget - state["used_today"])
+        return remaining
+
+    # Private Methods
+
+    def _state(self, endpoint: str) -> _LockedState:
+        return _LockedState(self._directory / f"{endpoint}.json")
+
+    def _start_day(self, state: Dict, limit: EndpointLimit):
+        today: str = get_quota_day()
+        if state.get("day") != today:
+            state["day"] = today
+            state["used_today"] = 0
+        state.setdefault("tokens", float(limit.burst))
+        state.setdefault("updated_at", time.time())
+        state.setdefault("blocked_until", 0.0)
+        state.setdefault("backoff_seconds", 0.0)
+
+
+class AdaptiveDelay:
+
+    # How long to wait for something that gets ready after a varying time, e.g. Google's next_page_token. We poll at
+    # short intervals, starting at the delay that was needed before. If the first poll succeeds, the next wait starts a
+    # bit earlier, so the delay follows what the provider currently needs. Waits that never succeeded say nothing about
+    # the provider and are not recorded, and the delay never grows above maximum_seconds.
+
+    def __init__(self, initial_seconds: float, minimum_seconds: float, maximum_seconds: float, poll_interval_seconds: float):
+        self.seconds: float = initial_seconds
+        self._minimum_seconds: float = minimum_seconds
+        self._maximum_seconds: float = maximum_seconds
+        self.poll_interval_seconds: float = poll_interval_seconds
+
+    def record(self, waited_seconds: float, polls: int, succeeded: bool):
+        if not succeeded:
+            return
+        if polls == 1:
+            self.seconds = max(self._minimum_seconds, self.seconds - self.poll_interval_seconds)
+        else:
+            self.seconds = min(self._maximum_seconds, waited_seconds)
+
+
+class _LockedState:
+
+    # The state of an endpoint, locked while the context is open. The lock is taken on a file of its own, since the
+    # state file is replaced on every write: it is written to a temporary file first, so that a crawler that dies while
+    # writing never leaves a broken state behind. flock locks belong to the open file, so the lock also works between
+    # threads of the same process, every use opens the lock file anew.
+
+    def __init__(self, path: Path):
+        self._path: Path = path
+        self._lock_file = None
+        self._state: Dict = {}
+
+    def __enter__(self) -> Dict:
+        self._lock_file = open(self._path.with_suffix(".lock"), "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            self._state = json.loads(self._path.read_text()) if self._path.exists() else {}
+        except ValueError:
+            logging.warning(f"Resetting the unreadable rate limit state {self._path}")
+            self._state = {}
+        return self._state
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                file_descriptor, temporary_path = tempfile.mkstemp(dir=self._path.parent)
+                with os.fdopen(file_descriptor, "w") as file:
+                    json.dump(self._state, file)
+                os.replace(temporary_path, self._path)
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+
+
+def get_quota_day() -> str:
+    return (datetime.utcnow() + QUOTA_DAY_OFFSET).date().isoformat()
+
+def get_rate_limiter() -> RateLimiter:
+    # The limits can be changed per endpoint, e.g. RATE_LIMIT_DETAILS_PER_SECOND=5 or RATE_LIMIT_CUSTOMSEARCH_DAILY_BUDGET=100
+    limits: Dict[str, EndpointLimit] = {}
+    for endpoint, default in DEFAULT_LIMITS.items():
+        prefix: str = f"RATE_LIMIT_{endpoint.upper()}"
+        requests_per_second: float = float(os.environ.get(f"{prefix}_PER_SECOND", default.requests_per_second))
+        daily_budget: Optional[str] = os.environ.get(f"{prefix}_DAILY_BUDGET")
+        limits[endpoint] = EndpointLimit(requests_per_second=requests_per_second,
+                                         burst=int(os.environ.get(f"{prefix}_BURST", default.burst)),
+                                         daily_budget=int(daily_budget) if daily_budget is not None else default.daily_budget)
+    return RateLimiter(Path(os.environ.get("RATE_LIMIT_PATH", DEFAULT_RATE_LIMIT_PATH)), limits)
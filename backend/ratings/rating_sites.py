@@ -1,31 +1,54 @@
 import abc
-import json
-from concurrent.futures.thread import ThreadPoolExecutor
+import asyncio
+from concurrent.futures import Executor
 from copy import copy
-from pathlib import Path
 from typing import List, Optional, Dict
 
 import re
-import requests
-import time
 import logging
-from base64 import b64encode
 
+import ratings.utils as op
+from ratings.http_client import AsyncHttpClient, run_with_client
+from ratings.matching import RestaurantMatcher
+from ratings.metrics import measure_stage
+from ratings.photo_store import PhotoStore
+from ratings.rate_limiter import AdaptiveDelay
+from ratings.trip_advisor_parser import TripAdvisorParseError, parse_restaurants_page
+from ratings.restaurant import RestaurantResult, SiteType, GoogleMapsResult, TripAdvisorResult, get_place_id, get_google_maps_link
 
-from bs4 import BeautifulSoup, ResultSet
 
-import ratings.utils as op
-from ratings.restaurant import RestaurantResult, SiteType, GoogleMapsResult, TripAdvisorResult
+# A next_page_token gets valid about two seconds after it was issued. Until then, Google answers INVALID_REQUEST.
+NEXT_PAGE_DELAY: AdaptiveDelay = AdaptiveDelay(initial_seconds=1.5, minimum_seconds=0.5, maximum_seconds=2,
+                                              poll_interval_seconds=0.25)
+NEXT_PAGE_MAX_POLLS: int = 20
+# Lookups of restaurants that were not among the results of a site, per batch. The client and the rate limiter bound
+# the requests of all towns as well.
+LOOKUPS_IN_PARALLEL: int = 16
 
 
 class RatingSite:
 
-    @abc.abstractmethod
+    # The crawling itself is async, so that all requests of a town can run concurrently over one shared client. The
+    # sync methods are thin wrappers that run the async version with a client of their own.
+
     def get_restaurants(self, town: str, number_of_restaurants: int) -> List[RestaurantResult]:
+        return run_with_client(lambda client: self.get_restaurants_async(town, number_of_restaurants, client))
+
+    def get_same_restaurant(self, restaurant: RestaurantResult, cached_results: RestaurantMatcher, town: str) -> Optional[RestaurantResult]:
+        return run_with_client(lambda client: self.get_same_restaurant_async(restaurant, cached_results, town, client))
+
+    @abc.abstractmethod
+    async def get_restaurants_async(self, town: str, number_of_restaurants: int, client: AsyncHttpClient) -> List[RestaurantResult]:
         raise NotImplementedError()
 
+    async def get_same_restaurant_async(self, restaurant: RestaurantResult, cached_results: RestaurantMatcher, town: str,
+                                        client: AsyncHttpClient) -> Optional[RestaurantResult]:
+        return (await self.get_same_restaurants_async([restaurant], cached_results, town, client))[0]
+
     @abc.abstractmethod
-    def get_same_restaurant(self, restaurant: RestaurantResult, cached_results: List[RestaurantResult], town: str) -> Optional[RestaurantResult]:
+    async def get_same_restaurants_async(self, restaurants: List[RestaurantResult], cached_results: RestaurantMatcher, town: str,
+                                         client: AsyncHttpClient) -> List[Optional[RestaurantResult]]:
+        # The entry of every restaurant on this site, None if there is none
         raise NotImplementedError()
 
     @abc.abstractmethod
@@ -35,52 +58,66 @@ class RatingSite:
 
 class GoogleMaps(RatingSite):
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, photo_store: PhotoStore):
         self._api_key: str = api_key
+        self._photo_store: PhotoStore = photo_store
 
 
     # Public Methods
 
 
-    def get_restaurants(self, town: str, number_of_restaurants: int) -> List[GoogleMapsResult]:
-        responses: List[Dict] = self._get_google_maps_response(town, self._api_key)
+    async def get_restaurants_async(self, town: str, number_of_restaurants: int, client: AsyncHttpClient) -> List[GoogleMapsResult]:
+        responses: List[Dict] = await self._get_google_maps_response(town, self._api_key, client)
         list_of_restaurants: List[Dict] = [response["results"] for response in responses]
         flattened_list = op.flatten_list(list_of_restaurants)
         all_infos: List[GoogleMapsResult] = [self._from_response(info) for info in flattened_list]
         return all_infos
 
-    def get_same_restaurant(self, restaurant: RestaurantResult, cached_results: List[GoogleMapsResult], town: str) -> Optional[GoogleMapsResult]:
-        # See If We Already Found Restaurant
-        assert(all([restaurant.get_site_provider() == SiteType.GOOGLE_MAPS for restaurant in cached_results]))
-        same_restaurant: Optional[GoogleMapsResult] = op.get_same_restaurant(restaurant, cached_results)
-        if same_restaurant:
-            return same_restaurant
-        search_string = f"{restaurant.name} {town}" if "restaurant" in restaurant.name.lower() else f"restaurant {restaurant.name} {town}"
-        # Search With Google API
-        url: str = f"https://maps.googleapis.com/maps/api/place/findplacefromtext/json?input={search_string}" \
-                   f"&inputtype=textquery&fields=rating,user_ratings_total,name,place_id,formatted_address,geometry&key={self._api_key}"
-        response: dict = requests.get(url).json()
-        try:
-            candidate: dict = response["candidates"][0]
-            return self._from_response(candidate)
-        except IndexError:
-            logging.exception(response)
-            return None
+    async def get_same_restaurants_async(self, restaurants: List[RestaurantResult], cached_results: RestaurantMatcher, town: str,
+                                         client: AsyncHttpClient) -> List[Optional[GoogleMapsResult]]:
+        # See If We Already Found The Restaurants
+        assert(all([restaurant.get_site_provider() == SiteType.GOOGLE_MAPS for restaurant in cached_results.restaurants]))
+        same_restaurants: List[Optional[GoogleMapsResult]] = [cached_results.get_same_restaurant(restaurant) for restaurant in restaurants]
+        # Search The Others With Google API. Restaurants with the same search, e.g. branches of a chain, are searched once.
+        search_strings: List[str] = list(dict.fromkeys(self._get_search_string(restaurant, town)
+                                                       for restaurant, same_restaurant in zip(restaurants, same_restaurants)
+                                                       if not same_restaurant))
+        lookups: asyncio.Semaphore = asyncio.Semaphore(LOOKUPS_IN_PARALLEL)
+
+        async def find_place(search_string: str) -> Optional[GoogleMapsResult]:
+            async with lookups:
+                return await self._find_place(search_string, client)
+        found: Dict[str, Optional[GoogleMapsResult]] = dict(zip(search_strings, await asyncio.gather(*[find_place(search_string)
+                                                                                                      for search_string in search_strings])))
+        return [same_restaurant if same_restaurant else found[self._get_search_string(restaurant, town)]
+                for restaurant, same_restaurant in zip(restaurants, same_restaurants)]
 
     def get_site_type(self) -> SiteType:
         return SiteType.GOOGLE_MAPS
 
     def complete_restaurant_info(self, restaurant: GoogleMapsResult) -> GoogleMapsResult:
+        return self.complete_restaurant_infos([restaurant])[0]
+
+    def complete_restaurant_infos(self, restaurants: List[GoogleMapsResult]) -> List[GoogleMapsResult]:
+        return run_with_client(lambda client: self.complete_restaurant_infos_async(restaurants, client))
+
+    async def complete_restaurant_infos_async(self, restaurants: List[GoogleMapsResult], client: AsyncHttpClient) -> List[GoogleMapsResult]:
+        completions = [self.complete_restaurant_info_async(restaurant, client) for restaurant in restaurants]
+        return list(await asyncio.gather(*completions))
+
+    async def complete_restaurant_info_async(self, restaurant: GoogleMapsResult, client: AsyncHttpClient) -> GoogleMapsResult:
         assert restaurant.reviews is None and restaurant.photos is None, "It already exists info, terminating since undefined whether it should be overwritten"
         # Query Google Details API
-        id: str = restaurant.link.split(":")[-1]
+        id: str = get_place_id(restaurant.link)
         url: str = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={id}&fields=review,photos&key={self._api_key}"
-        response: dict = requests.get(url).json()
         try:
+            with measure_stage("details"):
+                response: dict = await client.get_json(url)
             # Process Data
             reviews: List[str] = [review["text"] for review in response["result"]["reviews"]]
-            photo_references: List[str] = [photo["photo_reference"] for photo in requests.get(url).json()["result"]["photos"]]
-            images: List[str] = [self._get_image(reference) for reference in photo_references[:3]]
+            photo_references: List[str] = [photo["photo_reference"] for photo in response["result"]["photos"]]
+            with measure_stage("photos"):
+                images: List[str] = list(await asyncio.gather(*[self._get_image(reference, client) for reference in photo_references[:3]]))
             # Create New Object
             completed: GoogleMapsResult = copy(restaurant)
             completed.photos = images
@@ -94,11 +131,25 @@ class GoogleMaps(RatingSite):
     # Private Methods
 
 
+    def _get_search_string(self, restaurant: RestaurantResult, town: str) -> str:
+        return f"{restaurant.name} {town}" if "restaurant" in restaurant.name.lower() else f"restaurant {restaurant.name} {town}"
+
+    async def _find_place(self, search_string: str, client: AsyncHttpClient) -> Optional[GoogleMapsResult]:
+        url: str = f"https://maps.googleapis.com/maps/api/place/findplacefromtext/json?input={search_string}" \
+                   f"&inputtype=textquery&fields=rating,user_ratings_total,name,place_id,formatted_address,geometry&key={self._api_key}"
+        response: dict = await client.get_json(url)
+        try:
+            candidate: dict = response["candidates"][0]
+            return self._from_response(candidate)
+        except IndexError:
+            logging.exception(response)
+            return None
+
     def _from_response(self, response: dict) -> GoogleMapsResult:
         # Info
         name: str = response["name"]
-        id: int = response["place_id"]
-        url: str = f"https://www.google.com/maps/place/?q=place_id:{id}"
+        id: str = response["place_id"]
+        url: str = get_google_maps_link(id)
         # Rating
         rating: float = response["rating"] * 2
         number_of_reviews: int = response["user_ratings_total"]
@@ -110,76 +161,98 @@ class GoogleMaps(RatingSite):
                                 formatted_address=formatted_address, photos=None, reviews=None, location_lang=lang,
                                 location_lat=lat)
 
-    def _get_google_maps_response(self, town: str, api_key: str) -> List[dict]:
+    async def _get_google_maps_response(self, town: str, api_key: str, client: AsyncHttpClient) -> List[dict]:
         # Generate Normally
         search_query: str = f"restaurants in {town}"
         url: str = f"https://maps.googleapis.com/maps/api/place/textsearch/json?key={api_key}&query={search_query}"
         all_responses: List[dict] = []
-        response: dict = requests.get(url).json()
+        with measure_stage("search"):
+            response: dict = await client.get_json(url)
         all_responses.append(response.copy())
         # Multiple Pages
-        for i in range(2):
-            response = self._get_next_result(response, api_key)
-            all_responses.append(response.copy())
+        with measure_stage("pagination"):
+            for i in range(2):
+                response = await self._get_next_result(response, api_key, client)
+                all_responses.append(response.copy())
         return all_responses
 
-    def _get_next_result(self, response: dict, api_key: str) -> dict:
+    async def _get_next_result(self, response: dict, api_key: str, client: AsyncHttpClient) -> dict:
         pagetoken: str = response["next_page_token"]
-        time.sleep(2)
-        next_page: dict = requests.get(f"https://maps.googleapis.com/maps/api/place/textsearch/json?pagetoken={pagetoken}&key={api_key}").json()
+        url: str = f"https://maps.googleapis.com/maps/api/place/textsearch/json?pagetoken={pagetoken}&key={api_key}"
+        # The token only gets valid after a short time, unless we already have the page
+        if await client.is_cached(url):
+            return await client.get_json(url)
+        waited_seconds: float = NEXT_PAGE_DELAY.seconds
+        await asyncio.sleep(waited_seconds)
+        polls: int = 1
+        next_page: dict = await client.get_json(url)
+        while next_page.get("status") == "INVALID_REQUEST" and polls < NEXT_PAGE_MAX_POLLS:
+            await asyncio.sleep(NEXT_PAGE_DELAY.poll_interval_seconds)
+            waited_seconds += NEXT_PAGE_DELAY.poll_interval_seconds
+            polls += 1
+            next_page = await client.get_json(url)
+        NEXT_PAGE_DELAY.record(waited_seconds, polls, succeeded=next_page.get("status") != "INVALID_REQUEST")
         return next_page
 
-    def _get_image(self, reference: str) -> str:
+    async def _get_image(self, reference: str, client: AsyncHttpClient) -> str:
         get_photo_url: str = f"https://maps.googleapis.com/maps/api/place/photo?maxheight=1500&photoreference={reference}&key={self._api_key}"
-        result = requests.get(get_photo_url)
-        image: str = result.content
-        base_64_encoded: str = b64encode(image)
-        return base_64_encoded
+        image: bytes = await client.get_bytes(get_photo_url)
+        photo_hash: str = await asyncio.get_running_loop().run_in_executor(None, self._photo_store.put, image)
+        return photo_hash
 
 
 
 class TripAdvisor(RatingSite):
 
-    def __init__(self, google_api_key: str):
+    def __init__(self, google_api_key: str, parse_executor: Executor = None):
         self._google_api_key: str = google_api_key
+        # Parsing is CPU bound. With a process pool, the pages of many towns can be parsed in parallel. Without one, it
+        # runs in the default thread pool, which at least does not block the downloads.
+        self._parse_executor: Optional[Executor] = parse_executor
 
     # Public Methods
 
     def get_site_type(self) -> SiteType:
         return SiteType.TRIP_ADVISOR
 
-    def get_restaurants(self, town: str, number_of_restaurants: int) -> List[TripAdvisorResult]:
+    async def get_restaurants_async(self, town: str, number_of_restaurants: int, client: AsyncHttpClient) -> List[TripAdvisorResult]:
         # Get URL
-        tripadvisor_url: str = self._get_town_first_page(town, self._google_api_key)
+        with measure_stage("search"):
+            tripadvisor_url: str = await self._get_town_first_page(town, self._google_api_key, client)
         # Get Restaurants
         arguments: List = [self._get_url_for_ith_page(tripadvisor_url, min_rank) for min_rank in
                            range(0, number_of_restaurants, 30)]
-        with ThreadPoolExecutor(max_workers=10) as pool:
-            top_restaurants: List[List[TripAdvisorResult]] = list(pool.map(self._get_restaurants_on_page, arguments))
-        top_restaurants: List[TripAdvisorResult] = op.flatten_list(top_restaurants)
+        with measure_stage("pagination"):
+            pages: List = list(await asyncio.gather(*[self._get_restaurants_on_page(page_url, client) for page_url in arguments],
+                                                    return_exceptions=True))
+        # Single pages that can not be parsed are skipped. If no page can be parsed, the markup most likely changed.
+        parse_errors: List[TripAdvisorParseError] = [page for page in pages if isinstance(page, TripAdvisorParseError)]
+        for page in pages:
+            if isinstance(page, BaseException) and not isinstance(page, TripAdvisorParseError):
+                raise page
+        if len(parse_errors) == len(pages):
+            raise TripAdvisorParseError(f"Could not parse any restaurant page of {town}") from parse_errors[0]
+        for parse_error in parse_errors:
+            logging.warning(f"Skipping restaurant page of {town}: {parse_error}")
+        top_restaurants: List[TripAdvisorResult] = op.flatten_list([page for page in pages if not isinstance(page, TripAdvisorParseError)])
         return top_restaurants
 
-    def get_same_restaurant(self, restaurant: RestaurantResult, cached_results: List[RestaurantResult], town: str) -> Optional[RestaurantResult]:
+    async def get_same_restaurants_async(self, restaurants: List[RestaurantResult], cached_results: RestaurantMatcher, town: str,
+                                         client: AsyncHttpClient) -> List[Optional[TripAdvisorResult]]:
         restaurants_are_tripadvisor = [restaurant.get_site_provider() == SiteType.TRIP_ADVISOR for restaurant in
-                                       cached_results]
+                                       cached_results.restaurants]
         assert all(restaurants_are_tripadvisor)
-        return op.get_same_restaurant(restaurant, cached_results)
+        return [cached_results.get_same_restaurant(restaurant) for restaurant in restaurants]
 
 
     # Collecting Restaurants
 
 
-    def _get_town_first_page(self, town: str, api_key: str) -> str:
-        google_search_for_town: dict
-        if town.lower() == "nice france":
-            file: Path = Path("nice_google_search.json")
-            google_search_for_town = json.load(file.open())
-        else:
-            query: str = f"{town} restaurants"
-            custom_engine: str = "011204893081168402867:xebeg1mi0om"
-            api_key: str = api_key
-            api_url = f"https://www.googleapis.com/customsearch/v1?q={query}&cx={custom_engine}&key={api_key}"
-            google_search_for_town = requests.get(api_url).json()
+    async def _get_town_first_page(self, town: str, api_key: str, client: AsyncHttpClient) -> str:
+        query: str = f"{town} restaurants"
+        custom_engine: str = "011204893081168402867:xebeg1mi0om"
+        api_url = f"https://www.googleapis.com/customsearch/v1?q={query}&cx={custom_engine}&key={api_key}"
+        google_search_for_town: dict = await client.get_json(api_url)
         all_results: List[dict] = google_search_for_town["items"]
         general_restaurant_entry: dict = next(
             filter(lambda entry: "BEST Restaurants in".lower() in entry["title"].lower(), all_results))
@@ -192,28 +265,16 @@ class TripAdvisor(RatingSite):
         new_url: str = f"{split_by_location_id[0]}{location_id}-oa{minimum_rank}{split_by_location_id[1]}"
         return new_url
 
-    def _get_restaurants_on_page(self, page_url: str) -> List[TripAdvisorResult]:
-        html_file: str = requests.get(page_url).text
-        soup: BeautifulSoup = BeautifulSoup(html_file, features="html.parser")
-        all_scripts: ResultSet = soup.find_all("script")
-        # Get Fitting Script
-        script_data: Optional[str] = None
-        for script in all_scripts:
-            if not script.string:
-                continue
-            if "userReviewCount" in script.string:
-                script_data = script.string
-        assert script_data is not None
-        # Extract Information
-        relevant_start: str = '{"restaurants"'
-        relevant_end: str = '}]},"error":null}'
-        last_bracket_position: int = 3 # We want the string to end before the "error" tag starts.
-        first_pos: int = script_data.find(relevant_start)
-        last_pos: int = script_data.find(relevant_end) + last_bracket_position
-        data: Dict = json.loads(script_data[first_pos:last_pos])
-        # Load Into Objects
-        infos: List[TripAdvisorResult] = [self._from_dict(restaurant) for restaurant in data["restaurants"]]
-        return infos
+    async def _get_restaurants_on_page(self, page_url: str, client: AsyncHttpClient) -> List[TripAdvisorResult]:
+        html_file: str = await client.get_text(page_url)
+        # Parsing is CPU bound, so it should not block the other downloads
+        with measure_stage("parsing"):
+            try:
+                restaurants: List[Dict] = await asyncio.get_running_loop().run_in_executor(self._parse_executor, parse_restaurants_page,
+                                                                                           html_file)
+            except TripAdvisorParseError as error:
+                raise TripAdvisorParseError(f"{page_url}: {error}") from error
+        return [self._from_dict(restaurant) for restaurant in restaurants]
 
     # Constructing From Json
 
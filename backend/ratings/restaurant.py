@@ -3,11 +3,13 @@ from __future__ import annotations
 import abc
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, Optional, List
+from typing import Dict, List, Any
+import hashlib
+import json
 import math
 
-from dataclasses_json import dataclass_json
-from sqlalchemy import Column, ARRAY, String, Integer, Float
+import numpy as np
+from sqlalchemy import Column, ARRAY, String, Integer, Float, DateTime
 from sqlalchemy.ext.declarative import declarative_base, DeclarativeMeta
 
 
@@ -50,7 +52,13 @@ class GoogleMapsResult(Base, RestaurantResult):
     location_lang = Column(Float)
     location_lat = Column(Float)
     photos = Column(ARRAY(String))
+    # Only filled by crawls from before the best review was chosen, see scripts/choose_best_reviews.py
     reviews = Column(ARRAY(String))
+    # Chosen at crawl time, see ratings/reviews.py
+    best_review = Column(String)
+    best_review_score = Column(Float)
+    last_fetched_at = Column(DateTime)
+    fingerprint = Column(String, index=True)
 
     def get_site_provider(self) -> str:
         return SiteType.GOOGLE_MAPS
@@ -66,6 +74,8 @@ class TripAdvisorResult(Base, RestaurantResult):
     link = Column(String, primary_key=True)
     number_of_reviews = Column(Integer)
     rating = Column(Float)
+    last_fetched_at = Column(DateTime)
+    fingerprint = Column(String, index=True)
 
     def get_site_provider(self) -> str:
         return SiteType.TRIP_ADVISOR
@@ -77,10 +87,58 @@ class TripAdvisorResult(Base, RestaurantResult):
 class CombinedRestaurant(Base):
     __tablename__ = "restaurants"
 
-    town = Column(String)
+    town = Column(String, index=True)
     country = Column(String)
     trip_advisor_link = Column(String, primary_key=True)
-    google_maps_link = Column(String, primary_key=True)
+    google_maps_link = Column(String, primary_key=True, index=True)
+    last_fetched_at = Column(DateTime)
+    fingerprint = Column(String, index=True)
+
+
+# The ranking of the best restaurants of each town. It is computed when the crawler writes the town, so that the API
+# only needs to look it up.
+class RestaurantRanking(Base):
+    __tablename__ = "restaurant_rankings"
+
+    town = Column(String, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    google_maps_link = Column(String)
+    trip_advisor_link = Column(String)
+    score = Column(Float)
+
+
+class CrawlStatus(str, Enum):
+    IN_PROGRESS = "in_progress"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+# Records how far the crawler got with each town, so that an interrupted run can resume where it stopped
+class CrawlCheckpoint(Base):
+    __tablename__ = "crawl_checkpoints"
+
+    town = Column(String, primary_key=True)
+    country = Column(String, primary_key=True)
+    status = Column(String)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    error = Column(String)
+
+
+class PhotoVariantType(str, Enum):
+    THUMBNAIL = "thumbnail"
+    CARD = "card"
+    FULL = "full"
+
+# Resized and re-encoded versions of a photo in the photo store. The variant itself is stored in the photo store as well.
+class PhotoVariant(Base):
+    __tablename__ = "photo_variants"
+
+    photo_hash = Column(String, primary_key=True)
+    variant = Column(String, primary_key=True)
+    variant_hash = Column(String)
+    media_type = Column(String)
+    width = Column(Integer)
+    height = Column(Integer)
 
 
 # Functions
@@ -96,6 +154,45 @@ def get_popularity_and_quality_weighted(restaurant: RestaurantResult, other_rest
         score = 0
     return score
 
+def get_popularity_and_quality_weighted_batch(number_of_reviews: np.ndarray, ratings: np.ndarray) -> np.ndarray:
+    # Scores all restaurants of a town in one pass. Gives the same result as calling
+    # get_popularity_and_quality_weighted for every restaurant with all restaurants of the town as other_restaurants.
+    number_of_reviews = np.asarray(number_of_reviews, dtype=np.float64)
+    ratings = np.asarray(ratings, dtype=np.float64)
+    if len(number_of_reviews) == 0:
+        return np.zeros(0)
+    max_number_of_reviews: float = number_of_reviews.max()
+    has_reviews: np.ndarray = number_of_reviews > 0
+    if max_number_of_reviews == 1 and has_reviews.any():
+        raise ZeroDivisionError("float division by zero")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_of_max: float = np.log(max_number_of_reviews) / np.log(2)
+        popularity_scores: np.ndarray = np.log(number_of_reviews) / np.log(2) / log_of_max * 10
+        rating_scores: np.ndarray = (ratings - 7) * 10 / 3
+        weighted: np.ndarray = 0.4 * popularity_scores + 0.6 * rating_scores
+        scores: np.ndarray = np.sqrt(weighted)
+    # The scalar version returns 0 wherever math.log or math.sqrt raise a ValueError
+    is_valid: np.ndarray = has_reviews & ~(weighted < 0) if max_number_of_reviews > 0 else np.zeros(len(scores), dtype=bool)
+    return np.where(is_valid, scores, 0)
+
+def get_scores(restaurants: List[RestaurantResult]) -> np.ndarray:
+    number_of_reviews: np.ndarray = np.fromiter((restaurant.number_of_reviews for restaurant in restaurants), dtype=np.float64,
+                                                count=len(restaurants))
+    ratings: np.ndarray = np.fromiter((restaurant.rating for restaurant in restaurants), dtype=np.float64, count=len(restaurants))
+    return get_popularity_and_quality_weighted_batch(number_of_reviews, ratings)
+
+def get_place_id(google_maps_link: str) -> str:
+    return google_maps_link.split(":")[-1]
+
+def get_google_maps_link(place_id: str) -> str:
+    return f"https://www.google.com/maps/place/?q=place_id:{place_id}"
+
+def get_fingerprint(entry: Base) -> str:
+    # Hash over the content of a row. If a row with the same fingerprint is already stored, nothing has changed.
+    content: Dict[str, Any] = {column.name: getattr(entry, column.name) for column in entry.__table__.columns
+                               if column.name not in ["last_fetched_at", "fingerprint"]}
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
 def get_table_metadata() -> DeclarativeMeta:
     return Base
 
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import re
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+# Reviews of about this length fit the card of the frontend. Shorter ones say little, longer ones are cut off.
+IDEAL_LENGTH: range = range(150, 600)
+LENGTH_WEIGHT: float = 0.6
+SENTIMENT_WEIGHT: float = 0.4
+# Reviews like these are less likely to be chosen, however long and positive they are
+SHOUTING_UPPERCASE_SHARE: float = 0.3
+REPEATED_PUNCTUATION: re.Pattern = re.compile(r"[!?]{3,}|\.{4,}")
+LINK: re.Pattern = re.compile(r"https?://|www\.|\S+@\S+\.\w+")
+# The restaurants of one task, the workers load nltk once and then score many reviews per task
+RESTAURANTS_PER_TASK: int = 8
+
+
+@dataclass
+class ScoredReview:
+    review: str
+    score: float
+
+
+class ReviewSelector:
+
+    # Chooses the review that the frontend shows for a restaurant. Scoring the sentiment is CPU heavy, so the reviews
+    # are scored in a process pool while the crawl continues, in batches of several restaurants per task. Only the best
+    # review and its score are stored, so the API does no work for it when serving.
+
+    def __init__(self, executor: Executor):
+        self._executor: Executor = executor
+
+    # Public Methods
+
+    async def choose_best_reviews_async(self, reviews_of_restaurants: List[List[str]]) -> List[Optional[ScoredReview]]:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        batches: List[List[List[str]]] = [reviews_of_restaurants[i:i + RESTAURANTS_PER_TASK]
+                                          for i in range(0, len(reviews_of_restaurants), RESTAURANTS_PER_TASK)]
+        chosen: List[List[Optional[ScoredReview]]] = list(await asyncio.gather(*[loop.run_in_executor(self._executor, choose_best_reviews, batch)
+                                                                                for batch in batches]))
+        return [best_review for batch in chosen for best_review in batch]
+
+
+def choose_best_reviews(reviews_of_restaurants: List[List[str]]) -> List[Optional[ScoredReview]]:
+    # Runs in the worker processes
+    return [choose_best_review(reviews) for reviews in reviews_of_restaurants]
+
+def choose_best_review(reviews: List[str]) -> Optional[ScoredReview]:
+    # None if the restaurant has no review with text
+    scored: List[ScoredReview] = [ScoredReview(review, score_review(review)) for review in reviews if review and review.strip()]
+    return max(scored, key=lambda scored_review: scored_review.score, default=None)
+
+def score_review(review: str) -> float:
+    # Between 0 and 1
+    try:
+        sentiment: float = get_sentiment(review)
+    except Exception:
+        logging.exception("Could not score the sentiment of a review")
+        sentiment = 0
+    # A positive review fits the best restaurants of a town, a negative one ranks below a neutral one
+    sentiment_score: float = (sentiment + 1) / 2
+    return get_quality(review) * (LENGTH_WEIGHT * get_length_score(review) + SENTIMENT_WEIGHT * sentiment_score)
+
+def get_sentiment(review: str) -> float:
+    # Between -1 and 1. TextBlob only knows English words, reviews in other languages are neutral and are chosen by
+    # their length and quality. It loads nltk, so it is imported where it is used, in the worker processes.
+    from textblob import TextBlob
+    return TextBlob(review).sentiment.polarity
+
+def get_length_score(review: str) -> float:
+    length: int = len(review.strip())
+    if length < IDEAL_LENGTH.start:
+        return length / IDEAL_LENGTH.start
+    if length >= IDEAL_LENGTH.stop:
+        return IDEAL_LENGTH.stop / length
+    return 1
+
+def get_quality(review: str) -> float:
+    quality: float = 1
+    letters: List[str] = [character for character in review if character.isalpha()]
+    if len(letters) > 0 and sum(character.isupper() for character in letters) / len(letters) > SHOUTING_UPPERCASE_SHARE:
+        quality *= 0.5
+    if REPEATED_PUNCTUATION.search(review) is not None:
+        quality *= 0.8
+    if LINK.search(review) is not None:
+        quality *= 0.5
+    return quality
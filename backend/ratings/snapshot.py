@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from threading import Thread, Event, Lock
+from typing import List, Dict, Optional, Any, Callable, Set, Tuple
+
+import numpy as np
+from sqlalchemy import Integer, Float, DateTime, String
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from ratings import sql
+from ratings.database import DbResult, PostgresConnectionPool, get_column_names
+from ratings.geo_index import GeoIndex
+from ratings.restaurant import RestaurantRanking, GoogleMapsResult, TripAdvisorResult, get_place_id, \
+    get_popularity_and_quality_weighted_batch
+
+
+# The links of the ranking are the same as those of google_maps and trip_advisor, and the town is kept as offsets
+SKIPPED_COLUMNS: Set[Tuple[DeclarativeMeta, str]] = {(RestaurantRanking, "google_maps_link"), (RestaurantRanking, "trip_advisor_link"),
+                                                     (RestaurantRanking, "town")}
+
+
+# Columns
+
+class StringColumn:
+
+    # All strings in one UTF-8 buffer, which takes a lot less memory than a Python string per value
+
+    def __init__(self, values: List[Optional[str]]):
+        encoded: List[bytes] = [value.encode("utf-8") if value is not None else b"" for value in values]
+        self._buffer: bytes = b"".join(encoded)
+        self._offsets: np.ndarray = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=self._offsets[1:])
+        self._is_none: np.ndarray = np.array([value is None for value in values], dtype=bool)
+
+    def get_values(self, start: int, end: int) -> List[Optional[str]]:
+        offsets: List[int] = self._offsets[start:end + 1].tolist()
+        return [self._buffer[offsets[i]:offsets[i + 1]].decode("utf-8") if not is_none else None
+                for i, is_none in enumerate(self._is_none[start:end].tolist())]
+
+
+class ArrayColumn:
+
+    # Numbers and timestamps, with a mask for the missing values
+
+    def __init__(self, values: List[Any], dtype: str, missing: Any):
+        self._is_none: np.ndarray = np.array([value is None for value in values], dtype=bool)
+        self.values: np.ndarray = np.array([value if value is not None else missing for value in values], dtype=dtype)
+
+    def get_values(self, start: int, end: int) -> List[Any]:
+        # tolist converts to Python numbers and datetimes
+        return [value if not is_none else None
+                for value, is_none in zip(self.values[start:end].tolist(), self._is_none[start:end].tolist())]
+
+
+class ObjectColumn:
+
+    # Everything else, kept as it is
+
+    def __init__(self, values: List[Any]):
+        self._values: List[Any] = values
+
+    def get_values(self, start: int, end: int) -> List[Any]:
+        return self._values[start:end]
+
+
+def create_column(table: DeclarativeMeta, column: str, values: List[Any]):
+    # noinspection PyUnresolvedReferences
+    column_type = table.__table__.columns[column].type
+    if isinstance(column_type, Integer):
+        return ArrayColumn(values, "int64", 0)
+    if isinstance(column_type, Float):
+        return ArrayColumn(values, "float64", np.nan)
+    if isinstance(column_type, DateTime):
+        return ArrayColumn(values, "datetime64[us]", np.datetime64("NaT"))
+    if isinstance(column_type, String):
+        return StringColumn(values)
+    return ObjectColumn(values)
+
+
+# Snapshot
+
+class RestaurantSnapshot:
+
+    # The ranked restaurants of all towns, as read-only columns. The restaurants are sorted by town and rank, so the
+    # restaurants of a town are the slice between two offsets, and a page of the ranking is found with a binary search.
+    # The snapshot never changes after it was created, a newer crawl is published by replacing the whole snapshot.
+
+    def __init__(self, result: DbResult):
+        self.loaded_at: datetime = datetime.utcnow()
+        self._size: int = len(result.rows)
+        self._columns: Dict[DeclarativeMeta, Dict[str, Any]] = {}
+        for table in [RestaurantRanking, GoogleMapsResult, TripAdvisorResult]:
+            # noinspection PyUnresolvedReferences
+            table_name: str = table.__tablename__
+            self._columns[table] = {}
+            for column in get_column_names(table):
+                alias: str = DbResult.get_column_alias(table_name, column)
+                if alias in result.column_names and (table, column) not in SKIPPED_COLUMNS:
+                    position: int = result.column_names.index(alias)
+                    self._columns[table][column] = create_column(table, column, [row[position] for row in result.rows])
+        # Towns, the restaurants of a town are the rows between its offset and the offset of the next town
+        town_position: int = result.column_names.index(DbResult.get_column_alias(RestaurantRanking.__tablename__, "town"))
+        towns_of_rows: List[str] = [row[town_position] for row in result.rows]
+        is_first_of_town: List[bool] = [i == 0 or town != towns_of_rows[i - 1] for i, town in enumerate(towns_of_rows)]
+        self._town_starts: np.ndarray = np.flatnonzero(np.array(is_first_of_town, dtype=bool))
+        self.towns: List[str] = [towns_of_rows[i] for i in self._town_starts.tolist()]
+        self._town_positions: Dict[str, int] = {town: i for i, town in enumerate(self.towns)}
+        self._ranks: np.ndarray = self._columns[RestaurantRanking]["rank"].values
+        self._scores: np.ndarray = self._columns[RestaurantRanking]["score"].values
+        # Locations
+        lats: np.ndarray = self._columns[GoogleMapsResult]["location_lat"].values
+        lngs: np.ndarray = self._columns[GoogleMapsResult]["location_lang"].values
+        located: np.ndarray = np.flatnonzero(~np.isnan(lats) & ~np.isnan(lngs))
+        self.geo_index: GeoIndex[int] = GeoIndex(list(zip(lats[located].tolist(), lngs[located].tolist())), located.tolist())
+
+    # Public Methods
+
+    def get_page(self, town: str, cursor: int, limit: int) -> Optional[Dict]:
+        # Like the listing from the database: the cursor is the rank of the first restaurant on the page. None if we do
+        # not know the town.
+        if town not in self._town_positions:
+            return None
+        first, last = self._get_town_slice(self._town_positions[town])
+        start: int = first + int(np.searchsorted(self._ranks[first:last], cursor, side="left"))
+        end: int = min(start + limit, last)
+        next_cursor: Optional[int] = int(self._ranks[end]) if end < last else None
+        return {"restaurants": self.get_restaurants(start, end), "next_cursor": next_cursor}
+
+    def get_restaurants(self, start: int, end: int) -> List[Dict]:
+        google_maps_infos: List[Dict[str, Any]] = self._get_rows(GoogleMapsResult, start, end)
+        trip_advisor_infos: List[Dict[str, Any]] = self._get_rows(TripAdvisorResult, start, end)
+        return [{"id": get_place_id(google_maps_info["link"]), "rank": rank, "score": score,
+                 "google_maps_info": google_maps_info, "trip_advisor_info": trip_advisor_info}
+                for rank, score, google_maps_info, trip_advisor_info
+                in zip(self._ranks[start:end].tolist(), self._scores[start:end].tolist(), google_maps_infos, trip_advisor_infos)]
+
+    def get_town(self, i: int) -> str:
+        return self.towns[int(np.searchsorted(self._town_starts, i, side="right")) - 1]
+
+    def get_best(self, positions: List[int], limit: int) -> List[int]:
+        # The best of the given restaurants, e.g. those within a radius. They may come from several towns, and the stored
+        # scores are relative to the best restaurant of each town, so they are scored again against each other, like
+        # the crawler ranks a town.
+        if len(positions) == 0:
+            return []
+        indices: np.ndarray = np.array(positions, dtype=np.int64)
+        scores: np.ndarray = np.zeros(len(indices))
+        for table in [GoogleMapsResult, TripAdvisorResult]:
+            number_of_reviews: np.ndarray = self._columns[table]["number_of_reviews"].values[indices]
+            ratings: np.ndarray = self._columns[table]["rating"].values[indices]
+            scores += np.nan_to_num(get_popularity_and_quality_weighted_batch(number_of_reviews, ratings))
+        order: np.ndarray = np.argsort(-scores, kind="stable")[:limit]
+        return indices[order].tolist()
+
+    def __len__(self) -> int:
+        return self._size
+
+    # Private Methods
+
+    def _get_town_slice(self, town_position: int) -> Tuple[int, int]:
+        first: int = int(self._town_starts[town_position])
+        last: int = int(self._town_starts[town_position + 1]) if town_position + 1 < len(self.towns) else self._size
+        return first, last
+
+    def _get_rows(self, table: DeclarativeMeta, start: int, end: int) -> List[Dict[str, Any]]:
+        columns: List[str] = list(self._columns[table].keys())
+        values: List[List[Any]] = [column.get_values(start, end) for column in self._columns[table].values()]
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def load_snapshot(postgres_pool: PostgresConnectionPool) -> RestaurantSnapshot:
+    with postgres_pool.connection() as postgres_db:
+        result: DbResult = postgres_db.get(sql.get_all_ranked_restaurants())
+    return RestaurantSnapshot(result)
+
+
+class SnapshotStore:
+
+    # Holds the current snapshot. When the crawler published new data, a new snapshot is loaded in a background thread
+    # while the old one keeps serving, and is then swapped in. Updates that arrive during a load are collected and
+    # handled by the next load. If the database is not available, the old snapshot stays and the load is retried.
+    # on_reloaded gets the towns that were updated, None if we do not know which (e.g. after a lost connection).
+
+    def __init__(self, load: Callable[[], RestaurantSnapshot], on_reloaded: Callable[[Optional[Set[str]]], None],
+                 retry_after_seconds: float = 5):
+        self._load: Callable[[], RestaurantSnapshot] = load
+        self._on_reloaded: Callable[[Optional[Set[str]]], None] = on_reloaded
+        self._retry_after_seconds: float = retry_after_seconds
+        self._snapshot: Optional[RestaurantSnapshot] = None
+        # The towns that changed since the last load, None if all of them may have changed
+        self._updated_towns: Optional[Set[str]] = set()
+        self._lock: Lock = Lock()
+        self._reload_requested: Event = Event()
+        self._stopped: Event = Event()
+        self._thread: Optional[Thread] = None
+
+    # Public Methods
+
+    def get(self) -> RestaurantSnapshot:
+        return self._snapshot
+
+    def start(self):
+        # The first snapshot is loaded before the API serves requests
+        self._snapshot = self._load()
+        logging.info(f"Loaded snapshot with {len(self._snapshot)} restaurants of {len(self._snapshot.towns)} towns")
+        self._thread = Thread(target=self._run, name="snapshot-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._reload_requested.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def request_reload(self, town: str = None):
+        with self._lock:
+            if town is None:
+                self._updated_towns = None
+            elif self._updated_towns is not None:
+                self._updated_towns.add(town)
+        self._reload_requested.set()
+
+    # Private Methods
+
+    def _run(self):
+        while True:
+            self._reload_requested.wait()
+            if self._stopped.is_set():
+                return
+            self._reload_requested.clear()
+            with self._lock:
+                updated_towns: Optional[Set[str]] = self._updated_towns
+                self._updated_towns = set()
+            try:
+                snapshot: RestaurantSnapshot = self._load()
+            except Exception:
+                logging.exception("Could not load a new snapshot, serving the old one")
+                self._request_again(updated_towns)
+                self._stopped.wait(self._retry_after_seconds)
+                continue
+            self._snapshot = snapshot
+            self._on_reloaded(updated_towns)
+
+    def _request_again(self, updated_towns: Optional[Set[str]]):
+        if updated_towns is None:
+            self.request_reload()
+        for town in updated_towns or []:
+            self.request_reload(town)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Tuple, Dict, List
 
 from psycopg2.sql import SQL, Literal, Composed, Identifier
@@ -5,6 +6,7 @@ from sqlalchemy.ext.declarative import DeclarativeMeta
 
 from ratings.restaurant import *
 from ratings.database import get_column_names, DbResult
+from ratings.notifications import TOWN_UPDATED_CHANNEL
 
 
 def get_restaurants_without_photos(town: str) -> Composed:
@@ -18,18 +20,114 @@ def get_restaurants_without_photos(town: str) -> Composed:
 
 
 def get_all_restaurant_info(google_maps_links: Tuple) -> Composed:
-    columns = [column for column in get_column_names(GoogleMapsResult) if not column == "photos"]
-    fields_to_select: SQL = _get_aliased_select(GoogleMapsResult, columns=columns) + SQL(", array[encode(photos[1]::bytea,'escape'), encode(photos[2]::bytea,'escape'), encode(photos[3]::bytea,'escape')] as google_maps_photos, ") + _get_aliased_select(TripAdvisorResult)
+    fields_to_select: SQL = _get_aliased_select(GoogleMapsResult) + SQL(", ") + _get_aliased_select(TripAdvisorResult)
     sql = SQL("SELECT {fields_to_select} FROM restaurants "
               "INNER JOIN google_maps ON google_maps.link = restaurants.google_maps_link "
               "INNER JOIN trip_advisor ON restaurants.trip_advisor_link  = trip_advisor.link "
               "WHERE restaurants.google_maps_link IN {google_maps_links}")
     return sql.format(fields_to_select=fields_to_select, google_maps_links=Literal(google_maps_links))
 
+def get_all_ranked_restaurants() -> Composed:
+    # The ranked restaurants of all towns, e.g. for the snapshot the API serves from
+    sql = SQL("SELECT {fields_to_select} FROM restaurant_rankings "
+              "INNER JOIN google_maps ON google_maps.link = restaurant_rankings.google_maps_link "
+              "INNER JOIN trip_advisor ON restaurant_rankings.trip_advisor_link = trip_advisor.link "
+              "ORDER BY restaurant_rankings.town, restaurant_rankings.rank")
+    return sql.format(fields_to_select=_get_ranked_restaurant_fields())
+
+def _get_ranked_restaurant_fields() -> Composed:
+    # Only what is needed for the listing. Photos and reviews are the largest part of a restaurant and are loaded
+    # separately, see get_google_maps_result.
+    google_maps_columns: List[str] = [column for column in get_column_names(GoogleMapsResult) if column not in ["photos", "reviews"]]
+    return _get_aliased_select(RestaurantRanking) + SQL(", ") + \
+           _get_aliased_select(GoogleMapsResult, columns=google_maps_columns) + SQL(", ") + \
+           _get_aliased_select(TripAdvisorResult)
+
+def get_google_maps_result(google_maps_link: str) -> Composed:
+    sql = SQL("SELECT * FROM google_maps WHERE link = {google_maps_link}")
+    return sql.format(google_maps_link=Literal(google_maps_link))
+
+def get_town_condition(town: str) -> Composed:
+    return SQL("town = {town}").format(town=Literal(town))
+
+def get_town_updated_notification(town: str) -> Composed:
+    # Is delivered to the listeners when the transaction commits
+    return SQL("NOTIFY {channel}, {town}").format(channel=Identifier(TOWN_UPDATED_CHANNEL), town=Literal(town))
+
+def get_towns_with_crawl_status(country: str, status: CrawlStatus) -> Composed:
+    sql = SQL("SELECT town FROM crawl_checkpoints WHERE country = {country} AND status = {status}")
+    return sql.format(country=Literal(country), status=Literal(status.value))
+
+def get_towns_crawled_since(country: str, since: datetime) -> Composed:
+    sql = SQL("SELECT town FROM crawl_checkpoints WHERE country = {country} AND status = {status} AND finished_at >= {since}")
+    return sql.format(country=Literal(country), status=Literal(CrawlStatus.FINISHED.value), since=Literal(since))
+
+def get_completed_google_maps_results(town: str) -> Composed:
+    # The restaurants of the town for which we already loaded details and photos
+    sql = SQL("SELECT {fields_to_select} FROM restaurants "
+              "INNER JOIN google_maps ON google_maps.link = restaurants.google_maps_link "
+              "WHERE town = {town} AND photos IS NOT NULL")
+    return sql.format(fields_to_select=_get_aliased_select(GoogleMapsResult), town=Literal(town))
+
+def get_stored_fingerprints(table_name: str, fingerprints: Tuple) -> Composed:
+    sql = SQL("SELECT fingerprint FROM {table_name} WHERE fingerprint IN {fingerprints}")
+    return sql.format(table_name=Identifier(table_name), fingerprints=Literal(fingerprints))
+
+def update_last_fetched_at(table_name: str, fingerprints: Tuple, last_fetched_at: datetime) -> Composed:
+    sql = SQL("UPDATE {table_name} SET last_fetched_at = {last_fetched_at} WHERE fingerprint IN {fingerprints}")
+    return sql.format(table_name=Identifier(table_name), last_fetched_at=Literal(last_fetched_at), fingerprints=Literal(fingerprints))
+
+def get_photos_with_variants(photo_hashes: Tuple) -> Composed:
+    sql = SQL("SELECT DISTINCT photo_hash FROM photo_variants WHERE photo_hash IN {photo_hashes}")
+    return sql.format(photo_hashes=Literal(photo_hashes))
+
+def get_photos_without_variants() -> SQL:
+    sql = SQL("SELECT DISTINCT unnest(photos) FROM google_maps WHERE photos IS NOT NULL "
+              "EXCEPT SELECT photo_hash FROM photo_variants")
+    return sql
+
+def get_reviews_without_best_review() -> SQL:
+    sql = SQL("SELECT * FROM google_maps WHERE reviews IS NOT NULL AND best_review IS NULL")
+    return sql
+
+def get_photo_variant(photo_hash: str, variant: PhotoVariantType) -> Composed:
+    sql = SQL("SELECT * FROM photo_variants WHERE photo_hash = {photo_hash} AND variant = {variant}")
+    return sql.format(photo_hash=Literal(photo_hash), variant=Literal(variant.value))
+
 def get_all_available_towns() -> SQL:
     sql = SQL("SELECT DISTINCT town FROM restaurants")
     return sql
 
+def get_all_towns_with_country() -> SQL:
+    sql = SQL("SELECT DISTINCT country, town FROM restaurants ORDER BY country, town")
+    return sql
+
+def get_restaurants_of_town(table: DeclarativeMeta, town: str) -> Composed:
+    # The rows of restaurants, google_maps or trip_advisor that belong to the restaurants of the town
+    # noinspection PyUnresolvedReferences
+    table_name: str = table.__tablename__
+    fields_to_select: Composed = SQL(", ").join([Identifier(column) for column in get_column_names(table)])
+    if table is GoogleMapsResult or table is TripAdvisorResult:
+        link_column: str = "google_maps_link" if table is GoogleMapsResult else "trip_advisor_link"
+        condition = SQL("link IN (SELECT {link_column} FROM restaurants WHERE town = {town})")\
+            .format(link_column=Identifier(link_column), town=Literal(town))
+    else:
+        condition = get_town_condition(town)
+    sql = SQL("SELECT {fields_to_select} FROM {table_name} WHERE {condition}")
+    return sql.format(fields_to_select=fields_to_select, table_name=Identifier(table_name), condition=condition)
+
+def get_photo_variants_of_town(town: str) -> Composed:
+    fields_to_select: Composed = SQL(", ").join([Identifier(column) for column in get_column_names(PhotoVariant)])
+    sql = SQL("SELECT {fields_to_select} FROM photo_variants WHERE photo_hash IN ("
+              "SELECT unnest(photos) FROM google_maps "
+              "INNER JOIN restaurants ON google_maps.link = restaurants.google_maps_link "
+              "WHERE town = {town})")
+    return sql.format(fields_to_select=fields_to_select, town=Literal(town))
+
+def get_schema_revision() -> SQL:
+    sql = SQL("SELECT version_num FROM alembic_version")
+    return sql
+
 
 # When Performing Joins, we sometimes need to alias the columns. Especially when they contain duplicate names. This
 # method exist to do that. This is also important so that the mapping works, see the DbResult class for this.
@@ -0,0 +1,103 @@
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+from typing import List, Dict, Tuple, Iterable, Set
+
+from ratings.towns import Town
+
+
+DEFAULT_SUGGESTIONS: int = 10
+# Longer queries are cut, they would only make the typo tolerant search slower
+MAX_QUERY_LENGTH: int = 40
+# Umlauts are written with or without the e ("Köln", "Koeln", "Koln"), so all of them become the plain vowel
+SPELLED_OUT_CHARACTERS: Dict[str, str] = {"ä": "a", "ö": "o", "ü": "u", "ß": "ss"}
+SPELLED_OUT_UMLAUTS: Dict[str, str] = {"ae": "a", "oe": "o", "ue": "u"}
+
+
+class TownSearchIndex:
+
+    # Suggests towns while the user types. Every word of a town name is a key, so "main" finds "Frankfurt am Main".
+    # The keys are normalized, so that "Koeln", "koln" and "Köln" are the same. The keys are sorted, so the towns that
+    # start with the query are found with a binary search. Only if there are not enough of them, the towns whose start
+    # is a typo or two away from the query are looked up. Typos in the first letter are rare, so only the keys with the
+    # same first letter are compared. The suggestions of both kinds are ordered by population.
+
+    def __init__(self, supported_towns: Iterable[str], towns: List[Town]):
+        population_of_town: Dict[str, int] = {town.name: town.population for town in towns}
+        self.supported_towns: Set[str] = set(supported_towns)
+        self.towns: List[str] = sorted(self.supported_towns, key=lambda town: (-population_of_town.get(town, 0), town))
+        # (key, position of the town in self.towns). The position is also the rank by population.
+        self._keys: List[Tuple[str, int]] = sorted({(key, i) for i, town in enumerate(self.towns) for key in _get_keys(town)})
+        self._keys_of_letter: Dict[str, List[Tuple[str, int]]] = {}
+        for key, i in self._keys:
+            self._keys_of_letter.setdefault(key[0], []).append((key, i))
+        self._search = lru_cache(maxsize=4096)(self._search)
+
+    # Public Methods
+
+    def search(self, query: str, limit: int = DEFAULT_SUGGESTIONS) -> List[str]:
+        return list(self._search(normalize(query)[:MAX_QUERY_LENGTH], limit))
+
+    def __len__(self) -> int:
+        return len(self.towns)
+
+    # Private Methods
+
+    def _search(self, query: str, limit: int) -> Tuple[str, ...]:
+        if len(query) == 0:
+            return tuple(self.towns[:limit])
+        matches: List[int] = sorted(self._get_prefix_matches(query))[:limit]
+        if len(matches) < limit:
+            found: Set[int] = set(matches)
+            typos: List[Tuple[int, int]] = sorted((typo_count, i) for i, typo_count in self._get_typo_matches(query).items()
+                                                  if i not in found)
+            matches += [i for _, i in typos[:limit - len(matches)]]
+        return tuple(self.towns[i] for i in matches)
+
+    def _get_prefix_matches(self, query: str) -> Set[int]:
+        matches: Set[int] = set()
+        for key, i in self._keys[bisect_left(self._keys, (query, -1)):]:
+            if not key.startswith(query):
+                break
+            matches.add(i)
+        return matches
+
+    def _get_typo_matches(self, query: str) -> Dict[int, int]:
+        # Short queries have too many matches with a typo to be useful
+        max_typos: int = 0 if len(query) < 3 else 1 if len(query) < 6 else 2
+        typo_count_of_town: Dict[int, int] = {}
+        for key, i in self._keys_of_letter.get(query[0], []):
+            typo_count: int = get_prefix_distance(query, key, max_typos)
+            if typo_count <= max_typos:
+                typo_count_of_town[i] = min(typo_count, typo_count_of_town.get(i, typo_count))
+        return typo_count_of_town
+
+
+def normalize(text: str) -> str:
+    lower: str = "".join(SPELLED_OUT_CHARACTERS.get(character, character) for character in text.strip().lower())
+    # Other accents are dropped, e.g. é -> e
+    without_accents: str = "".join(character for character in unicodedata.normalize("NFKD", lower)
+                                   if not unicodedata.combining(character))
+    for spelled_out, umlaut in SPELLED_OUT_UMLAUTS.items():
+        without_accents = without_accents.replace(spelled_out, umlaut)
+    # Hyphens, dots and the like separate words
+    words: str = "".join(character if character.isalnum() else " " for character in without_accents)
+    return " ".join(words.split())
+
+def get_prefix_distance(query: str, key: str, max_distance: int) -> int:
+    # The smallest Levenshtein distance between the query and a start of the key, max_distance + 1 if it is larger
+    # than max_distance
+    previous_row: List[int] = list(range(min(len(key), len(query) + max_distance) + 1))
+    for i, query_character in enumerate(query, start=1):
+        row: List[int] = [i]
+        for j, key_character in enumerate(key[:len(previous_row) - 1], start=1):
+            row.append(min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + (query_character != key_character)))
+        if min(row) > max_distance:
+            return max_distance + 1
+        previous_row = row
+    return min(previous_row)
+
+def _get_keys(town: str) -> List[str]:
+    # The whole name and every start of a word in it
+    name: str = normalize(town)
+    return [name] + [name[i + 1:] for i, character in enumerate(name) if character == " "]
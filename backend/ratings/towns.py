@@ -0,0 +1,30 @@
+import csv
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+
+TOWNS_PATH: str = "data/towns_germany.csv"
+
+
+@dataclass
+class Town:
+    name: str
+    population: int
+    location: Optional[Tuple[float, float]]
+
+
+def load_towns(path: str = TOWNS_PATH) -> List[Town]:
+    # The towns are sorted by population. The file starts with a byte order mark, utf-8-sig removes it.
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        return [Town(name=row["name"], population=int(row["pop"]), location=get_location_from_link(row["location"]))
+                for row in csv.DictReader(file)]
+
+def get_location_from_link(link: str) -> Optional[Tuple[float, float]]:
+    # The locations are Google Maps links like https://www.google.com/maps/?q=52.5244,13.4105
+    query: List[str] = parse_qs(urlparse(link).query).get("q", [])
+    try:
+        lat, lng = query[0].split(",")
+        return float(lat), float(lng)
+    except (IndexError, ValueError):
+        return None
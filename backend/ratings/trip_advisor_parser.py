@@ -0,0 +1,44 @@
+import json
+from typing import List, Dict, Optional
+
+
+# Trip Advisor embeds the restaurants of a list page as json into one of its scripts, e.g.
+#   ...{"restaurants":[{"name": ..., "detailPageUrl": ..., "averageRating": ..., "userReviewCount": ...}, ...]}...
+# Instead of building the whole DOM to find that script, we look for the start of the object in the raw page and let
+# the json decoder find its end. This module has no state, so that the parsing can also run in a process pool.
+
+RESTAURANTS_START: str = '{"restaurants"'
+REQUIRED_KEYS: List[str] = ["name", "detailPageUrl", "averageRating", "userReviewCount"]
+
+
+class TripAdvisorParseError(Exception):
+    # The page does not look like we expect, most likely Trip Advisor changed its markup
+    pass
+
+
+def parse_restaurants_page(html_file: str) -> List[Dict]:
+    # Like the old parser, the last embedded restaurant list wins if there are several
+    decoder: json.JSONDecoder = json.JSONDecoder()
+    restaurants: Optional[List[Dict]] = None
+    position: int = html_file.find(RESTAURANTS_START)
+    while position != -1:
+        try:
+            data, end = decoder.raw_decode(html_file, position)
+        except json.JSONDecodeError:
+            data, end = None, position + len(RESTAURANTS_START)
+        if _is_restaurant_list(data):
+            restaurants = data["restaurants"]
+        position = html_file.find(RESTAURANTS_START, end)
+    if restaurants is None:
+        raise TripAdvisorParseError(f"Found no restaurant list in the page. It contains {len(html_file)} characters and "
+                                    f"{html_file.count(RESTAURANTS_START)} candidates for the start of the list")
+    # Entries without the keys we need (e.g. ads) are skipped
+    return [{key: restaurant[key] for key in REQUIRED_KEYS} for restaurant in restaurants if _is_restaurant(restaurant)]
+
+def _is_restaurant_list(data) -> bool:
+    if not isinstance(data, dict) or not isinstance(data.get("restaurants"), list):
+        return False
+    return any(_is_restaurant(restaurant) for restaurant in data["restaurants"])
+
+def _is_restaurant(restaurant) -> bool:
+    return isinstance(restaurant, dict) and all(key in restaurant for key in REQUIRED_KEYS)
@@ -0,0 +1,43 @@
+import asyncio
+from concurrent.futures.process import ProcessPoolExecutor
+from typing import List, Optional
+
+import os
+
+from ratings import sql
+from ratings.database import PostgresDatabase
+from ratings.restaurant import GoogleMapsResult, get_fingerprint
+from ratings.reviews import ReviewSelector, ScoredReview
+
+
+# Chooses the best review of the restaurants that were crawled before the crawler did it, e.g. after migrating an
+# existing database. Like the crawler, it only keeps the chosen review.
+
+BATCH_SIZE: int = 500
+
+
+async def choose_best_reviews(postgres_db: PostgresDatabase):
+    restaurants: List[GoogleMapsResult] = postgres_db.get(sql.get_reviews_without_best_review()).convert_rows_to(GoogleMapsResult)
+    print(f"choosing the best review of {len(restaurants)} restaurants")
+    with ProcessPoolExecutor() as review_executor:
+        review_selector: ReviewSelector = ReviewSelector(review_executor)
+        for i in range(0, len(restaurants), BATCH_SIZE):
+            batch: List[GoogleMapsResult] = restaurants[i:i + BATCH_SIZE]
+            best_reviews: List[Optional[ScoredReview]] = await review_selector.choose_best_reviews_async([restaurant.reviews for restaurant in batch])
+            for restaurant, best_review in zip(batch, best_reviews):
+                if best_review is not None:
+                    restaurant.best_review, restaurant.best_review_score = best_review.review, best_review.score
+                restaurant.reviews = None
+                # The fingerprint covers the reviews as well, otherwise the next crawl takes the row for changed
+                restaurant.fingerprint = get_fingerprint(restaurant)
+            postgres_db.convert_to_db_entry(batch, "google_maps").upsert()
+            print(f"processed {min(i + BATCH_SIZE, len(restaurants))} restaurants")
+    # A running API reloads the rankings, which contain the best reviews
+    for town in postgres_db.get(sql.get_all_available_towns()).convert_to_primitive_type(str):
+        postgres_db.execute(sql.get_town_updated_notification(town))
+
+
+if __name__ == "__main__":
+    DATABASE_URL: str = os.environ["DATABASE_URL"]
+    postgres_db: PostgresDatabase = PostgresDatabase(DATABASE_URL)
+    asyncio.run(choose_best_reviews(postgres_db))
@@ -0,0 +1,34 @@
+import asyncio
+from concurrent.futures.process import ProcessPoolExecutor
+from typing import List
+
+import os
+
+from ratings import sql
+from ratings.database import PostgresDatabase
+from ratings.photo_store import get_photo_store
+from ratings.photo_variants import PhotoProcessor
+from ratings.restaurant import PhotoVariant
+
+
+# Creates the missing variants of all stored photos, e.g. after migrating an existing database
+
+BATCH_SIZE: int = 500
+
+
+async def create_photo_variants(postgres_db: PostgresDatabase):
+    photo_hashes: List[str] = postgres_db.get(sql.get_photos_without_variants()).convert_to_primitive_type(str)
+    print(f"creating the variants of {len(photo_hashes)} photos")
+    with ProcessPoolExecutor() as photo_executor:
+        photo_processor: PhotoProcessor = PhotoProcessor(get_photo_store(), photo_executor)
+        for i in range(0, len(photo_hashes), BATCH_SIZE):
+            photo_variants: List[PhotoVariant] = await photo_processor.create_variants_async(photo_hashes[i:i + BATCH_SIZE])
+            if len(photo_variants) > 0:
+                postgres_db.convert_to_db_entry(photo_variants, "photo_variants").upsert()
+            print(f"processed {min(i + BATCH_SIZE, len(photo_hashes))} photos")
+
+
+if __name__ == "__main__":
+    DATABASE_URL: str = os.environ["DATABASE_URL"]
+    postgres_db: PostgresDatabase = PostgresDatabase(DATABASE_URL)
+    asyncio.run(create_photo_variants(postgres_db))
@@ -0,0 +1,36 @@
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any
+
+import logging
+import os
+
+from ratings.database import PostgresDatabase
+from ratings.dataset import export_dataset
+from ratings.photo_store import get_photo_store
+
+
+# Exports the crawled restaurants to Parquet files, e.g. to ship a versioned snapshot of the data or to set up a
+# database without crawling. See import_dataset.py.
+
+DEFAULT_DATASETS_PATH: str = "data/datasets"
+
+
+if __name__ == "__main__":
+    parser: ArgumentParser = ArgumentParser(description="Exports the google_maps, trip_advisor and restaurants tables to "
+                                                        "Parquet files partitioned by country and town, together with the photos.")
+    parser.add_argument("--output", type=Path, default=None,
+                        help=f"Directory of the dataset, must not exist yet. Defaults to {DEFAULT_DATASETS_PATH}/<timestamp>")
+    parser.add_argument("--town", action="append", default=None, help="Only export this town, can be given more than once")
+    arguments: Namespace = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    DATABASE_URL: str = os.environ["DATABASE_URL"]
+    postgres_db: PostgresDatabase = PostgresDatabase(DATABASE_URL)
+    output: Path = arguments.output if arguments.output is not None \
+        else Path(DEFAULT_DATASETS_PATH) / datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    manifest: Dict[str, Any] = export_dataset(postgres_db, output, get_photo_store(),
+                                              towns=set(arguments.town) if arguments.town is not None else None)
+    print(f"exported {len(manifest['partitions'])} towns at revision {manifest['schema_revision']} to {output}")
+    if manifest["missing_photos"] > 0:
+        print(f"{manifest['missing_photos']} photos were not in the photo store and are missing from the dataset")
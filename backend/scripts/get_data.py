@@ -1,21 +1,47 @@
 from __future__ import annotations
 
+import asyncio
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import Executor
+from concurrent.futures.process import ProcessPoolExecutor
 from concurrent.futures.thread import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional, Callable, Tuple
+from copy import copy
+from datetime import datetime, timedelta
+from typing import List, Optional, Callable, Tuple, TypeVar, Set, Dict, Awaitable
+
+import numpy as np
 
 from psycopg2.sql import SQL
-from tqdm import tqdm
 import os
 
+from ratings import sql
 from ratings.database import PostgresDatabase
+from ratings.http_cache import get_response_cache
+from ratings.http_client import AsyncHttpClient, run_with_client
+from ratings.matching import RestaurantMatcher
+from ratings.metrics import CrawlMetrics, use_metrics, measure_stage, get_metrics_path, get_town_report_path
+from ratings.photo_store import get_photo_store
+from ratings.photo_variants import PhotoProcessor
+from ratings.ranking import refresh_town_ranking, RANKING_SIZE
+from ratings.rate_limiter import get_rate_limiter
 from ratings.rating_sites import GoogleMaps, TripAdvisor, RatingSite
+from ratings.reviews import ReviewSelector, ScoredReview
 from ratings.restaurant import RestaurantResult, CombinedRestaurant, SiteType, GoogleMapsResult, TripAdvisorResult, \
-    get_table_metadata
+    get_table_metadata, get_scores, CrawlCheckpoint, CrawlStatus, get_fingerprint, PhotoVariant
+from ratings.towns import load_towns
 import logging
-from pandas import DataFrame, read_csv
 
-from ratings.utils import timeout
+
+T = TypeVar('T')
+
+TOWN_TIMEOUT_SECONDS: int = 300
+# Maximum number of parallel requests per provider, shared by all towns that are crawled at the same time
+PROVIDER_LIMITS: Dict[str, int] = {
+    "maps.googleapis.com": 16,
+    "www.googleapis.com": 2,
+    "www.tripadvisor.com": 8,
+}
 
 
 @dataclass
@@ -27,38 +53,54 @@ class Result:
 # API Calls
 
 def load_town_results(town: str, country: str) -> List[Result]:
+    return run_with_client(lambda client: load_town_results_async(town, country, client))
+
+async def load_town_results_async(town: str, country: str, client: AsyncHttpClient,
+                                  known_restaurants: Dict[str, GoogleMapsResult] = None, parse_executor: Executor = None) -> List[Result]:
+    # Restaurants in known_restaurants already have details and photos from an earlier crawl, they are not loaded again.
+    # The Trip Advisor pages are parsed in parse_executor, if there is one.
     # Init
     search_string: str = town + " " + country
-    google_maps: GoogleMaps = GoogleMaps(API_KEY)
-    trip_advisor: TripAdvisor = TripAdvisor(API_KEY)
+    google_maps: GoogleMaps = GoogleMaps(API_KEY, get_photo_store())
+    trip_advisor: TripAdvisor = TripAdvisor(API_KEY, parse_executor)
     sites: List[RatingSite] = [google_maps, trip_advisor]
     # Query Restaurants
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        get_restaurants: Callable = lambda rating_site: rating_site.get_restaurants(search_string, 200)
-        restaurant_results: List[List[RestaurantResult]] = list(executor.map(get_restaurants, sites))
-    print("Got Results")
+    get_restaurants: Callable = lambda rating_site: rating_site.get_restaurants_async(search_string, 200, client)
+    restaurant_results: List[List[RestaurantResult]] = list(await asyncio.gather(*[get_restaurants(site) for site in sites]))
+    logging.info(f"{town}: got the restaurants of all sites")
     # Combine Info From The Different Sites
+    matchers: List[RestaurantMatcher] = [RestaurantMatcher(site_result) for site_result in restaurant_results]
     all_restaurants: List[List[RestaurantResult]] = []
-    for site_result in restaurant_results:
-        sorted_by_score = sorted(site_result, key=lambda restaurant: restaurant.get_score(site_result), reverse=True)
-        relevant_restaurants: List[RestaurantResult] = sorted_by_score[:60]
-        completed_infos: List[List[RestaurantResult]] = [combine_restaurant_info(restaurant, restaurant_results, sites, search_string)
-                                                         for restaurant in relevant_restaurants]
-        all_restaurants += completed_infos
-    print("Combined Restaurants")
+    with measure_stage("matching"):
+        relevant_restaurants: List[RestaurantResult] = []
+        for site_result in restaurant_results:
+            sorted_by_score: List[RestaurantResult] = sort_by_scores(site_result, get_scores(site_result))
+            relevant_restaurants += sorted_by_score[:60]
+        all_restaurants += await combine_restaurant_infos(relevant_restaurants, matchers, sites, search_string, client)
+    logging.info(f"{town}: combined the restaurants of the sites")
     # Filter
     only_with_full_info: List[List[RestaurantResult]] = [restaurant_sites for restaurant_sites in all_restaurants if
                                                          len(restaurant_sites) == 2]
     duplicates_removed: List[List[RestaurantResult]] = removed_duplicates(only_with_full_info)
-    sorted_by_combined_score: List[List[RestaurantResult]] = sorted(duplicates_removed,
-                             key=lambda restaurant_sites: get_score(restaurant_sites, duplicates_removed), reverse=True)
-    results: List[Result] = []
+    sorted_by_combined_score: List[List[RestaurantResult]] = sort_by_scores(duplicates_removed, get_combined_scores(duplicates_removed))
+    # As many as the stored ranking of the town holds
+    top_restaurants: List[Tuple[GoogleMapsResult, TripAdvisorResult]] = [get_typed_restaurants(restaurant_sites) for
+                                                                         restaurant_sites in sorted_by_combined_score[:RANKING_SIZE]]
+    # Load Details And Photos For The Best Restaurants Concurrently
+    known_restaurants = known_restaurants if known_restaurants is not None else {}
+    number_of_restaurants_to_load_more_detailed_info_to: int = 25
+    to_complete: List[GoogleMapsResult] = [google_maps_restaurant for google_maps_restaurant, _ in
+                                           top_restaurants[:number_of_restaurants_to_load_more_detailed_info_to]
+                                           if google_maps_restaurant.link not in known_restaurants]
+    completed: Dict[str, GoogleMapsResult] = {restaurant.link: restaurant for restaurant in
+                                              await google_maps.complete_restaurant_infos_async(to_complete, client)}
     # Create Result
-    for i, restaurant_sites in enumerate(tqdm(sorted_by_combined_score[:1])):
-        google_maps_restaurant, trip_advisor_restaurant = get_typed_restaurants(restaurant_sites)
-        number_of_restaurants_to_load_more_detailed_info_to: int = 25
-        if i < number_of_restaurants_to_load_more_detailed_info_to:
-            google_maps_restaurant = google_maps.complete_restaurant_info(google_maps_restaurant)
+    results: List[Result] = []
+    for google_maps_restaurant, trip_advisor_restaurant in top_restaurants:
+        if google_maps_restaurant.link in known_restaurants:
+            google_maps_restaurant = with_known_details(google_maps_restaurant, known_restaurants[google_maps_restaurant.link])
+        elif google_maps_restaurant.link in completed:
+            google_maps_restaurant = completed[google_maps_restaurant.link]
         combined_restaurant: CombinedRestaurant = CombinedRestaurant(town=town, country=country, google_maps_link=google_maps_restaurant.link,
                                                                      trip_advisor_link=trip_advisor_restaurant.link)
         results.append(Result(google_maps_restaurant, trip_advisor_restaurant, combined_restaurant))
@@ -67,22 +109,32 @@ def load_town_results(town: str, country: str) -> List[Result]:
 # Processing Methods For Restaurant Combination
 
 def removed_duplicates(all_restaurants: List[List[RestaurantResult]]) -> List[List[RestaurantResult]]:
+    # Keeps the first restaurant of every name
+    seen_names: Set[str] = set()
     without_duplicates: List[List[RestaurantResult]] = []
     for all_sites in all_restaurants:
-        if get_name(all_sites) not in [get_name(restaurant) for restaurant in without_duplicates]:
+        name: str = get_name(all_sites)
+        if name not in seen_names:
+            seen_names.add(name)
             without_duplicates.append(all_sites)
     return without_duplicates
 
-def combine_restaurant_info(restaurant: RestaurantResult, already_loaded: List[List[RestaurantResult]], sites: List[RatingSite], town: str) -> List[RestaurantResult]:
-    all_infos_for_restaurant: List[RestaurantResult] = [restaurant]
+async def combine_restaurant_infos(restaurants: List[RestaurantResult], already_loaded: List[RestaurantMatcher], sites: List[RatingSite],
+                                   town: str, client: AsyncHttpClient) -> List[List[RestaurantResult]]:
+    # Every restaurant with its entries on the other sites. Each site looks up all restaurants at once and the sites run
+    # concurrently, so combining a town takes about as long as the slowest lookup.
+    lookups: List[Awaitable[List[Optional[RestaurantResult]]]] = []
+    positions_of_site: List[List[int]] = []
     for i, site in enumerate(sites):
-        if restaurant.get_site_provider() == site.get_site_type():
-            continue
-        site_info_for_restaurant: Optional[RestaurantResult] = site.get_same_restaurant(restaurant, already_loaded[i], town)
-        if not site_info_for_restaurant:
-            continue
-        all_infos_for_restaurant.append(site_info_for_restaurant)
-    return all_infos_for_restaurant
+        positions: List[int] = [j for j, restaurant in enumerate(restaurants) if restaurant.get_site_provider() != site.get_site_type()]
+        lookups.append(site.get_same_restaurants_async([restaurants[j] for j in positions], already_loaded[i], town, client))
+        positions_of_site.append(positions)
+    all_infos: List[List[RestaurantResult]] = [[restaurant] for restaurant in restaurants]
+    for positions, site_infos in zip(positions_of_site, await asyncio.gather(*lookups)):
+        for j, site_info_for_restaurant in zip(positions, site_infos):
+            if site_info_for_restaurant:
+                all_infos[j].append(site_info_for_restaurant)
+    return all_infos
 
 def get_typed_restaurants(restaurant_sites: List[RestaurantResult]) -> Tuple[GoogleMapsResult, TripAdvisorResult]:
     # noinspection PyTypeChecker
@@ -99,13 +151,25 @@ def get_from_site(restaurant_sites: List[RestaurantResult], site: SiteType) -> R
 def has_entry_on_site(restaurant_sites: List[RestaurantResult], site: SiteType) -> bool:
     return next(filter(lambda restaurant: restaurant.site == site, restaurant_sites), None) is not None
 
-def get_score(restaurant_sites: List[RestaurantResult], all_restaurants: List[List[RestaurantResult]]) -> float:
-    total_score: float = 0
-    for i in range(len(restaurant_sites)):
-        restaurant_from_site: RestaurantResult = restaurant_sites[i]
-        total_score += restaurant_from_site.get_score(all_restaurants[i])
-    mean_score: float = total_score / len(restaurant_sites)
-    return mean_score
+def get_combined_scores(all_restaurants: List[List[RestaurantResult]]) -> np.ndarray:
+    # Every site of a restaurant is scored against the same site of all other restaurants, the combined score is the mean
+    google_maps_scores: np.ndarray = get_scores([get_from_site(restaurant_sites, SiteType.GOOGLE_MAPS) for restaurant_sites in all_restaurants])
+    trip_advisor_scores: np.ndarray = get_scores([get_from_site(restaurant_sites, SiteType.TRIP_ADVISOR) for restaurant_sites in all_restaurants])
+    return (google_maps_scores + trip_advisor_scores) / 2
+
+def sort_by_scores(items: List[T], scores: np.ndarray) -> List[T]:
+    # Stable like sorted(..., reverse=True), so ties keep their original order
+    order: np.ndarray = np.argsort(-scores, kind="stable")
+    return [items[i] for i in order]
+
+def with_known_details(restaurant: GoogleMapsResult, known_restaurant: GoogleMapsResult) -> GoogleMapsResult:
+    # Fresh ratings, but the details and photos of the earlier crawl
+    updated: GoogleMapsResult = copy(restaurant)
+    updated.photos = known_restaurant.photos
+    updated.reviews = known_restaurant.reviews
+    updated.best_review = known_restaurant.best_review
+    updated.best_review_score = known_restaurant.best_review_score
+    return updated
 
 def get_name(restaurant_sites: List[RestaurantResult]) -> str:
     return get_from_site(restaurant_sites, SiteType.GOOGLE_MAPS).name
@@ -117,7 +181,158 @@ def _change_shape(results: List[Result]) -> Tuple[List[GoogleMapsResult], List[T
     return google_maps_result, trip_advisor_result, combined
 
 
+# Crawling Many Towns
+
+async def crawl_towns(towns: List[str], country: str, postgres_db: PostgresDatabase, towns_in_parallel: int, retry_failed: bool,
+                      recrawl_older_than: timedelta = None):
+    # Resume Where The Last Run Stopped. When recrawling, only the towns that were not crawled recently are skipped.
+    towns_to_skip: Set[str]
+    if recrawl_older_than is None:
+        towns_to_skip = set(postgres_db.get(sql.get_towns_with_crawl_status(country, CrawlStatus.FINISHED)).convert_to_primitive_type(str))
+    else:
+        crawled_since: datetime = datetime.utcnow() - recrawl_older_than
+        towns_to_skip = set(postgres_db.get(sql.get_towns_crawled_since(country, crawled_since)).convert_to_primitive_type(str))
+    if not retry_failed:
+        towns_to_skip |= set(postgres_db.get(sql.get_towns_with_crawl_status(country, CrawlStatus.FAILED)).convert_to_primitive_type(str))
+    remaining_towns: List[str] = [town for town in towns if town not in towns_to_skip]
+    logging.info(f"{len(towns) - len(remaining_towns)} towns are already done, crawling {len(remaining_towns)} towns")
+    # Crawl Towns Concurrently. The provider limits apply across all towns, since they share the client. The database
+    # connection can not be shared between threads, so all writes go through one thread.
+    # The variants of the photos are created, the reviews are scored and the Trip Advisor pages are parsed in a process
+    # pool, which is shared by all towns as well.
+    # The metrics of all towns of this run are summed up in one file, which is updated after every town.
+    # The rate and the daily budget of the Google endpoints are shared with other crawlers running on the host.
+    towns_running: asyncio.Semaphore = asyncio.Semaphore(towns_in_parallel)
+    run_metrics: CrawlMetrics = CrawlMetrics(country=country)
+    with ThreadPoolExecutor(max_workers=1) as database_executor, ProcessPoolExecutor() as process_executor:
+        photo_processor: PhotoProcessor = PhotoProcessor(get_photo_store(), process_executor)
+        review_selector: ReviewSelector = ReviewSelector(process_executor)
+        async with AsyncHttpClient(host_limits=PROVIDER_LIMITS, cache=get_response_cache(), rate_limiter=get_rate_limiter()) as client:
+            logging.info(f"Remaining daily budgets: {client.get_remaining_budgets()}")
+            crawls = [crawl_town(town, country, client, postgres_db, database_executor, process_executor, photo_processor,
+                                 review_selector, towns_running, run_metrics, reuse_details=recrawl_older_than is not None)
+                      for town in remaining_towns]
+            await asyncio.gather(*crawls)
+            run_metrics.remaining_budgets = client.get_remaining_budgets()
+    logging.info(f"Remaining daily budgets: {run_metrics.remaining_budgets}")
+    run_metrics.finish(CrawlStatus.FINISHED.value)
+    run_metrics.write(get_metrics_path() / "crawl.json")
+
+async def crawl_town(town: str, country: str, client: AsyncHttpClient, postgres_db: PostgresDatabase, database_executor: Executor,
+                     parse_executor: Executor, photo_processor: PhotoProcessor, review_selector: ReviewSelector,
+                     towns_running: asyncio.Semaphore, run_metrics: CrawlMetrics, reuse_details: bool):
+    async with towns_running:
+        logging.info(f"{town}: started crawling")
+        town_metrics: CrawlMetrics = CrawlMetrics(town, country)
+        with use_metrics(town_metrics):
+            checkpoint: CrawlCheckpoint = await crawl_town_with_checkpoints(town, country, client, postgres_db, database_executor,
+                                                                            parse_executor, photo_processor, review_selector, reuse_details)
+        # Per Town Report And Summary Of The Run
+        town_metrics.finish(checkpoint.status)
+        town_metrics.remaining_budgets = run_metrics.remaining_budgets = client.get_remaining_budgets()
+        town_metrics.write(get_town_report_path(town, country))
+        run_metrics.merge(town_metrics)
+        run_metrics.write(get_metrics_path() / "crawl.json")
+
+async def crawl_town_with_checkpoints(town: str, country: str, client: AsyncHttpClient, postgres_db: PostgresDatabase,
+                                      database_executor: Executor, parse_executor: Executor, photo_processor: PhotoProcessor,
+                                      review_selector: ReviewSelector, reuse_details: bool) -> CrawlCheckpoint:
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    started_at: datetime = datetime.utcnow()
+    await loop.run_in_executor(database_executor, save_checkpoint, postgres_db,
+                               CrawlCheckpoint(town=town, country=country, status=CrawlStatus.IN_PROGRESS.value,
+                                               started_at=started_at, finished_at=None, error=None))
+    try:
+        known_restaurants: Dict[str, GoogleMapsResult] = {}
+        if reuse_details:
+            known_restaurants = await loop.run_in_executor(database_executor, get_known_restaurants, postgres_db, town)
+        results: List[Result] = await asyncio.wait_for(load_town_results_async(town, country, client, known_restaurants, parse_executor),
+                                                       timeout=TOWN_TIMEOUT_SECONDS)
+        with measure_stage("reviews"):
+            await choose_missing_best_reviews(results, review_selector)
+        with measure_stage("photo_variants"):
+            photo_variants: List[PhotoVariant] = await create_missing_photo_variants(results, postgres_db, database_executor, photo_processor)
+        with measure_stage("database"):
+            await loop.run_in_executor(database_executor, save_town_results, postgres_db, town, results, photo_variants)
+        checkpoint: CrawlCheckpoint = CrawlCheckpoint(town=town, country=country, status=CrawlStatus.FINISHED.value,
+                                                      started_at=started_at, finished_at=datetime.utcnow(), error=None)
+    except Exception as error:
+        logging.exception(f"Error for town {town}. Continuing with next town")
+        checkpoint = CrawlCheckpoint(town=town, country=country, status=CrawlStatus.FAILED.value,
+                                     started_at=started_at, finished_at=datetime.utcnow(), error=repr(error))
+    await loop.run_in_executor(database_executor, save_checkpoint, postgres_db, checkpoint)
+    return checkpoint
+
+def get_known_restaurants(postgres_db: PostgresDatabase, town: str) -> Dict[str, GoogleMapsResult]:
+    known_restaurants: List[GoogleMapsResult] = postgres_db.get(sql.get_completed_google_maps_results(town)).convert_rows_to(GoogleMapsResult)
+    return {restaurant.link: restaurant for restaurant in known_restaurants}
+
+async def create_missing_photo_variants(results: List[Result], postgres_db: PostgresDatabase, database_executor: Executor,
+                                       photo_processor: PhotoProcessor) -> List[PhotoVariant]:
+    # Photos that were already loaded in an earlier crawl usually have their variants already
+    photo_hashes: List[str] = [photo_hash for result in results for photo_hash in result.google_maps_restaurant.photos or []]
+    if len(photo_hashes) == 0:
+        return []
+    photos_with_variants: Set[str] = await asyncio.get_running_loop().run_in_executor(database_executor, get_photos_with_variants,
+                                                                                      postgres_db, tuple(photo_hashes))
+    return await photo_processor.create_variants_async([photo_hash for photo_hash in photo_hashes if photo_hash not in photos_with_variants])
+
+async def choose_missing_best_reviews(results: List[Result], review_selector: ReviewSelector):
+    # Restaurants whose details are known from an earlier crawl keep the review chosen then. Only the chosen review is
+    # stored, the others are dropped.
+    restaurants: List[GoogleMapsResult] = [result.google_maps_restaurant for result in results
+                                           if result.google_maps_restaurant.reviews and result.google_maps_restaurant.best_review is None]
+    best_reviews: List[Optional[ScoredReview]] = await review_selector.choose_best_reviews_async([restaurant.reviews for restaurant in restaurants])
+    for restaurant, best_review in zip(restaurants, best_reviews):
+        if best_review is not None:
+            restaurant.best_review, restaurant.best_review_score = best_review.review, best_review.score
+    for result in results:
+        result.google_maps_restaurant.reviews = None
+
+def get_photos_with_variants(postgres_db: PostgresDatabase, photo_hashes: Tuple) -> Set[str]:
+    return set(postgres_db.get(sql.get_photos_with_variants(photo_hashes)).convert_to_primitive_type(str))
+
+def save_town_results(postgres_db: PostgresDatabase, town: str, results: List[Result], photo_variants: List[PhotoVariant] = None):
+    google_maps_results, trip_advisor_results, restaurants = _change_shape(results)
+    fetched_at: datetime = datetime.utcnow()
+    save_changed_entries(postgres_db, "google_maps", google_maps_results, fetched_at)
+    save_changed_entries(postgres_db, "trip_advisor", trip_advisor_results, fetched_at)
+    save_changed_entries(postgres_db, "restaurants", restaurants, fetched_at)
+    if photo_variants:
+        postgres_db.convert_to_db_entry(photo_variants, "photo_variants").upsert()
+    refresh_town_ranking(postgres_db, town)
+
+def save_changed_entries(postgres_db: PostgresDatabase, table_name: str, entries: List[T], fetched_at: datetime):
+    # Rows whose fingerprint is already stored did not change, for them we only update the timestamp
+    if len(entries) == 0:
+        return
+    for entry in entries:
+        entry.fingerprint = get_fingerprint(entry)
+        entry.last_fetched_at = fetched_at
+    fingerprints: Tuple = tuple(entry.fingerprint for entry in entries)
+    stored_fingerprints: Set[str] = set(postgres_db.get(sql.get_stored_fingerprints(table_name, fingerprints)).convert_to_primitive_type(str))
+    if len(stored_fingerprints) > 0:
+        postgres_db.execute(sql.update_last_fetched_at(table_name, tuple(stored_fingerprints), fetched_at))
+    changed_entries: List[T] = [entry for entry in entries if entry.fingerprint not in stored_fingerprints]
+    if len(changed_entries) > 0:
+        postgres_db.convert_to_db_entry(changed_entries, table_name).upsert()
+
+def save_checkpoint(postgres_db: PostgresDatabase, checkpoint: CrawlCheckpoint):
+    postgres_db.convert_to_db_entry([checkpoint], "crawl_checkpoints").upsert()
+
+
 if __name__ == "__main__":
+    parser: ArgumentParser = ArgumentParser(description="Crawls the restaurants of the German towns. Towns that were "
+                                                        "already crawled successfully are skipped.")
+    parser.add_argument("--first-town", type=int, default=25, help="Index of the first town (the towns are sorted by population)")
+    parser.add_argument("--last-town", type=int, default=200, help="Index after the last town")
+    parser.add_argument("--towns-in-parallel", type=int, default=4)
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry towns that failed in earlier runs")
+    parser.add_argument("--recrawl-older-than-days", type=float, default=None,
+                        help="Recrawl the towns that were crawled longer ago. Ratings are updated, details and photos are "
+                             "only loaded for restaurants that are new to a town")
+    arguments: Namespace = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
     API_KEY: str = os.environ["API_KEY"]
     DATABASE_URL = os.environ["DATABASE_URL"]
     # Start Postgres
@@ -125,21 +340,8 @@ if __name__ == "__main__":
     postgres_db = PostgresDatabase(DATABASE_URL)
     postgres_db.initialize_tables(DATABASE_URL, meta_information)
     # Crawl Data For German Towns
-    german_towns: List[str] = list(read_csv("data/towns_germany.csv")["name"]) # The towns are already sorted by population
-
-    for i, town in enumerate(german_towns[25:200]):
-        print(f"processing town {i}: {town}")
-        try:
-            with timeout(seconds=300):
-                results: List[Result] = load_town_results(town, "Deutschland")
-                google_maps_results, trip_advisor_results, restaurants = _change_shape(results)
-                postgres_db.convert_to_db_entry(google_maps_results, "google_maps").upsert()
-                postgres_db.convert_to_db_entry(trip_advisor_results, "trip_advisor").upsert()
-                postgres_db.convert_to_db_entry(restaurants, "restaurants").upsert()
-        except Exception:
-            logging.exception(f"Error for town {town}. Continuing with next town")
-
-
-
-
-
+    german_towns: List[str] = [town.name for town in load_towns()] # The towns are already sorted by population
+    asyncio.run(crawl_towns(german_towns[arguments.first_town:arguments.last_town], "Deutschland", postgres_db,
+                            arguments.towns_in_parallel, retry_failed=not arguments.skip_failed,
+                            recrawl_older_than=timedelta(days=arguments.recrawl_older_than_days)
+                            if arguments.recrawl_older_than_days is not None else None))
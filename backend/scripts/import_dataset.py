@@ -0,0 +1,27 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import List
+
+import logging
+import os
+
+from ratings.database import PostgresDatabase
+from ratings.dataset import import_dataset
+from ratings.photo_store import get_photo_store
+
+
+# Loads a dataset written by export_dataset.py into the database and the photo store. The database must be migrated to
+# the revision the dataset was exported at (alembic upgrade head). The rankings of the imported towns are recomputed,
+# which also tells a running API to reload them.
+
+if __name__ == "__main__":
+    parser: ArgumentParser = ArgumentParser(description="Imports a dataset of Parquet files into the database")
+    parser.add_argument("dataset", type=Path, help="Directory of the dataset")
+    parser.add_argument("--town", action="append", default=None, help="Only import this town, can be given more than once")
+    arguments: Namespace = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    DATABASE_URL: str = os.environ["DATABASE_URL"]
+    postgres_db: PostgresDatabase = PostgresDatabase(DATABASE_URL)
+    imported_towns: List[str] = import_dataset(postgres_db, arguments.dataset, get_photo_store(),
+                                               towns=set(arguments.town) if arguments.town is not None else None)
+    print(f"imported {len(imported_towns)} towns")
@@ -0,0 +1,18 @@
+from typing import List
+
+import os
+
+from ratings import sql
+from ratings.database import PostgresDatabase
+from ratings.ranking import refresh_town_ranking
+
+
+# Recomputes the stored ranking of every town, e.g. after the scoring changed or after migrating an existing database
+
+if __name__ == "__main__":
+    DATABASE_URL: str = os.environ["DATABASE_URL"]
+    postgres_db: PostgresDatabase = PostgresDatabase(DATABASE_URL)
+    all_towns: List[str] = postgres_db.get(sql.get_all_available_towns()).convert_to_primitive_type(str)
+    for town in all_towns:
+        print(f"refreshing ranking of {town}")
+        refresh_town_ranking(postgres_db, town)
@@ -1,20 +1,47 @@
 from dataclasses import dataclass
-from typing import List, Tuple
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from threading import Lock
+from typing import List, Tuple, Dict, Iterator, Optional, Any, Set
 
 import uvicorn
-from fastapi import FastAPI
-from psycopg2.sql import Composed
+from fastapi import FastAPI, HTTPException, Header, Depends, Query
+from fastapi.encoders import jsonable_encoder
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, Response, JSONResponse
 
 import os
 
 from ratings import sql
-from ratings.database import PostgresDatabase, get_column_names
-from ratings.restaurant import *
+from ratings.api_cache import ApiCache
+from ratings.database import PostgresDatabase, PostgresConnectionPool, get_column_names
+from ratings.notifications import TownUpdateListener
+from ratings.photo_store import PhotoStore, get_photo_store
+from ratings.ranking import RANKING_SIZE
+from ratings.restaurant import GoogleMapsResult, CombinedRestaurant, PhotoVariant, PhotoVariantType, get_fingerprint, \
+    get_google_maps_link
+from ratings.snapshot import SnapshotStore, RestaurantSnapshot, load_snapshot
+from ratings.town_search import TownSearchIndex, DEFAULT_SUGGESTIONS
+from ratings.towns import load_towns, Town
 
 app = FastAPI()
 DATABASE_URL: str = os.environ["DATABASE_URL"]
-POSTGRES_DB: PostgresDatabase = PostgresDatabase(DATABASE_URL)
+POSTGRES_POOL: PostgresConnectionPool = PostgresConnectionPool(DATABASE_URL,
+                                                              min_connections=int(os.environ.get("DATABASE_POOL_MIN_SIZE", 1)),
+                                                              max_connections=int(os.environ.get("DATABASE_POOL_MAX_SIZE", 10)))
+PHOTO_STORE: PhotoStore = get_photo_store()
+DEFAULT_PAGE_SIZE: int = 10
+DETAILS_MAX_AGE_SECONDS: int = 3600
+# The responses of a town are cached until the crawler writes new data for it
+API_CACHE: ApiCache = ApiCache(max_entries=int(os.environ.get("API_CACHE_MAX_ENTRIES", 1024)),
+                               time_to_live_seconds=float(os.environ.get("API_CACHE_TTL_SECONDS", 3600)))
+DEFAULT_RADIUS_METERS: float = 2000
+MAX_RADIUS_METERS: float = 50000
+TOWNS: List[Town] = load_towns()
+TOWN_LOCATIONS: Dict[str, Tuple[float, float]] = {town.name: town.location for town in TOWNS if town.location is not None}
+# The supported towns only change when the crawler adds a town, so their index is only rebuilt then
+_town_search_index: Optional[TownSearchIndex] = None
+_town_search_index_lock: Lock = Lock()
 
 # Allow Connections From Frontend
 
@@ -33,31 +60,165 @@ app.add_middleware(
 class Result:
     name: str
 
+# The listings are served from a snapshot of all ranked restaurants, which does not need the database. When the crawler
+# wrote new data for a town, a new snapshot is loaded, and the cached responses of the town are dropped once it is in
+# place.
+
+def on_snapshot_reloaded(updated_towns: Optional[Set[str]]):
+    if updated_towns is None:
+        API_CACHE.clear()
+    else:
+        for town in updated_towns:
+            API_CACHE.invalidate_town(town)
+    _reset_town_search_index(set(SNAPSHOT_STORE.get().towns))
+
+SNAPSHOT_STORE: SnapshotStore = SnapshotStore(lambda: load_snapshot(POSTGRES_POOL), on_reloaded=on_snapshot_reloaded)
+TOWN_UPDATE_LISTENER: TownUpdateListener = TownUpdateListener(DATABASE_URL, on_town_updated=SNAPSHOT_STORE.request_reload,
+                                                              on_reconnect=SNAPSHOT_STORE.request_reload)
+
+# Every request gets a connection of its own from the pool
+
+def get_postgres_db() -> Iterator[PostgresDatabase]:
+    with POSTGRES_POOL.connection() as postgres_db:
+        yield postgres_db
+
+@app.on_event("startup")
+def start_serving_snapshots():
+    SNAPSHOT_STORE.start()
+    TOWN_UPDATE_LISTENER.start()
+
+@app.on_event("shutdown")
+def stop_serving_snapshots():
+    TOWN_UPDATE_LISTENER.stop()
+    SNAPSHOT_STORE.stop()
+
 @app.get("/restaurants")
-def get_restaurants(town: str):
-    # Get Info For All Restaurants Without Expensive Photo Loading Operation
-    sql_to_get_names: Composed = sql.get_restaurants_without_photos(town)
-    results: List[Tuple[GoogleMapsResult, TripAdvisorResult]] = POSTGRES_DB\
-        .get(sql_to_get_names)\
-        .convert_to_two_types(GoogleMapsResult, TripAdvisorResult, accept_error=True)
-    google_maps_results: List[GoogleMapsResult] = [result[0] for result in results]
-    trip_advisor_results: List[TripAdvisorResult] = [result[1] for result in results]
-    assert (len(results)) != 0, "Could not load results"
-    # Sort Restaurants To Get The 10 Best Restaurants
-    sorted_by_score = sorted(results, key=lambda result: result[0].get_score(google_maps_results) + result[1].get_score(trip_advisor_results), reverse=True)
-    # Complete Restaurant Data By Loading Photos Into It
-    sql_to_get_all_info: Composed = sql.get_all_restaurant_info(tuple([result[0].link for result in sorted_by_score[:10]]))
-    completed_results: List[Tuple[GoogleMapsResult, TripAdvisorResult]] = POSTGRES_DB\
-        .get(sql_to_get_all_info)\
-        .convert_to_two_types(GoogleMapsResult, TripAdvisorResult)
-    return [{"google_maps_info": result[0], "trip_advisor_info":result[1]} for result in completed_results]
+def get_restaurants(town: str, cursor: int = Query(0, ge=0), limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=RANKING_SIZE)):
+    # The ranking is computed by the crawler, so we only need to look up one page of it. The cursor is the rank of the
+    # first restaurant on the page. Photos are not part of the listing, they have an endpoint of their own.
+    cached_response: Optional[bytes] = API_CACHE.get(town, "restaurants", cursor, limit)
+    if cached_response is not None:
+        return Response(cached_response, media_type="application/json")
+    # The generation must be taken before the snapshot, see on_snapshot_reloaded
+    generation: int = API_CACHE.get_generation()
+    page: Optional[Dict] = SNAPSHOT_STORE.get().get_page(town, cursor, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Could not load results")
+    response: bytes = _serialize(page)
+    API_CACHE.put(town, "restaurants", cursor, limit, response=response, generation=generation)
+    return Response(response, media_type="application/json")
+
+
+@app.get("/restaurants/near")
+def get_restaurants_near(lat: float = Query(None, ge=-90, le=90), lng: float = Query(None, ge=-180, le=180), town: str = None,
+                         radius_meters: float = Query(DEFAULT_RADIUS_METERS, gt=0, le=MAX_RADIUS_METERS),
+                         limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=RANKING_SIZE)):
+    # The best ranked restaurants around a point, which is either given directly or is the center of a town
+    if lat is None or lng is None:
+        if town not in TOWN_LOCATIONS:
+            raise HTTPException(status_code=422, detail="Either lat and lng or a known town are required")
+        lat, lng = TOWN_LOCATIONS[town]
+    snapshot: RestaurantSnapshot = SNAPSHOT_STORE.get()
+    distances: Dict[int, float] = dict(snapshot.geo_index.get_within(lat, lng, radius_meters))
+    best: List[int] = snapshot.get_best(list(distances.keys()), limit)
+    restaurants: List[Dict] = [{**snapshot.get_restaurants(i, i + 1)[0], "town": snapshot.get_town(i), "distance_meters": round(distances[i])}
+                               for i in best]
+    return Response(_serialize({"restaurants": restaurants}), media_type="application/json")
+
+
+@app.get("/restaurants/{restaurant_id}/photos")
+def get_restaurant_photos(restaurant_id: str, if_none_match: str = Header(None), if_modified_since: str = Header(None),
+                          postgres_db: PostgresDatabase = Depends(get_postgres_db)):
+    google_maps_result: GoogleMapsResult = _get_google_maps_result(postgres_db, restaurant_id)
+    return _get_conditional_response(google_maps_result, google_maps_result.photos or [], if_none_match, if_modified_since)
+
+
+@app.get("/photos/{photo_hash}")
+def get_photo(photo_hash: str, variant: PhotoVariantType = None, if_none_match: str = Header(None)):
+    if not PHOTO_STORE.contains(photo_hash):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    # Serve the requested variant. Photos without variants (e.g. because they are not processed yet) are served as is.
+    hash_to_serve: str = photo_hash
+    media_type: str = "image/jpeg"
+    if variant is not None:
+        # Only the variants need the database, the originals are served without taking a connection from the pool
+        photo_variants: List[PhotoVariant] = POSTGRES_POOL.get(sql.get_photo_variant(photo_hash, variant)).convert_rows_to(PhotoVariant)
+        if len(photo_variants) > 0 and PHOTO_STORE.contains(photo_variants[0].variant_hash):
+            hash_to_serve = photo_variants[0].variant_hash
+            media_type = photo_variants[0].media_type
+    # Photos are stored by content hash, so they never change and clients can cache them forever. Only a missing variant
+    # may still be created, so the fallback to the original must not be cached for long.
+    cache_control: str = "public, max-age=31536000, immutable"
+    if variant is not None and hash_to_serve == photo_hash:
+        cache_control = f"public, max-age={DETAILS_MAX_AGE_SECONDS}"
+    headers: Dict[str, str] = {"Cache-Control": cache_control, "ETag": f'"{hash_to_serve}"'}
+    if if_none_match == f'"{hash_to_serve}"':
+        return Response(status_code=304, headers=headers)
+    return FileResponse(PHOTO_STORE.get_path(hash_to_serve), media_type=media_type, headers=headers)
 
 
 @app.get("/all_supported_towns")
 def get_all_available_towns():
-    sql_to_get_all_available_towns = sql.get_all_available_towns()
-    list_of_towns: List[str] = POSTGRES_DB.get(sql_to_get_all_available_towns).convert_to_primitive_type(str)
-    return list_of_towns
+    return _get_town_search_index().towns
+
+
+@app.get("/towns/autocomplete")
+def get_town_suggestions(q: str = "", limit: int = Query(DEFAULT_SUGGESTIONS, ge=1, le=50)):
+    # The supported towns that match what the user typed so far, the largest first
+    return _get_town_search_index().search(q, limit)
+
+def _get_town_search_index() -> TownSearchIndex:
+    global _town_search_index
+    with _town_search_index_lock:
+        if _town_search_index is None:
+            _town_search_index = TownSearchIndex(SNAPSHOT_STORE.get().towns, TOWNS)
+        return _town_search_index
+
+def _reset_town_search_index(supported_towns: Set[str]):
+    # Updates of towns we already know do not change the index
+    global _town_search_index
+    with _town_search_index_lock:
+        if _town_search_index is not None and _town_search_index.supported_towns != supported_towns:
+            _town_search_index = None
+
+def _serialize(content: Any) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+def _get_google_maps_result(postgres_db: PostgresDatabase, restaurant_id: str) -> GoogleMapsResult:
+    results: List[GoogleMapsResult] = postgres_db\
+        .get(sql.get_google_maps_result(get_google_maps_link(restaurant_id)))\
+        .convert_rows_to(GoogleMapsResult)
+    if len(results) == 0:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return results[0]
+
+def _get_conditional_response(google_maps_result: GoogleMapsResult, content: Any, if_none_match: Optional[str],
+                              if_modified_since: Optional[str]) -> Response:
+    # The details of a restaurant only change when the crawler writes a new version of the row, which also changes its
+    # fingerprint. Clients that already have the current version get an empty 304.
+    fingerprint: str = google_maps_result.fingerprint or get_fingerprint(google_maps_result)
+    headers: Dict[str, str] = {"Cache-Control": f"public, max-age={DETAILS_MAX_AGE_SECONDS}", "ETag": f'"{fingerprint}"'}
+    last_modified: Optional[datetime] = None
+    if google_maps_result.last_fetched_at is not None:
+        last_modified = google_maps_result.last_fetched_at.replace(microsecond=0, tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if _is_not_modified(fingerprint, last_modified, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content, headers=headers)
+
+def _is_not_modified(fingerprint: str, last_modified: Optional[datetime], if_none_match: Optional[str],
+                     if_modified_since: Optional[str]) -> bool:
+    # As in RFC 7232, If-Modified-Since is ignored when the request contains If-None-Match
+    if if_none_match is not None:
+        etags: List[str] = [etag.strip() for etag in if_none_match.split(",")]
+        return "*" in etags or f'"{fingerprint}"' in etags or f'W/"{fingerprint}"' in etags
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return last_modified <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
 
 if __name__ == "__main__":
     names = get_column_names(CombinedRestaurant)
@@ -0,0 +1,44 @@
+import random
+from typing import List, Tuple
+
+import pytest
+
+from ratings.geo_index import GeoIndex, get_distance_in_meters
+
+
+def get_within_linearly(locations: List[Tuple[float, float]], lat: float, lng: float, radius_meters: float) -> List[int]:
+    return [i for i, location in enumerate(locations) if get_distance_in_meters((lat, lng), location) <= radius_meters]
+
+
+def test_the_distances():
+    # Berlin to Hamburg is about 255 km
+    assert get_distance_in_meters((52.5200, 13.4050), (53.5511, 9.9937)) == pytest.approx(255000, rel=0.01)
+    assert get_distance_in_meters((50, 8), (50, 8)) == 0
+
+def test_finds_the_same_items_as_a_linear_search():
+    generator: random.Random = random.Random(7)
+    locations: List[Tuple[float, float]] = [(generator.uniform(47, 55), generator.uniform(6, 15)) for _ in range(2000)]
+    index: GeoIndex[int] = GeoIndex(locations, list(range(len(locations))))
+    for _ in range(50):
+        lat, lng = generator.uniform(47, 55), generator.uniform(6, 15)
+        radius_meters: float = generator.choice([500, 5000, 30000, 100000])
+        within: List[Tuple[int, float]] = index.get_within(lat, lng, radius_meters)
+        assert sorted(i for i, _ in within) == get_within_linearly(locations, lat, lng, radius_meters)
+
+def test_the_closest_items_come_first():
+    locations: List[Tuple[float, float]] = [(50.02, 8.0), (50.0, 8.0), (50.01, 8.0), (51.0, 8.0)]
+    within: List[Tuple[str, float]] = GeoIndex(locations, ["far", "here", "near", "too far"]).get_within(50.0, 8.0, 5000)
+    assert [item for item, _ in within] == ["here", "near", "far"]
+    assert [distance for _, distance in within] == pytest.approx([0, 1112, 2224], abs=1)
+
+def test_radius_larger_than_the_cells_and_far_north():
+    generator: random.Random = random.Random(3)
+    locations: List[Tuple[float, float]] = [(generator.uniform(69, 71), generator.uniform(15, 30)) for _ in range(500)]
+    index: GeoIndex[int] = GeoIndex(locations, list(range(len(locations))), cell_size_meters=1000)
+    within: List[Tuple[int, float]] = index.get_within(70, 22, 50000)
+    assert sorted(i for i, _ in within) == get_within_linearly(locations, 70, 22, 50000)
+
+def test_an_empty_index():
+    index: GeoIndex[int] = GeoIndex([], [])
+    assert len(index) == 0
+    assert index.get_within(50, 8, 1000) == []
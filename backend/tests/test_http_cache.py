@@ -0,0 +1,94 @@
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from ratings.http_cache import ResponseCache, CacheMissError, normalize_url, get_endpoint
+
+
+DETAILS_URL: str = "https://maps.googleapis.com/maps/api/place/details/json?place_id=abc&fields=review,photos&key=secret"
+PHOTO_URL: str = "https://maps.googleapis.com/maps/api/place/photo?maxheight=1500&photoreference=abc&key=secret"
+
+
+# Keys And Endpoints
+
+def test_normalize_url_ignores_the_api_key_and_the_order_of_the_parameters():
+    assert normalize_url("https://Maps.GoogleApis.com/maps/api/place/details/json?place_id=abc&key=first&fields=review") == \
+           normalize_url("https://maps.googleapis.com/maps/api/place/details/json?fields=review&key=second&place_id=abc")
+
+def test_normalize_url_keeps_the_path_and_the_other_parameters():
+    normalized: str = normalize_url(DETAILS_URL)
+    assert normalized == "https://maps.googleapis.com/maps/api/place/details/json?fields=review%2Cphotos&place_id=abc"
+    assert normalize_url(DETAILS_URL.replace("place_id=abc", "place_id=xyz")) != normalized
+
+def test_get_endpoint():
+    assert get_endpoint("https://maps.googleapis.com/maps/api/place/textsearch/json?query=x") == "textsearch"
+    assert get_endpoint(PHOTO_URL) == "photo"
+    assert get_endpoint("https://www.googleapis.com/customsearch/v1?q=x") == "customsearch"
+    assert get_endpoint("https://www.tripadvisor.com/Restaurants-g1-oa0-Town.html") == "tripadvisor"
+    assert get_endpoint("https://example.com/page") == "example.com"
+
+
+# Time To Live
+
+def test_responses_are_answered_until_they_expire(tmp_path: Path, monkeypatch):
+    cache: ResponseCache = ResponseCache(tmp_path, time_to_live={"details": timedelta(hours=1)})
+    cache.put(DETAILS_URL, b'{"status": "OK"}')
+    assert cache.get(DETAILS_URL) == b'{"status": "OK"}'
+    assert cache.contains(DETAILS_URL)
+    # A changed api key is the same entry
+    assert cache.get(DETAILS_URL.replace("key=secret", "key=other")) == b'{"status": "OK"}'
+    now: float = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 2 * 3600)
+    assert cache.get(DETAILS_URL) is None
+    assert not cache.contains(DETAILS_URL)
+
+def test_endpoints_without_time_to_live_are_not_cached(tmp_path: Path):
+    cache: ResponseCache = ResponseCache(tmp_path)
+    cache.put(PHOTO_URL, b"jpeg")
+    assert not cache.is_cacheable(PHOTO_URL)
+    assert cache.get(PHOTO_URL) is None
+    assert not cache.contains(PHOTO_URL)
+
+def test_replacing_a_response_does_not_count_it_twice(tmp_path: Path):
+    cache: ResponseCache = ResponseCache(tmp_path)
+    cache.put(DETAILS_URL, b"x" * 1000)
+    cache.put(DETAILS_URL, b"x" * 1000)
+    # Like a new cache, which takes the size from the files
+    assert cache._size_bytes == ResponseCache(tmp_path)._size_bytes < 2000
+
+def test_the_least_recently_used_responses_are_evicted(tmp_path: Path):
+    cache: ResponseCache = ResponseCache(tmp_path, max_size_bytes=3500)
+    urls: List[str] = [DETAILS_URL.replace("place_id=abc", f"place_id={i}") for i in range(4)]
+    now: float = time.time()
+    for age, url in zip([300, 200, 100], urls):
+        cache.put(url, b"x" * 1000)
+        os.utime(cache._get_path(url), (now - age, now - age))
+    # Reading the oldest response makes it the most recently used one
+    cache.get(urls[0])
+    cache.put(urls[3], b"x" * 1000)
+    assert cache.get(urls[1]) is None
+    assert cache.get(urls[2]) is None
+    assert cache.get(urls[0]) is not None
+    assert cache.get(urls[3]) is not None
+    assert cache._size_bytes == ResponseCache(tmp_path)._size_bytes <= 3500
+
+
+# Offline Mode
+
+def test_offline_mode_replays_expired_responses(tmp_path: Path, monkeypatch):
+    ResponseCache(tmp_path, time_to_live={"details": timedelta(hours=1)}).put(DETAILS_URL, b'{"status": "OK"}')
+    now: float = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 2 * 3600)
+    offline: ResponseCache = ResponseCache(tmp_path, time_to_live={"details": timedelta(hours=1)}, offline=True)
+    assert offline.get(DETAILS_URL) == b'{"status": "OK"}'
+    assert offline.contains(DETAILS_URL)
+
+def test_offline_mode_fails_on_a_miss_and_does_not_write(tmp_path: Path):
+    offline: ResponseCache = ResponseCache(tmp_path, offline=True)
+    offline.put(DETAILS_URL, b'{"status": "OK"}')
+    with pytest.raises(CacheMissError):
+        offline.get(DETAILS_URL)
@@ -0,0 +1,67 @@
+import asyncio
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from ratings.http_cache import ResponseCache, CacheMissError
+from ratings.http_client import AsyncHttpClient
+from ratings.photo_store import PhotoStore
+from ratings.rating_sites import GoogleMaps, TripAdvisor
+from ratings.restaurant import GoogleMapsResult, TripAdvisorResult
+
+
+# Crawls a town from recorded responses with the cache in offline mode, like CRAWLER_OFFLINE=1 does, so no request
+# leaves the machine. The api key is not part of the cached urls, so the recordings work with any key.
+
+FIXTURES_PATH: Path = Path(__file__).parent / "fixtures"
+TOWN: str = "Testhausen Deutschland"
+TEXTSEARCH_URL: str = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+TRIP_ADVISOR_URL: str = "https://www.tripadvisor.com/Restaurants-g187323"
+RECORDED_RESPONSES: Dict[str, str] = {
+    f"{TEXTSEARCH_URL}?key=recorded&query=restaurants in {TOWN}": "textsearch_1.json",
+    f"{TEXTSEARCH_URL}?pagetoken=page-2&key=recorded": "textsearch_2.json",
+    f"{TEXTSEARCH_URL}?pagetoken=page-3&key=recorded": "textsearch_3.json",
+    "https://www.googleapis.com/customsearch/v1?q=Testhausen Deutschland restaurants&cx=011204893081168402867:xebeg1mi0om&key=recorded":
+        "customsearch.json",
+    f"{TRIP_ADVISOR_URL}-oa0-Testhausen.html": "tripadvisor_0.html",
+    f"{TRIP_ADVISOR_URL}-oa30-Testhausen.html": "tripadvisor_30.html",
+}
+
+
+@pytest.fixture
+def offline_cache(tmp_path: Path) -> ResponseCache:
+    recording: ResponseCache = ResponseCache(tmp_path)
+    for url, fixture in RECORDED_RESPONSES.items():
+        recording.put(url, (FIXTURES_PATH / fixture).read_bytes())
+    return ResponseCache(tmp_path, offline=True)
+
+def crawl(get_restaurants, cache: ResponseCache):
+    async def run():
+        async with AsyncHttpClient(cache=cache) as client:
+            return await get_restaurants(client)
+    return asyncio.run(run())
+
+
+def test_google_maps_replays_all_pages(offline_cache: ResponseCache, tmp_path: Path):
+    google_maps: GoogleMaps = GoogleMaps("another key", PhotoStore(tmp_path / "photos"))
+    restaurants: List[GoogleMapsResult] = crawl(lambda client: google_maps.get_restaurants_async(TOWN, 60, client), offline_cache)
+    assert [restaurant.name for restaurant in restaurants] == ["Zum Goldenen Hirsch", "Trattoria Da Marco", "Restaurant Lindenhof",
+                                                              "Café Mühle"]
+    assert restaurants[0].link == "https://www.google.com/maps/place/?q=place_id:hirsch"
+    assert restaurants[0].rating == pytest.approx(9.2)
+    assert restaurants[0].number_of_reviews == 812
+    assert (restaurants[0].location_lat, restaurants[0].location_lang) == (50.1101, 8.6821)
+
+def test_trip_advisor_replays_the_search_and_the_pages(offline_cache: ResponseCache):
+    trip_advisor: TripAdvisor = TripAdvisor("another key")
+    restaurants: List[TripAdvisorResult] = crawl(lambda client: trip_advisor.get_restaurants_async(TOWN, 60, client), offline_cache)
+    assert [(restaurant.name, restaurant.rating, restaurant.number_of_reviews) for restaurant in restaurants] == [
+        ("Zum Goldenen Hirsch", 9, 640), ("Trattoria da Marco", 8, 210), ("Lindenhof", 10, 980)]
+    assert restaurants[0].link == "https://www.tripadvisor.com/Restaurant_Review-g187323-d1-Reviews.html"
+
+def test_requests_that_were_not_recorded_fail(offline_cache: ResponseCache):
+    trip_advisor: TripAdvisor = TripAdvisor("another key")
+    with pytest.raises(CacheMissError):
+        # The third page was not recorded
+        crawl(lambda client: trip_advisor.get_restaurants_async(TOWN, 90, client), offline_cache)
@@ -0,0 +1,90 @@
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+import ratings.rate_limiter as rate_limiter_module
+from ratings.rate_limiter import RateLimiter, EndpointLimit, BudgetExhaustedError, AdaptiveDelay, FIRST_BACKOFF_SECONDS
+
+
+DETAILS_URL: str = "https://maps.googleapis.com/maps/api/place/details/json?place_id=abc&key=secret"
+SEARCH_URL: str = "https://www.googleapis.com/customsearch/v1?q=Testhausen&key=secret"
+LIMITS: Dict[str, EndpointLimit] = {
+    "details": EndpointLimit(requests_per_second=10, burst=3),
+    "customsearch": EndpointLimit(requests_per_second=100, burst=100, daily_budget=2),
+}
+
+
+@pytest.fixture
+def now(monkeypatch) -> List[float]:
+    # The clock of the limiter, it only moves when a test moves it
+    clock: List[float] = [1600000000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    return clock
+
+
+def test_the_burst_is_sent_at_once_and_the_rest_at_the_rate(tmp_path: Path, now: List[float]):
+    rate_limiter: RateLimiter = RateLimiter(tmp_path, LIMITS)
+    waits: List[float] = [rate_limiter.reserve(DETAILS_URL) for _ in range(6)]
+    assert waits == pytest.approx([0, 0, 0, 0.1, 0.2, 0.3])
+
+def test_the_bucket_fills_up_again(tmp_path: Path, now: List[float]):
+    rate_limiter: RateLimiter = RateLimiter(tmp_path, LIMITS)
+    for _ in range(3):
+        rate_limiter.reserve(DETAILS_URL)
+    now[0] += 0.2
+    assert rate_limiter.reserve(DETAILS_URL) == pytest.approx(0)
+    assert rate_limiter.reserve(DETAILS_URL) == pytest.approx(0)
+    assert rate_limiter.reserve(DETAILS_URL) == pytest.approx(0.1)
+
+def test_endpoints_without_limit_are_not_limited(tmp_path: Path, now: List[float]):
+    rate_limiter: RateLimiter = RateLimiter(tmp_path, LIMITS)
+    assert all(rate_limiter.reserve("https://www.tripadvisor.com/Restaurants-g1-Town.html") == 0 for _ in range(20))
+
+def test_limiters_of_different_processes_share_the_bucket(tmp_path: Path, now: List[float]):
+    first: RateLimiter = RateLimiter(tmp_path, LIMITS)
+    second: RateLimiter = RateLimiter(tmp_path, LIMITS)
+    waits: List[float] = [limiter.reserve(DETAILS_URL) for limiter in [first, second, first, second]]
+    assert waits == pytest.approx([0, 0, 0, 0.1])
+
+def test_the_daily_budget(tmp_path: Path, now: List[float], monkeypatch):
+    rate_limiter: RateLimiter = RateLimiter(tmp_path, LIMITS)
+    assert rate_limiter.get_remaining_budgets() == {"customsearch": 2, "details": None}
+    rate_limiter.reserve(SEARCH_URL)
+    rate_limiter.reserve(SEARCH_URL)
+    assert rate_limiter.get_remaining_budgets()["customsearch"] == 0
+    with pytest.raises(BudgetExhaustedError):
+        rate_limiter.reserve(SEARCH_URL)
+    # The budget starts over the next day
+    monkeypatch.setattr(rate_limiter_module, "get_quota_day", lambda: "2100-01-01")
+    assert rate_limiter.reserve(SEARCH_URL) == 0
+
+def test_back_off_pauses_the_endpoint(tmp_path: Path, now: List[float]):
+    rate_limiter: RateLimiter = RateLimiter(tmp_path, LIMITS)
+    rate_limiter.reserve(DETAILS_URL)
+    assert rate_limiter.back_off(DETAILS_URL) == FIRST_BACKOFF_SECONDS
+    # Requests rejected during the pause do not make it longer
+    assert rate_limiter.back_off(DETAILS_URL) == FIRST_BACKOFF_SECONDS
+    assert rate_limiter.reserve(DETAILS_URL) >= FIRST_BACKOFF_SECONDS
+    # Another rejection right after the pause doubles it
+    now[0] += FIRST_BACKOFF_SECONDS
+    assert rate_limiter.back_off(DETAILS_URL) == 2 * FIRST_BACKOFF_SECONDS
+
+def test_an_unreadable_state_is_reset(tmp_path: Path, now: List[float]):
+    (tmp_path / "details.json").write_text('{"tokens": ')
+    rate_limiter: RateLimiter = RateLimiter(tmp_path, LIMITS)
+    assert rate_limiter.reserve(DETAILS_URL) == 0
+
+
+def test_adaptive_delay_follows_the_provider():
+    delay: AdaptiveDelay = AdaptiveDelay(initial_seconds=1.5, minimum_seconds=0.5, maximum_seconds=2, poll_interval_seconds=0.25)
+    delay.record(waited_seconds=1.5, polls=1, succeeded=True)
+    assert delay.seconds == 1.25
+    # Waits that never succeeded are not recorded
+    delay.record(waited_seconds=6.25, polls=20, succeeded=False)
+    assert delay.seconds == 1.25
+    delay.record(waited_seconds=1.75, polls=3, succeeded=True)
+    assert delay.seconds == 1.75
+    delay.record(waited_seconds=3, polls=8, succeeded=True)
+    assert delay.seconds == 2
@@ -0,0 +1,52 @@
+from typing import List
+
+from ratings.town_search import TownSearchIndex, normalize, get_prefix_distance
+from ratings.towns import Town
+
+
+TOWNS: List[Town] = [Town("Berlin", 3644826, None), Town("Köln", 1085664, None), Town("Frankfurt am Main", 753056, None),
+                     Town("Düsseldorf", 619294, None), Town("Bergisch Gladbach", 111846, None), Town("Frankfurt (Oder)", 57873, None),
+                     Town("Bernau bei Berlin", 39597, None)]
+
+
+def create_index() -> TownSearchIndex:
+    # Bernau is not crawled yet
+    return TownSearchIndex([town.name for town in TOWNS if town.name != "Bernau bei Berlin"], TOWNS)
+
+
+def test_normalize():
+    assert normalize("Köln") == normalize("Koeln") == normalize("koln") == "koln"
+    assert normalize("  Frankfurt (Oder) ") == "frankfurt oder"
+    assert normalize("Düsseldorf") == normalize("Duesseldorf") == "dusseldorf"
+
+def test_get_prefix_distance():
+    assert get_prefix_distance("berl", "berlin", 2) == 0
+    assert get_prefix_distance("brel", "berlin", 2) == 2
+    assert get_prefix_distance("xyz", "berlin", 1) == 2
+
+def test_an_empty_query_suggests_the_largest_towns():
+    assert create_index().search("", limit=3) == ["Berlin", "Köln", "Frankfurt am Main"]
+
+def test_prefixes_of_every_word_are_found_ordered_by_population():
+    index: TownSearchIndex = create_index()
+    assert index.search("ber") == ["Berlin", "Bergisch Gladbach"]
+    assert index.search("frankfurt") == ["Frankfurt am Main", "Frankfurt (Oder)"]
+    assert index.search("main") == ["Frankfurt am Main"]
+    assert index.search("Gladb") == ["Bergisch Gladbach"]
+
+def test_umlauts_may_be_written_out():
+    index: TownSearchIndex = create_index()
+    assert index.search("Koeln") == index.search("Koln") == index.search("köl") == ["Köln"]
+    assert index.search("duesseld") == ["Düsseldorf"]
+
+def test_small_typos_are_tolerated_after_the_exact_matches():
+    index: TownSearchIndex = create_index()
+    assert index.search("dusseldrof") == ["Düsseldorf"]
+    assert index.search("frnakfurt", limit=1) == ["Frankfurt am Main"]
+    # Short queries only match exactly
+    assert index.search("bx") == []
+
+def test_only_supported_towns_are_suggested():
+    index: TownSearchIndex = create_index()
+    assert "Bernau bei Berlin" not in index.search("bern")
+    assert len(index) == 6
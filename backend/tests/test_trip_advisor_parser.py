@@ -0,0 +1,44 @@
+import json
+from pathlib import Path
+from typing import List, Dict
+
+import pytest
+
+from ratings.trip_advisor_parser import parse_restaurants_page, TripAdvisorParseError
+
+
+FIXTURES_PATH: Path = Path(__file__).parent / "fixtures"
+
+
+def get_page(restaurants_lists: List[List[Dict]]) -> str:
+    scripts: str = "".join(f'<script>window.__cache_{i}={{"data":{json.dumps({"restaurants": restaurants})}}};</script>'
+                           for i, restaurants in enumerate(restaurants_lists))
+    return f"<html><body>{scripts}</body></html>"
+
+def get_restaurant(name: str) -> Dict:
+    return {"name": name, "detailPageUrl": f"/Restaurant_Review-{name}.html", "averageRating": 4.5, "userReviewCount": 100,
+            "priceTag": "€€"}
+
+
+def test_parses_a_recorded_page():
+    page: str = (FIXTURES_PATH / "tripadvisor_0.html").read_text(encoding="utf-8")
+    assert parse_restaurants_page(page) == [
+        {"name": "Zum Goldenen Hirsch", "detailPageUrl": "/Restaurant_Review-g187323-d1-Reviews.html", "averageRating": 4.5,
+         "userReviewCount": 640},
+        {"name": "Trattoria da Marco", "detailPageUrl": "/Restaurant_Review-g187323-d2-Reviews.html", "averageRating": 4.0,
+         "userReviewCount": 210},
+    ]
+
+def test_the_last_restaurant_list_wins():
+    page: str = get_page([[get_restaurant("first")], [get_restaurant("second"), get_restaurant("third")]])
+    assert [restaurant["name"] for restaurant in parse_restaurants_page(page)] == ["second", "third"]
+
+def test_lists_without_restaurants_are_ignored():
+    page: str = get_page([[get_restaurant("first")], [{"name": "not a restaurant"}], []])
+    assert [restaurant["name"] for restaurant in parse_restaurants_page(page)] == ["first"]
+
+def test_a_page_without_restaurants_is_an_error():
+    with pytest.raises(TripAdvisorParseError):
+        parse_restaurants_page('<html><script>{"restaurants" broken</script></html>')
+    with pytest.raises(TripAdvisorParseError):
+        parse_restaurants_page("")
@@ -13,10 +13,18 @@ export interface SiteInfo {
 
 
 export interface Restaurant {
+    id: string
+    rank: number
+    score: number
     google_maps_info: GoogleMapsInfo,
     trip_advisor_info: TripAdvisorInfo
 }
 
+export interface RestaurantPage {
+    restaurants: Array<Restaurant>
+    next_cursor: number | null
+}
+
 export interface GoogleMapsInfo {
     name: string
     link: string
@@ -25,8 +33,10 @@ export interface GoogleMapsInfo {
     formatted_address: string
     location_lang: number
     location_lat: number
-    photos: Array<string>
-    reviews: Array<string>
+    // Chosen by the crawler, null if the restaurant has no reviews
+    best_review: string | null
+    // Not part of the listing, they are loaded per restaurant
+    photos?: Array<string>
 }
 
 export interface TripAdvisorInfo {
@@ -1,9 +1,9 @@
 import React, {useState} from "react";
 import {SearchBar} from "./SearchBar";
-import {CircularProgress, Container} from "@material-ui/core";
+import {Button, CircularProgress, Container} from "@material-ui/core";
 import Grid from "@material-ui/core/Grid";
 import {RestaurantCard} from "./RestaurantCard";
-import {Restaurant} from "../Restaurant";
+import {Restaurant, RestaurantPage} from "../Restaurant";
 import axios, {AxiosRequestConfig, AxiosResponse} from "axios"
 import {makeStyles} from "@material-ui/core/styles";
 
@@ -11,63 +11,60 @@ const useStyles = makeStyles(theme => ({
     loadingSpinnerContainer: {
         textAlign: "center",
         marginTop: "10px"
+    },
+    showMoreContainer: {
+        textAlign: "center",
+        margin: "10px"
     }
 }));
 
-async function getDataForTown(town: string): Promise<Array<Restaurant>> {
+async function getDataForTown(town: string, cursor: number): Promise<RestaurantPage> {
     const url: string = "http://localhost:5000/restaurants";
     const options: AxiosRequestConfig = {
         url: url,
         method: "GET",
         params: {
-            town: town
+            town: town,
+            cursor: cursor
         },
         headers: {
             'Access-Control-Allow-Origin': "*"
         }
     };
     const response: AxiosResponse = await axios(options);
-    const restaurants: Array<Restaurant> = response.data;
-    console.log(restaurants);
-    return restaurants
-}
-
-function useAvailableTowns(): Array<string> {
-    const [availableTowns, setAvailableTowns] = useState([]);
-    if (availableTowns.length === 0) {
-        const url: string = "http://localhost:5000/all_supported_towns";
-        const options: AxiosRequestConfig = {
-            url: url,
-            method: "GET",
-            headers: {
-                'Access-Control-Allow-Origin': "*"
-            }
-        };
-        axios(options).then(result => {
-            setAvailableTowns(result.data)
-
-        });
-    }
-    return availableTowns
+    const page: RestaurantPage = response.data;
+    console.log(page);
+    return page
 }
 
-
 export function App() {
 
-    const [restaurants, setRestaurants] = useState([]);
+    const [restaurants, setRestaurants] = useState<Array<Restaurant>>([]);
+    const [town, setTown] = useState("");
+    const [nextCursor, setNextCursor] = useState<number | null>(null);
     const [isLoading, setIsLoading] = useState(false);
-    const availableTowns: Array<string> = useAvailableTowns();
     const classes = useStyles();
 
     const onEnter = async (town: string) => {
         setIsLoading(true);
-        const restaurantTest: Array<Restaurant> = await getDataForTown(town);
-        setRestaurants(restaurantTest);
+        const page: RestaurantPage = await getDataForTown(town, 0);
+        setTown(town);
+        setRestaurants(page.restaurants);
+        setNextCursor(page.next_cursor);
         setIsLoading(false);
     };
 
+    const onShowMore = async () => {
+        if (nextCursor === null) {
+            return
+        }
+        const page: RestaurantPage = await getDataForTown(town, nextCursor);
+        setRestaurants(restaurants.concat(page.restaurants));
+        setNextCursor(page.next_cursor);
+    };
+
     const restaurantItems: Array<JSX.Element> = restaurants.map(restaurant => {
-        return <Grid item sm={12}>
+        return <Grid item sm={12} key={restaurant.id}>
             <RestaurantCard restaurant={restaurant} />
         </Grid>
     });
@@ -75,12 +72,15 @@ export function App() {
 
 
     return <div>
-        <SearchBar onEnter={onEnter} availableTowns={availableTowns}/>
+        <SearchBar onEnter={onEnter}/>
         {isLoading && <div className={classes.loadingSpinnerContainer}> <CircularProgress /> </div>}
         {!isLoading && <Container maxWidth="md">
             <Grid style={{marginTop: "10px"}} container justify="center" spacing={3}>
                 {restaurantItems}
             </Grid>
+            {nextCursor !== null && <div className={classes.showMoreContainer}>
+                <Button variant="outlined" onClick={onShowMore}>Show More</Button>
+            </div>}
         </Container>}
     </div>
 
@@ -5,7 +5,6 @@ import GridListTile from '@material-ui/core/GridListTile';
 import GridListTileBar from '@material-ui/core/GridListTileBar';
 import IconButton from '@material-ui/core/IconButton';
 import {Restaurant} from "../Restaurant";
-import * as blobUtil from "blob-util";
 import {isWidthUp, useMediaQuery} from "@material-ui/core";
 import {Breakpoint} from "@material-ui/core/styles/createBreakpoints";
 import useTheme from "@material-ui/core/styles/useTheme";
@@ -45,10 +44,9 @@ const useStyles = makeStyles((theme) => ({
  * ];
  */
 
-function getImageURL(base64Encoded: string): string {
-    const testBlob = blobUtil.base64StringToBlob(base64Encoded,"image/jpeg");
-    const url: string = URL.createObjectURL(testBlob);
-    return url
+function getImageURL(photoHash: string): string {
+    // The card variant is sized for the tiles below, the original is a lot larger
+    return `http://localhost:5000/photos/${photoHash}?variant=card`
 }
 
 
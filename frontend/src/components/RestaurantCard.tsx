@@ -8,7 +8,7 @@ import Button from "@material-ui/core/Button";
 import makeStyles from "@material-ui/core/styles/makeStyles";
 import Collapse from "@material-ui/core/Collapse";
 import {RestaurantDetail} from "./RestaurantDetail";
-import * as blobUtil from "blob-util";
+import axios, {AxiosRequestConfig, AxiosResponse} from "axios";
 import CardMedia from "@material-ui/core/CardMedia";
 import ImageViewer from "./ImageViewer";
 import withStyles from "@material-ui/core/styles/withStyles";
@@ -45,6 +45,18 @@ const theme = createMuiTheme({
 
 
 
+async function getRestaurantDetail(restaurantId: string, detail: "photos"): Promise<Array<string>> {
+    const options: AxiosRequestConfig = {
+        url: `http://localhost:5000/restaurants/${encodeURIComponent(restaurantId)}/${detail}`,
+        method: "GET",
+        headers: {
+            'Access-Control-Allow-Origin': "*"
+        }
+    };
+    const response: AxiosResponse = await axios(options);
+    return response.data
+}
+
 export function RestaurantCard(props: {restaurant: Restaurant}): JSX.Element {
     const classes = useStyles();
     const [expanded, setExpanded] = useState(false);
@@ -52,28 +64,30 @@ export function RestaurantCard(props: {restaurant: Restaurant}): JSX.Element {
         setExpanded(!expanded);
     };
 
-    const reviewToDisplay = props.restaurant.google_maps_info.reviews.sort((review_1, review_2) => {
-        if (review_1.length > review_2.length) {
-            return -1
-        } else {
-            return 1
-        }
-    })[0];
+    // The listing only contains the ranking and the best review, the photos of the card are loaded afterwards
+    const [photos, setPhotos] = useState<Array<string>>([]);
+    useEffect(() => {
+        getRestaurantDetail(props.restaurant.id, "photos").then(setPhotos);
+    }, [props.restaurant.id]);
+
+    const reviewToDisplay = props.restaurant.google_maps_info.best_review;
 
 
 
     return  <Card variant="outlined">
         {/* Show Image and Review*/}
-        <ImageViewer images={props.restaurant.google_maps_info.photos} />
+        <ImageViewer images={photos} />
         <ThemeProvider theme={theme}>
         <CardContent>
             <Typography variant="h1" color="textPrimary" gutterBottom>
                 {props.restaurant.google_maps_info.name}
             </Typography>
-            <div className={classes.quotationMarks}>"</div>
-            <Typography className={classes.review} variant="body2" color="textSecondary">
-                {reviewToDisplay}"
-            </Typography>
+            {reviewToDisplay && <div>
+                <div className={classes.quotationMarks}>"</div>
+                <Typography className={classes.review} variant="body2" color="textSecondary">
+                    {reviewToDisplay}"
+                </Typography>
+            </div>}
         </CardContent>
         {/* Expand Action */}
         <CardActions>
@@ -1,8 +1,9 @@
-import React, {SyntheticEvent, useState} from "react";
+import React, {SyntheticEvent, useEffect, useState} from "react";
 import TextField from "@material-ui/core/TextField";
 import {AppBar, Toolbar, Typography} from "@material-ui/core";
 import {makeStyles} from "@material-ui/core/styles";
 import Autocomplete from '@material-ui/lab/Autocomplete';
+import axios, {AxiosRequestConfig, AxiosResponse} from "axios";
 
 
 const useStyles = makeStyles(theme => ({
@@ -24,10 +25,40 @@ const useStyles = makeStyles(theme => ({
 }));
 
 
-export function SearchBar(props: {onEnter: (searchTerm: string) => void, availableTowns: Array<string>}) {
+async function getTownSuggestions(searchTerm: string): Promise<Array<string>> {
+    const options: AxiosRequestConfig = {
+        url: "http://localhost:5000/towns/autocomplete",
+        method: "GET",
+        params: {
+            q: searchTerm
+        },
+        headers: {
+            'Access-Control-Allow-Origin': "*"
+        }
+    };
+    const response: AxiosResponse = await axios(options);
+    return response.data
+}
+
+export function SearchBar(props: {onEnter: (searchTerm: string) => void}) {
     const [searchTerm, setSearchTerm] = useState("");
+    const [suggestions, setSuggestions] = useState<Array<string>>([]);
     const classes = useStyles();
 
+    // The server matches the towns (also with umlauts written out or typos), so the suggestions are shown as they are.
+    // Answers to an older search term are ignored.
+    useEffect(() => {
+        let isCurrent = true;
+        getTownSuggestions(searchTerm).then(towns => {
+            if (isCurrent) {
+                setSuggestions(towns)
+            }
+        });
+        return () => {
+            isCurrent = false
+        };
+    }, [searchTerm]);
+
 
     const enterSubmit = (event: SyntheticEvent) => {
         event.preventDefault();
@@ -45,7 +76,8 @@ export function SearchBar(props: {onEnter: (searchTerm: string) => void, availab
             </Typography>
             <Autocomplete className={classes.container}
                           freeSolo = {true}
-                          options={props.availableTowns}
+                          options={suggestions}
+                          filterOptions={(options) => options}
                           onChange={updateSearchTerm}
                           onInputChange={updateSearchTerm}
                           renderInput={(params) => (